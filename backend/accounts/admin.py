@@ -8,11 +8,16 @@ from .models import (
     MercadoPagoFeeConfig,
     WhatsAppPreference,
     WhatsAppQueue,
+    MercadoPagoWebhookInbox,
+    LojaCheckoutIdempotencia,
+    CobrancaMensalidadeCampanha,
     WhatsAppTemplate,
     EventoPresenca,
     Evento,
     EventoCusto,
     EventoCustoComprovante,
+    EventoResumo,
+    EventoInscricaoBusca,
     EventoDescontoCodigo,
     AuditLog,
     MensalidadeAventureiro,
@@ -81,16 +86,39 @@ class UserAccessAdmin(admin.ModelAdmin):
 
 @admin.register(WhatsAppPreference)
 class WhatsAppPreferenceAdmin(admin.ModelAdmin):
-    list_display = ('user', 'phone_number', 'notify_cadastro', 'notify_diretoria', 'notify_confirmacao', 'notify_financeiro', 'notify_geral', 'updated_at')
+    list_display = ('user', 'phone_number', 'resolved_phone', 'notify_cadastro', 'notify_diretoria', 'notify_confirmacao', 'notify_financeiro', 'notify_geral', 'updated_at')
     search_fields = ('user__username', 'phone_number')
     list_filter = ('notify_cadastro', 'notify_diretoria', 'notify_confirmacao', 'notify_financeiro', 'notify_geral')
 
 
 @admin.register(WhatsAppQueue)
 class WhatsAppQueueAdmin(admin.ModelAdmin):
-    list_display = ('phone_number', 'notification_type', 'status', 'attempts', 'created_at', 'sent_at')
+    list_display = ('phone_number', 'notification_type', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
     search_fields = ('phone_number', 'user__username', 'provider_message_id')
     list_filter = ('status', 'notification_type')
+    raw_id_fields = ('merged_into',)
+
+
+@admin.register(MercadoPagoWebhookInbox)
+class MercadoPagoWebhookInboxAdmin(admin.ModelAdmin):
+    list_display = ('payment_id', 'source', 'status', 'attempts', 'received_at', 'processed_at')
+    search_fields = ('payment_id', 'request_id')
+    list_filter = ('status', 'source')
+
+
+@admin.register(LojaCheckoutIdempotencia)
+class LojaCheckoutIdempotenciaAdmin(admin.ModelAdmin):
+    list_display = ('key', 'scope', 'status', 'pedido', 'created_at')
+    search_fields = ('key', 'owner')
+    list_filter = ('status', 'scope')
+    raw_id_fields = ('pedido',)
+
+
+@admin.register(CobrancaMensalidadeCampanha)
+class CobrancaMensalidadeCampanhaAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'total_responsaveis', 'total_mensalidades', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('created_at', 'updated_at', 'finished_at')
 
 
 @admin.register(WhatsAppTemplate)
@@ -144,6 +172,21 @@ class EventoCustoAdmin(admin.ModelAdmin):
     inlines = (EventoCustoComprovanteInline,)
 
 
+@admin.register(EventoResumo)
+class EventoResumoAdmin(admin.ModelAdmin):
+    list_display = ('evento', 'participantes', 'pedidos_pagos', 'receita_total', 'custos_total', 'lucro_liquido', 'updated_at')
+    search_fields = ('evento__name',)
+    readonly_fields = ('updated_at',)
+
+
+@admin.register(EventoInscricaoBusca)
+class EventoInscricaoBuscaAdmin(admin.ModelAdmin):
+    list_display = ('inscricao', 'evento', 'codigo', 'cancelada', 'updated_at')
+    list_filter = ('cancelada',)
+    raw_id_fields = ('inscricao', 'evento')
+    readonly_fields = ('documento', 'cpfs', 'telefones', 'updated_at')
+
+
 @admin.register(AuditLog)
 class AuditLogAdmin(admin.ModelAdmin):
     list_display = ('created_at', 'username', 'profile', 'location', 'action')
@@ -1,7 +1,40 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError, OperationalError, close_old_connections, connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
 from .models import AuditLog
 
+logger = logging.getLogger(__name__)
+
+# Arquivo de espera em importacao ha mais tempo que isso e de um worker que morreu
+# no meio; outro worker volta a importa-lo.
+AUDIT_SPILL_CLAIM_TIMEOUT = 600
+
+AUDIT_FIELDS = (
+    'user_id',
+    'username',
+    'profile',
+    'location',
+    'action',
+    'details',
+    'method',
+    'path',
+    'ip_address',
+    'user_agent',
+)
+
 
 def _client_ip_from_request(request):
     if not request:
@@ -22,6 +55,240 @@ def _profile_from_user(user):
     return ', '.join(labels) if labels else ''
 
 
+class AuditBuffer:
+    """Fila em memoria (por processo) gravada com bulk_create em lotes.
+
+    Se o banco estiver ocupado, o lote vai para um arquivo JSONL de espera
+    (spill) que e reimportado no proximo flush bem-sucedido.
+    """
+
+    def __init__(self, batch_size=50, flush_interval=2.0, max_queue=5000, spill_dir=None):
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = max(0.1, float(flush_interval))
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.written = 0
+        self.spilled = 0
+        self.dropped = 0
+
+    def _ensure_thread(self):
+        # Depois do fork do gunicorn a thread do processo pai nao existe no worker.
+        pid = os.getpid()
+        if self._thread and self._thread.is_alive() and self._pid == pid:
+            return
+        self._pid = pid
+        self._thread = threading.Thread(target=self._run, name='audit-buffer', daemon=True)
+        self._thread.start()
+
+    def put(self, entry):
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 100 == 0:
+                logger.warning('Fila de auditoria cheia; %s registro(s) descartado(s) neste processo.', self.dropped)
+            return
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Falha inesperada ao gravar lote de auditoria.')
+            finally:
+                close_old_connections()
+
+    def _drain(self):
+        entries = []
+        while True:
+            try:
+                entries.append(self._queue.get_nowait())
+            except queue.Empty:
+                return entries
+
+    def flush(self):
+        with self._flush_lock:
+            entries = self._drain()
+            if entries:
+                if not self._write(entries):
+                    self._spill(entries)
+                    return len(entries)
+            self._reload_spill()
+            return len(entries)
+
+    def _rows(self, entries):
+        rows = []
+        for entry in entries:
+            data = {field: entry.get(field) or '' for field in AUDIT_FIELDS if field != 'user_id'}
+            created_at = entry.get('created_at')
+            if isinstance(created_at, str):
+                created_at = parse_datetime(created_at)
+            rows.append(AuditLog(created_at=created_at or timezone.now(), user_id=entry.get('user_id'), **data))
+        # Usuario removido entre a acao e a gravacao: mantem so o username. No SQLite a
+        # chave estrangeira so e conferida no commit, entao a troca vem antes do insert.
+        user_ids = {row.user_id for row in rows if row.user_id is not None}
+        if user_ids:
+            user_model = AuditLog._meta.get_field('user').related_model
+            existing = set(user_model.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+            for row in rows:
+                if row.user_id not in existing:
+                    row.user_id = None
+        return rows
+
+    def _write(self, entries):
+        """Grava os registros; `False` so quando o banco esta ocupado (o lote vai para espera)."""
+        try:
+            rows = self._rows(entries)
+            # Tudo ou nada: se um lote falhar, nenhum fica gravado e o arquivo de
+            # espera nao duplica os que ja tinham entrado.
+            with transaction.atomic():
+                for start in range(0, len(rows), self.batch_size):
+                    AuditLog.objects.bulk_create(rows[start:start + self.batch_size])
+        except OperationalError:
+            logger.warning('Banco ocupado ao gravar %s registro(s) de auditoria; enviando para arquivo de espera.', len(entries))
+            return False
+        except DatabaseError:
+            # Erro de dados (NOT NULL, integridade...): repetir nao resolve. Grava um a um
+            # para salvar os registros validos e descarta os rejeitados.
+            logger.exception('Lote de auditoria rejeitado pelo banco; gravando registro a registro.')
+            return self._write_each(entries)
+        self.written += len(rows)
+        return True
+
+    def _write_each(self, entries):
+        for index, entry in enumerate(entries):
+            try:
+                with transaction.atomic():
+                    AuditLog.objects.bulk_create(self._rows([entry]))
+            except OperationalError:
+                logger.warning('Banco ocupado ao gravar auditoria; %s registro(s) para arquivo de espera.', len(entries) - index)
+                self._spill(entries[index:])
+                return True
+            except DatabaseError:
+                self.dropped += 1
+                logger.exception('Registro de auditoria descartado (acao=%r).', entry.get('action'))
+                continue
+            self.written += 1
+        return True
+
+    def _spill_path(self):
+        return self.spill_dir / f'audit_spill_{os.getpid()}.jsonl'
+
+    def _spill(self, entries):
+        if not self.spill_dir:
+            self.dropped += len(entries)
+            logger.error('Sem diretorio de espera; %s registro(s) de auditoria descartado(s).', len(entries))
+            return False
+        try:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            with open(self._spill_path(), 'a', encoding='utf-8') as handle:
+                for entry in entries:
+                    handle.write(json.dumps(entry, default=str) + '\n')
+                handle.flush()
+                os.fsync(handle.fileno())
+            self.spilled += len(entries)
+        except OSError:
+            self.dropped += len(entries)
+            logger.exception('Falha ao gravar arquivo de espera da auditoria; %s registro(s) descartado(s).', len(entries))
+            return False
+        return True
+
+    def _spill_candidates(self):
+        candidates = sorted(self.spill_dir.glob('audit_spill_*.jsonl'))
+        stale_before = time.time() - AUDIT_SPILL_CLAIM_TIMEOUT
+        for path in sorted(self.spill_dir.glob('audit_spill_*.importando')):
+            try:
+                if path.stat().st_mtime < stale_before:
+                    candidates.append(path)
+            except OSError:
+                continue
+        return candidates
+
+    def _reload_spill(self):
+        if not self.spill_dir or not self.spill_dir.is_dir():
+            return
+        for path in self._spill_candidates():
+            # Renomear e atomico: so um worker importa cada arquivo. O utime antes do
+            # rename marca a hora da importacao (o rename preserva o mtime).
+            claimed = self.spill_dir / f'{path.name.split(".", 1)[0]}.{os.getpid()}.{time.time_ns()}.importando'
+            try:
+                os.utime(path)
+                os.rename(path, claimed)
+            except OSError:
+                continue
+            entries = []
+            with open(claimed, encoding='utf-8') as handle:
+                for line in handle:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        self.dropped += 1
+            if entries and not self._write(entries):
+                # Volta para o arquivo de espera deste processo (append), sem
+                # sobrescrever o que o dono do arquivo original gravou depois.
+                if self._spill(entries):
+                    claimed.unlink(missing_ok=True)
+                continue
+            self.spilled -= min(self.spilled, len(entries))
+            claimed.unlink(missing_ok=True)
+
+    def stats(self):
+        return {
+            'pending': self._queue.qsize(),
+            'written': self.written,
+            'spilled': self.spilled,
+            'dropped': self.dropped,
+        }
+
+    def shutdown(self):
+        started = time.monotonic()
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Falha ao gravar auditoria pendente no encerramento do processo.')
+        finally:
+            close_old_connections()
+        stats = self.stats()
+        if stats['dropped'] or stats['pending']:
+            logger.warning(
+                'Auditoria encerrada com %s registro(s) descartado(s) e %s pendente(s) (%.2fs).',
+                stats['dropped'],
+                stats['pending'],
+                time.monotonic() - started,
+            )
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def _audit_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = AuditBuffer(
+                    batch_size=getattr(settings, 'AUDIT_LOG_BATCH_SIZE', 50),
+                    flush_interval=getattr(settings, 'AUDIT_LOG_FLUSH_INTERVAL', 2.0),
+                    max_queue=getattr(settings, 'AUDIT_LOG_MAX_QUEUE', 5000),
+                    spill_dir=getattr(settings, 'AUDIT_LOG_SPILL_DIR', None),
+                )
+                atexit.register(_buffer.shutdown)
+    return _buffer
+
+
 def record_audit(action, user=None, request=None, details='', location='', method='', path=''):
     if not action:
         return
@@ -39,18 +306,64 @@ def record_audit(action, user=None, request=None, details='', location='', metho
     if request:
         user_agent = (request.META.get('HTTP_USER_AGENT') or '')[:255]
 
-    AuditLog.objects.create(
-        user=user if user and getattr(user, 'is_authenticated', False) else None,
-        username=username,
-        profile=_profile_from_user(user),
-        location=req_location[:255],
-        action=action[:255],
-        details=(details or '')[:4000],
-        method=(req_method or '')[:12],
-        path=(req_path or '')[:255],
-        ip_address=_client_ip_from_request(request)[:64],
-        user_agent=user_agent,
-    )
+    entry = {
+        'user_id': user.pk if user and getattr(user, 'is_authenticated', False) else None,
+        'username': username,
+        'profile': _profile_from_user(user)[:64],
+        'location': req_location[:255],
+        'action': action[:255],
+        'details': (details or '')[:4000],
+        'method': (req_method or '')[:12],
+        'path': (req_path or '')[:255],
+        'ip_address': _client_ip_from_request(request)[:64],
+        'user_agent': user_agent,
+        'created_at': timezone.now().isoformat(),
+    }
+    if not getattr(settings, 'AUDIT_LOG_ASYNC', True):
+        AuditLog.objects.create(
+            **{field: entry[field] for field in AUDIT_FIELDS},
+            created_at=timezone.now(),
+        )
+        return
+    _audit_buffer().put(entry)
+
+
+AUDIT_FTS_TABLE = 'accounts_auditlog_fts'
+AUDIT_FTS_MIN_LENGTH = 3
+_audit_fts_available = None
+
+
+def audit_fts_available():
+    # Tabela FTS5 (tokenizer trigram) criada pela migration 0095 somente no SQLite.
+    global _audit_fts_available
+    if _audit_fts_available is None:
+        if connection.vendor != 'sqlite':
+            _audit_fts_available = False
+        else:
+            _audit_fts_available = AUDIT_FTS_TABLE in connection.introspection.table_names()
+    return _audit_fts_available
+
+
+def audit_search_q(text, columns, fallback_fields=None):
+    """Filtro de "contem" sobre as colunas indicadas, usando o indice FTS quando possivel.
+
+    O tokenizer trigram so indexa termos com 3+ caracteres; abaixo disso (ou sem
+    FTS) cai para `icontains` nos campos equivalentes.
+    """
+    text = str(text or '').strip()
+    if not text:
+        return Q()
+    if audit_fts_available() and len(text) >= AUDIT_FTS_MIN_LENGTH:
+        phrase = '"' + text.replace('"', '""') + '"'
+        expression = f'{{{" ".join(columns)}}} : {phrase}'
+        return Q(id__in=RawSQL(
+            f'SELECT rowid FROM {AUDIT_FTS_TABLE} WHERE {AUDIT_FTS_TABLE} MATCH %s',
+            [expression],
+        ))
+    query = Q()
+    for field in fallback_fields or columns:
+        query |= Q(**{f'{field}__icontains': text})
+    return query
 
 
 def now_label():
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import re
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse
+from django.utils import timezone
+
+from .models import LojaCheckoutIdempotencia
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_KEY_RE = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+# Chave concluida vale por 24h; depois disso o mesmo valor inicia um checkout novo.
+IDEMPOTENCY_TTL = timedelta(hours=24)
+# Checkout "processando" ha mais que isso e de um worker que morreu (a transacao do pedido foi desfeita).
+IDEMPOTENCY_STALE_PROCESSING = timedelta(minutes=2)
+
+
+def checkout_idempotency_key(request, payload=None):
+    key = str(request.headers.get(IDEMPOTENCY_HEADER) or '').strip()
+    if not key and isinstance(payload, dict):
+        key = str(payload.get('idempotency_key') or '').strip()
+    return key if IDEMPOTENCY_KEY_RE.match(key) else ''
+
+
+def _request_owner(request):
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    session_key = request.session.session_key
+    return f'session:{session_key}' if session_key else ''
+
+
+def _claim(scope, key, owner, request_hash):
+    """Retorna `(registro, resposta)`: resposta preenchida quando o checkout nao deve rodar de novo."""
+    now = timezone.now()
+    for _attempt in range(2):
+        try:
+            with transaction.atomic():
+                record = LojaCheckoutIdempotencia.objects.create(
+                    scope=scope,
+                    key=key,
+                    owner=owner,
+                    request_hash=request_hash,
+                )
+            return record, None
+        except IntegrityError:
+            record = LojaCheckoutIdempotencia.objects.filter(scope=scope, key=key).first()
+        if record is None:
+            continue
+        expired = (
+            record.created_at < now - IDEMPOTENCY_TTL
+            or (
+                record.status == LojaCheckoutIdempotencia.STATUS_PROCESSING
+                and record.updated_at < now - IDEMPOTENCY_STALE_PROCESSING
+            )
+        )
+        if expired:
+            LojaCheckoutIdempotencia.objects.filter(pk=record.pk, updated_at=record.updated_at).delete()
+            continue
+        if record.owner != owner or record.request_hash != request_hash:
+            return None, JsonResponse({
+                'ok': False,
+                'error': 'idempotency_key_reused',
+                'message': 'Este pedido ja foi enviado com outros dados. Atualize a pagina e tente novamente.',
+            }, status=422)
+        if record.status == LojaCheckoutIdempotencia.STATUS_DONE:
+            response = JsonResponse(record.response)
+            response['Idempotent-Replayed'] = 'true'
+            return None, response
+        return None, JsonResponse({
+            'ok': False,
+            'error': 'checkout_in_progress',
+            'message': 'Seu pedido ainda esta sendo gerado. Aguarde alguns segundos.',
+        }, status=409)
+    return None, JsonResponse({'ok': False, 'error': 'pedido_create_failed'}, status=409)
+
+
+def run_idempotent_checkout(request, scope, create_response):
+    """Executa `create_response()` uma unica vez por chave de idempotencia do cliente.
+
+    A chave vem do header `Idempotency-Key` (ou do campo `idempotency_key` do JSON).
+    Reenvio com a mesma chave devolve a resposta original - mesmo pedido e mesmo Pix -
+    sem criar pedido, reservar cashback ou chamar o Mercado Pago de novo. Resposta de
+    erro nao fica gravada: o cliente pode repetir a mesma chave depois de corrigir.
+    Sem chave o checkout roda como antes.
+    """
+    try:
+        payload = json.loads((request.body or b'').decode('utf-8') or '{}')
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        payload = None
+    key = checkout_idempotency_key(request, payload)
+    owner = _request_owner(request)
+    if not key or not owner:
+        return create_response()
+
+    request_hash = hashlib.sha256(request.body or b'').hexdigest()
+    record, replay = _claim(scope, key, owner, request_hash)
+    if replay is not None:
+        return replay
+
+    try:
+        response = create_response()
+    except BaseException:
+        record.delete()
+        raise
+    try:
+        data = json.loads(response.content.decode('utf-8') or '{}')
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        data = {}
+    if response.status_code != 200 or not data.get('ok'):
+        record.delete()
+        return response
+
+    pedido_id = (data.get('pedido') or {}).get('pedido_id')
+    record.response = data
+    record.pedido_id = pedido_id if isinstance(pedido_id, int) else None
+    record.status = LojaCheckoutIdempotencia.STATUS_DONE
+    record.save(update_fields=['response', 'pedido', 'status', 'updated_at'])
+    LojaCheckoutIdempotencia.objects.filter(created_at__lt=timezone.now() - IDEMPOTENCY_TTL).delete()
+    return response
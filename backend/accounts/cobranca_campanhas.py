@@ -0,0 +1,272 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import (
+    CobrancaMensalidadeCampanha,
+    CobrancaMensalidadeEnvio,
+    MensalidadeAventureiro,
+    WhatsAppQueue,
+    WhatsAppTemplate,
+)
+
+# Itens da campanha que ainda podem sair; o resto ja terminou (enviado, falhou ou cancelado).
+OPEN_QUEUE_STATUSES = [WhatsAppQueue.STATUS_PENDING, WhatsAppQueue.STATUS_PROCESSING, WhatsAppQueue.STATUS_PAUSED]
+
+
+def create_campanha(entries, *, pause_seconds, aventureiro=None, created_by=None, skipped_sem_usuario=0, skipped_sem_telefone=()):
+    """Cria a campanha e enfileira uma mensagem por destinatario, espacadas por `pause_seconds`.
+
+    `entries` e uma lista de dicts com `user`, `phone_number`, `message_text`,
+    `responsavel_nome`, `mensalidade_ids` e `total_em_aberto`. O envio fica com o
+    worker da fila WhatsApp (`process_whatsapp_queue`).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        campanha = CobrancaMensalidadeCampanha.objects.create(
+            aventureiro=aventureiro,
+            pause_seconds=pause_seconds,
+            total_responsaveis=len(entries),
+            total_mensalidades=sum(len(entry['mensalidade_ids']) for entry in entries),
+            skipped_sem_usuario=skipped_sem_usuario,
+            skipped_sem_telefone=len(skipped_sem_telefone),
+            skipped_sem_telefone_nomes=list(skipped_sem_telefone)[:50],
+            created_by=created_by,
+        )
+        queue_items = WhatsAppQueue.objects.bulk_create([
+            WhatsAppQueue(
+                user=entry['user'],
+                phone_number=entry['phone_number'],
+                notification_type=WhatsAppQueue.TYPE_COBRANCA_MENSALIDADE,
+                message_text=entry['message_text'],
+                status=WhatsAppQueue.STATUS_PENDING,
+                next_attempt_at=now + timedelta(seconds=index * pause_seconds),
+            )
+            for index, entry in enumerate(entries)
+        ])
+        CobrancaMensalidadeEnvio.objects.bulk_create([
+            CobrancaMensalidadeEnvio(
+                campanha=campanha,
+                queue_item=queue_item,
+                responsavel_nome=entry['responsavel_nome'][:200],
+                mensalidade_ids=list(entry['mensalidade_ids']),
+                total_em_aberto=entry['total_em_aberto'],
+            )
+            for queue_item, entry in zip(queue_items, entries)
+        ])
+        if not entries:
+            campanha.status = CobrancaMensalidadeCampanha.STATUS_DONE
+            campanha.finished_at = now
+            campanha.save(update_fields=['status', 'finished_at', 'updated_at'])
+    return campanha
+
+
+def _campanha_queue(campanha):
+    return WhatsAppQueue.objects.filter(cobranca_envio__campanha=campanha)
+
+
+def active_campanha():
+    """Campanha ainda enviando ou pausada (no maximo uma por vez)."""
+    for campanha in CobrancaMensalidadeCampanha.objects.filter(
+        status__in=[CobrancaMensalidadeCampanha.STATUS_RUNNING, CobrancaMensalidadeCampanha.STATUS_PAUSED],
+    ):
+        _refresh_finished(campanha)
+        if campanha.status != CobrancaMensalidadeCampanha.STATUS_DONE:
+            return campanha
+    return None
+
+
+def _refresh_finished(campanha):
+    if campanha.status != CobrancaMensalidadeCampanha.STATUS_RUNNING:
+        return
+    if _campanha_queue(campanha).filter(status__in=OPEN_QUEUE_STATUSES).exists():
+        return
+    campanha.status = CobrancaMensalidadeCampanha.STATUS_DONE
+    campanha.finished_at = timezone.now()
+    campanha.save(update_fields=['status', 'finished_at', 'updated_at'])
+
+
+def pause_campanha(campanha):
+    if campanha.status != CobrancaMensalidadeCampanha.STATUS_RUNNING:
+        return False
+    with transaction.atomic():
+        _campanha_queue(campanha).filter(status=WhatsAppQueue.STATUS_PENDING).update(
+            status=WhatsAppQueue.STATUS_PAUSED,
+        )
+        campanha.status = CobrancaMensalidadeCampanha.STATUS_PAUSED
+        campanha.save(update_fields=['status', 'updated_at'])
+    return True
+
+
+def resume_campanha(campanha):
+    """Retoma a partir de agora, mantendo o intervalo; quem ja quitou tudo sai da fila."""
+    if campanha.status != CobrancaMensalidadeCampanha.STATUS_PAUSED:
+        return False
+    envios = list(
+        CobrancaMensalidadeEnvio.objects
+        .filter(campanha=campanha, queue_item__status=WhatsAppQueue.STATUS_PAUSED)
+        .select_related('queue_item')
+        .order_by('queue_item__next_attempt_at', 'id')
+    )
+    pending_ids = set(
+        MensalidadeAventureiro.objects
+        .filter(
+            pk__in={pk for envio in envios for pk in envio.mensalidade_ids},
+            status=MensalidadeAventureiro.STATUS_PENDENTE,
+        )
+        .values_list('pk', flat=True)
+    )
+    now = timezone.now()
+    to_resume = []
+    to_cancel = []
+    for envio in envios:
+        item = envio.queue_item
+        if pending_ids.intersection(envio.mensalidade_ids):
+            item.status = WhatsAppQueue.STATUS_PENDING
+            item.next_attempt_at = now + timedelta(seconds=len(to_resume) * campanha.pause_seconds)
+            to_resume.append(item)
+        else:
+            item.status = WhatsAppQueue.STATUS_CANCELLED
+            item.last_error = 'Mensalidades quitadas antes do envio.'
+            to_cancel.append(item)
+    with transaction.atomic():
+        WhatsAppQueue.objects.bulk_update(to_resume, ['status', 'next_attempt_at'])
+        WhatsAppQueue.objects.bulk_update(to_cancel, ['status', 'last_error'])
+        campanha.status = CobrancaMensalidadeCampanha.STATUS_RUNNING
+        campanha.save(update_fields=['status', 'updated_at'])
+    _refresh_finished(campanha)
+    return True
+
+
+def cancel_campanha(campanha):
+    if campanha.status not in {CobrancaMensalidadeCampanha.STATUS_RUNNING, CobrancaMensalidadeCampanha.STATUS_PAUSED}:
+        return False
+    with transaction.atomic():
+        _campanha_queue(campanha).filter(
+            status__in=[WhatsAppQueue.STATUS_PENDING, WhatsAppQueue.STATUS_PAUSED],
+        ).update(status=WhatsAppQueue.STATUS_CANCELLED, last_error='Campanha cancelada.')
+        campanha.status = CobrancaMensalidadeCampanha.STATUS_CANCELLED
+        campanha.finished_at = timezone.now()
+        campanha.save(update_fields=['status', 'finished_at', 'updated_at'])
+    return True
+
+
+def mark_cobranca_enviada(queue_item):
+    """Chamado pelo worker depois do envio: registra a data da cobranca nas mensalidades.
+
+    Inclui as cobrancas agrupadas nesta mensagem (`merged_into`) pela fila.
+    """
+    mensalidade_ids = {
+        pk
+        for ids in (
+            CobrancaMensalidadeEnvio.objects
+            .filter(Q(queue_item_id=queue_item.pk) | Q(queue_item__merged_into_id=queue_item.pk))
+            .values_list('mensalidade_ids', flat=True)
+        )
+        for pk in ids
+    }
+    if mensalidade_ids:
+        MensalidadeAventureiro.objects.filter(pk__in=mensalidade_ids).update(
+            cobranca_whatsapp_enviada_at=queue_item.sent_at,
+        )
+
+
+def cobranca_pendente_para_envio(queue_item):
+    """Texto da cobranca so com as mensalidades ainda pendentes; `None` se nada ficou pendente.
+
+    Chamado pelo worker logo antes do envio: a campanha agenda as mensagens com ate
+    `N * pause_seconds` de antecedencia e a familia pode pagar nesse meio tempo.
+    Inclui as cobrancas agrupadas nesta mensagem (`merged_into`) pela fila.
+    """
+    envios = list(
+        CobrancaMensalidadeEnvio.objects
+        .filter(Q(queue_item_id=queue_item.pk) | Q(queue_item__merged_into_id=queue_item.pk))
+        .order_by('queue_item__created_at', 'queue_item_id')
+    )
+    mensalidade_ids = {pk for envio in envios for pk in envio.mensalidade_ids}
+    if not mensalidade_ids:
+        return queue_item.message_text
+    pending = {
+        item.pk: item
+        for item in (
+            MensalidadeAventureiro.objects
+            .filter(
+                pk__in=mensalidade_ids,
+                status=MensalidadeAventureiro.STATUS_PENDENTE,
+                aventureiro__ativo=True,
+                aventureiro__responsavel__ativo=True,
+            )
+            .select_related('aventureiro')
+        )
+    }
+    if not pending:
+        return None
+    if len(pending) == len(mensalidade_ids):
+        return queue_item.message_text
+
+    from .views import FinanceiroView
+    from .whatsapp import WHATSAPP_DIGEST_SEPARATOR, get_template_message
+
+    helper = FinanceiroView()
+    template = get_template_message(WhatsAppTemplate.TYPE_COBRANCA_MENSALIDADE)
+    hoje = timezone.localdate()
+    textos = []
+    for envio in envios:
+        items = [pending[pk] for pk in envio.mensalidade_ids if pk in pending]
+        if items:
+            textos.append(helper._cobranca_message_text(template, envio.responsavel_nome, items, hoje).strip())
+    return WHATSAPP_DIGEST_SEPARATOR.join(textos)
+
+
+def campanha_progress(campanha):
+    _refresh_finished(campanha)
+    counts = dict(
+        _campanha_queue(campanha)
+        .order_by()
+        .values('status')
+        .annotate(total=Count('id'))
+        .values_list('status', 'total')
+    )
+    sent = counts.get(WhatsAppQueue.STATUS_SENT, 0)
+    failed = counts.get(WhatsAppQueue.STATUS_FAILED, 0)
+    cancelled = counts.get(WhatsAppQueue.STATUS_CANCELLED, 0)
+    envios = (
+        CobrancaMensalidadeEnvio.objects
+        .filter(campanha=campanha)
+        .select_related('queue_item')
+        .order_by('id')
+    )
+    return {
+        'ok': True,
+        'campanha_id': campanha.pk,
+        'status': campanha.status,
+        'status_label': campanha.get_status_display(),
+        'pause_seconds': campanha.pause_seconds,
+        'total_responsaveis': campanha.total_responsaveis,
+        'total_mensalidades': campanha.total_mensalidades,
+        'skipped_sem_usuario': campanha.skipped_sem_usuario,
+        'skipped_sem_telefone': campanha.skipped_sem_telefone,
+        'skipped_sem_telefone_nomes': campanha.skipped_sem_telefone_nomes[:10],
+        'sent': sent,
+        'failed': failed,
+        'cancelled': cancelled,
+        'done': sent + failed + cancelled,
+        'envios': [
+            {
+                'responsavel_nome': envio.responsavel_nome,
+                'phone_number': envio.queue_item.phone_number,
+                'mensalidades': len(envio.mensalidade_ids),
+                'status': envio.queue_item.status,
+                'status_label': envio.queue_item.get_status_display(),
+                'attempts': envio.queue_item.attempts,
+                'last_error': envio.queue_item.last_error[:200],
+                'next_attempt_at': (
+                    timezone.localtime(envio.queue_item.next_attempt_at).strftime('%H:%M:%S')
+                    if envio.queue_item.status == WhatsAppQueue.STATUS_PENDING else ''
+                ),
+            }
+            for envio in envios
+        ],
+    }
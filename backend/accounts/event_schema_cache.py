@@ -0,0 +1,49 @@
+import threading
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+# Mude quando a montagem do schema (EventoPublicoView._compile_event_schema) mudar.
+EVENT_SCHEMA_CACHE_VERSION = 1
+EVENT_SCHEMA_CACHE_TIMEOUT = 24 * 60 * 60
+EVENT_SCHEMA_LOCAL_ITEMS = 256
+
+_local = OrderedDict()
+_local_lock = threading.Lock()
+
+
+def event_schema_cache_key(evento):
+    updated_at = getattr(evento, 'updated_at', None)
+    stamp = updated_at.isoformat() if updated_at else ''
+    return f'accounts:evento_schema:v{EVENT_SCHEMA_CACHE_VERSION}:{evento.pk}:{stamp}'
+
+
+def clear_local_event_schemas():
+    with _local_lock:
+        _local.clear()
+
+
+def get_cached_event_schema(evento, builder):
+    """Schema do formulario do evento compilado uma vez por `(evento.id, updated_at)`.
+
+    Fica no cache compartilhado (todos os workers) e numa copia em memoria do processo.
+    Qualquer `save()` do evento muda o `updated_at` e, com ele, a chave. O schema
+    devolvido e compartilhado: trate como somente leitura.
+    """
+    if not getattr(evento, 'pk', None) or not getattr(evento, 'updated_at', None):
+        return builder()
+    key = event_schema_cache_key(evento)
+    with _local_lock:
+        schema = _local.get(key)
+        if schema is not None:
+            _local.move_to_end(key)
+            return schema
+    schema = cache.get(key)
+    if schema is None:
+        schema = builder()
+        cache.set(key, schema, EVENT_SCHEMA_CACHE_TIMEOUT)
+    with _local_lock:
+        _local[key] = schema
+        while len(_local) > EVENT_SCHEMA_LOCAL_ITEMS:
+            _local.popitem(last=False)
+    return schema
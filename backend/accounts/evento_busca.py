@@ -0,0 +1,139 @@
+import logging
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .field_keys import classify_field_keys, normalize_lookup_text
+from .models import EventoInscricao, EventoInscricaoBusca
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'accounts_eventoinscricaobusca_fts'
+# O tokenizador trigram do FTS5 so indexa trechos de 3 caracteres ou mais.
+FTS_MIN_CHARS = 3
+BUSCA_LIMITE = 400
+
+_fts_state = {'disponivel': None}
+
+
+def _digits(value):
+    return re.sub(r'\D', '', str(value or ''))
+
+
+def montar_busca(inscricao, helper=None):
+    """Campos de `EventoInscricaoBusca` para a inscricao (mesmos textos que a consulta comparava)."""
+    from .views import EventoPublicoView
+
+    helper = helper or EventoPublicoView()
+    dados = inscricao.dados if isinstance(inscricao.dados, dict) else {}
+    responsavel = inscricao.responsavel if inscricao.responsavel_id else None
+    partes = [
+        helper._responsavel_label_from_inscricao(inscricao),
+        helper._criancas_info_from_inscricao(inscricao, evento=inscricao.evento).get('resumo', ''),
+        helper._dados_resumo(dados),
+        inscricao.codigo_inscricao,
+    ]
+    telefones = set()
+    if responsavel:
+        partes += [responsavel.responsavel_nome, responsavel.mae_nome, responsavel.pai_nome]
+        for raw in [
+            responsavel.responsavel_celular,
+            responsavel.pai_celular,
+            responsavel.mae_celular,
+            responsavel.responsavel_telefone,
+            responsavel.pai_telefone,
+            responsavel.mae_telefone,
+        ]:
+            telefones.add(_digits(raw))
+    for key, (_norm_key, roles) in classify_field_keys(tuple(dados)).items():
+        if 'phone' in roles and not isinstance(dados[key], (list, tuple, dict)):
+            telefones.add(_digits(dados[key]))
+    return {
+        'evento_id': inscricao.evento_id,
+        'cancelada': bool(inscricao.cancelada),
+        'codigo': str(inscricao.codigo_inscricao or '').strip(),
+        'documento': normalize_lookup_text(' | '.join(str(parte or '').strip() for parte in partes if str(parte or '').strip())),
+        'cpfs': ' '.join(sorted(helper._cpf_candidates_from_inscricao(inscricao)))[:255],
+        'telefones': ' '.join(sorted(phone for phone in telefones if len(phone) >= 8))[:255],
+    }
+
+
+def atualizar_busca(inscricoes):
+    """Regrava o documento de busca das inscricoes informadas."""
+    from .views import EventoPublicoView
+
+    helper = EventoPublicoView()
+    done = 0
+    for inscricao in inscricoes:
+        try:
+            EventoInscricaoBusca.objects.update_or_create(inscricao=inscricao, defaults=montar_busca(inscricao, helper))
+            done += 1
+        except Exception:
+            logger.exception('Falha ao atualizar busca da inscricao id=%s.', inscricao.pk)
+    return done
+
+
+def garantir_busca(evento):
+    """Monta o documento das inscricoes do evento que ainda nao tem (anteriores a tabela)."""
+    faltando = (
+        EventoInscricao.objects
+        .filter(evento=evento, busca__isnull=True)
+        .select_related('evento', 'responsavel')
+    )
+    return atualizar_busca(faltando)
+
+
+def fts_disponivel():
+    if _fts_state['disponivel'] is None:
+        disponivel = False
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+                disponivel = cursor.fetchone() is not None
+        _fts_state['disponivel'] = disponivel
+    return _fts_state['disponivel']
+
+
+def _fts_frase(colunas, termo):
+    return '{%s} : "%s"' % (' '.join(colunas), termo.replace('"', '""'))
+
+
+def buscar_inscricao_ids(evento, *, texto='', digitos='', colunas_digitos=('cpfs', 'telefones'), limit=BUSCA_LIMITE):
+    """Ids das inscricoes ativas do evento cujo documento contem `texto` ou `digitos`.
+
+    `texto` ja deve vir normalizado (`normalize_lookup_text`). Mais recentes primeiro.
+    """
+    texto = str(texto or '').strip()
+    digitos = _digits(digitos)
+    if not texto and not digitos:
+        return []
+    termos = [len(termo) for termo in (texto, digitos) if termo]
+    if fts_disponivel() and min(termos) >= FTS_MIN_CHARS:
+        frases = []
+        if texto:
+            frases.append(_fts_frase(['documento'], texto))
+        if digitos:
+            frases.append(_fts_frase(colunas_digitos, digitos))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT b.inscricao_id FROM {FTS_TABLE} f '
+                f'JOIN {EventoInscricaoBusca._meta.db_table} b ON b.id = f.rowid '
+                f'WHERE {FTS_TABLE} MATCH %s AND b.evento_id = %s AND b.cancelada = %s '
+                f'ORDER BY b.inscricao_id DESC LIMIT %s',
+                [' OR '.join(frases), evento.pk, False, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    # Sem FTS (Postgres usa os indices trigram de pg_trgm para o LIKE) ou termo curto.
+    filtro = Q()
+    if texto:
+        filtro |= Q(documento__contains=texto)
+    for coluna in colunas_digitos if digitos else ():
+        filtro |= Q(**{f'{coluna}__contains': digitos})
+    return list(
+        EventoInscricaoBusca.objects
+        .filter(filtro, evento=evento, cancelada=False)
+        .order_by('-inscricao_id')
+        .values_list('inscricao_id', flat=True)[:limit]
+    )
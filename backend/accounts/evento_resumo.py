@@ -0,0 +1,156 @@
+import logging
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import Evento, EventoCusto, EventoInscricao, EventoResumo, LojaPedido
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal('0.00')
+
+_pending = threading.local()
+
+
+def _pending_state():
+    if not hasattr(_pending, 'ids'):
+        _pending.ids = set()
+        _pending.deferred = 0
+    return _pending
+
+
+def compute_evento_resumo(evento):
+    """Recalcula e grava os totais de um evento (mesmas regras da lista de eventos)."""
+    from .views import EventoPublicoView, _evento_inscricoes_excluir_teste_ids, _pedido_evento_itens_total
+
+    helper = EventoPublicoView()
+    excluir_teste_ids = _evento_inscricoes_excluir_teste_ids(evento)
+    inscricoes = (
+        EventoInscricao.objects
+        .filter(evento=evento, confirmada=True, cancelada=False)
+        .exclude(id__in=list(excluir_teste_ids))
+        .select_related('responsavel')
+        .prefetch_related('responsavel__aventures')
+    )
+    participantes = 0
+    inscricoes_confirmadas = 0
+    inscricoes_valor_total = ZERO
+    for inscricao in inscricoes:
+        inscricoes_confirmadas += 1
+        participantes += helper._inscricao_participantes_count(inscricao, evento=evento)
+        inscricoes_valor_total += Decimal(inscricao.valor_inscricao or ZERO)
+
+    pedidos = (
+        LojaPedido.objects
+        .filter(evento=evento, transacao_teste=False)
+        .exclude(status=LojaPedido.STATUS_CANCELADO)
+    )
+    pedidos_count = pedidos.count()
+    pedidos_pagos = 0
+    pedidos_total_pago = ZERO
+    valor_bruto = ZERO
+    valor_por_forma = {}
+    for pedido in pedidos.filter(status=LojaPedido.STATUS_PAGO).prefetch_related('itens').for_listing():
+        pedidos_pagos += 1
+        pedidos_total_pago += _pedido_evento_itens_total(pedido)
+        valor_pedido = Decimal(pedido.valor_total or ZERO)
+        valor_bruto += valor_pedido
+        valor_por_forma[pedido.forma_pagamento] = valor_por_forma.get(pedido.forma_pagamento, ZERO) + valor_pedido
+
+    custos_total = Decimal(
+        EventoCusto.objects.filter(evento=evento).aggregate(total=Sum('valor'))['total'] or ZERO
+    )
+    receita_total = pedidos_total_pago + inscricoes_valor_total
+    resumo, _ = EventoResumo.objects.update_or_create(
+        evento=evento,
+        defaults={
+            'participantes': participantes,
+            'inscricoes_confirmadas': inscricoes_confirmadas,
+            'pedidos_count': pedidos_count,
+            'pedidos_pagos': pedidos_pagos,
+            'pedidos_total_pago': pedidos_total_pago.quantize(ZERO),
+            'inscricoes_valor_total': inscricoes_valor_total.quantize(ZERO),
+            'valor_bruto': valor_bruto.quantize(ZERO),
+            'valor_pix': valor_por_forma.get(LojaPedido.FORMA_PAGAMENTO_PIX, ZERO).quantize(ZERO),
+            'valor_cartao': valor_por_forma.get(LojaPedido.FORMA_PAGAMENTO_CARTAO, ZERO).quantize(ZERO),
+            'custos_total': custos_total.quantize(ZERO),
+            'receita_total': receita_total.quantize(ZERO),
+            'lucro_liquido': (receita_total - custos_total).quantize(ZERO),
+        },
+    )
+    return resumo
+
+
+def refresh_evento_resumos(evento_ids):
+    done = 0
+    for evento in Evento.objects.filter(pk__in=set(evento_ids)):
+        try:
+            compute_evento_resumo(evento)
+            done += 1
+        except Exception:
+            logger.exception('Falha ao atualizar resumo do evento id=%s.', evento.pk)
+    return done
+
+
+def _flush_pending():
+    state = _pending_state()
+    if state.deferred or not state.ids:
+        return
+    evento_ids, state.ids = state.ids, set()
+    refresh_evento_resumos(evento_ids)
+
+
+def schedule_evento_resumo(evento_id):
+    """Marca o evento para recalculo depois do commit (varias alteracoes viram um recalculo so)."""
+    if not evento_id:
+        return
+    state = _pending_state()
+    state.ids.add(evento_id)
+    if not state.deferred:
+        transaction.on_commit(_flush_pending)
+
+
+def schedule_resumos_do_responsavel(responsavel_id):
+    """Recalcula os eventos em que o responsavel tem inscricao confirmada.
+
+    Inscricao sem criancas nos dados conta os aventureiros do responsavel como participantes.
+    """
+    if not responsavel_id:
+        return
+    evento_ids = (
+        EventoInscricao.objects
+        .filter(responsavel_id=responsavel_id, confirmada=True, cancelada=False)
+        .values_list('evento_id', flat=True)
+        .distinct()
+    )
+    for evento_id in evento_ids:
+        schedule_evento_resumo(evento_id)
+
+
+@contextmanager
+def adiar_evento_resumos():
+    """Segura os recalculos ate o fim do bloco (ex.: sincronizacao de pagamentos em lote)."""
+    state = _pending_state()
+    state.deferred += 1
+    try:
+        yield
+    finally:
+        state.deferred -= 1
+        if not state.deferred:
+            transaction.on_commit(_flush_pending)
+
+
+def evento_resumos_map(eventos):
+    """Resumo por id de evento; eventos ainda sem resumo sao calculados na hora."""
+    resumos = {resumo.evento_id: resumo for resumo in EventoResumo.objects.all()}
+    for evento in eventos:
+        if evento.pk in resumos:
+            continue
+        try:
+            resumos[evento.pk] = compute_evento_resumo(evento)
+        except Exception:
+            logger.exception('Falha ao calcular resumo do evento id=%s.', evento.pk)
+    return resumos
@@ -0,0 +1,71 @@
+import difflib
+import re
+import unicodedata
+from functools import lru_cache
+
+# Papeis que as chaves livres do formulario de evento podem ter (ex.: "CPF do responsavel"
+# e `responsavel` + `cpf`). A comparacao aproximada roda uma vez por chave distinta; as
+# linhas de `EventoInscricao.dados` repetem as mesmas chaves do schema, entao o resto
+# vira consulta ao cache.
+FIELD_KEY_ROLES = {
+    'responsavel': ('responsavel',),
+    'nome': ('nome',),
+    'cpf': ('cpf',),
+    'phone': ('telefone', 'celular', 'whatsapp'),
+    'email': ('email',),
+    'parentesco': ('parentesco',),
+    'criancas': ('crianca', 'criancas', 'filho', 'filhos', 'filha', 'filhas'),
+    'idade': ('idade', 'idades', 'ano', 'anos'),
+}
+FIELD_KEY_SIMILARITY = 0.78
+FIELD_KEY_CACHE_ITEMS = 4096
+
+
+@lru_cache(maxsize=FIELD_KEY_CACHE_ITEMS)
+def normalize_lookup_text(text):
+    text = str(text or '').strip().lower()
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return re.sub(r'\s+', ' ', text)
+
+
+@lru_cache(maxsize=FIELD_KEY_CACHE_ITEMS)
+def key_has_like(norm_key, targets):
+    """`norm_key` contem (ou lembra, por similaridade) algum dos `targets` (tupla)."""
+    key = str(norm_key or '').strip()
+    if not key:
+        return False
+    collapsed = key.replace(' ', '')
+    tokens = [item for item in re.split(r'[^a-z0-9]+', key) if item]
+    candidates = tokens + [collapsed]
+    for target in targets:
+        target_norm = normalize_lookup_text(target).replace(' ', '')
+        if not target_norm:
+            continue
+        if target_norm in collapsed:
+            return True
+        for candidate in candidates:
+            if not candidate:
+                continue
+            if target_norm in candidate:
+                return True
+            similarity = difflib.SequenceMatcher(None, candidate, target_norm).ratio()
+            if similarity >= FIELD_KEY_SIMILARITY:
+                return True
+    return False
+
+
+@lru_cache(maxsize=FIELD_KEY_CACHE_ITEMS)
+def field_key_roles(norm_key):
+    """Conjunto de papeis (chaves de `FIELD_KEY_ROLES`) de uma chave ja normalizada."""
+    return frozenset(role for role, targets in FIELD_KEY_ROLES.items() if key_has_like(norm_key, targets))
+
+
+@lru_cache(maxsize=256)
+def classify_field_keys(keys):
+    """Mapa `chave original -> (chave normalizada, papeis)` para as chaves de um schema/linha."""
+    classified = {}
+    for key in keys:
+        norm_key = normalize_lookup_text(key)
+        classified[key] = (norm_key, field_key_roles(norm_key))
+    return classified
@@ -0,0 +1,261 @@
+import http.client
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Operacao -> timeout em segundos (sobrescrito por PROVIDER_HTTP_TIMEOUTS).
+DEFAULT_TIMEOUTS = {
+    'mp_consulta': 10,
+    'mp_criacao': 20,
+    'wapi_envio': 15,
+}
+
+
+class ProviderError(Exception):
+    """Falha de rede/timeout ou circuito aberto."""
+
+
+class CircuitOpenError(ProviderError):
+    pass
+
+
+class ProviderResponse:
+    def __init__(self, status, body, headers):
+        self.status = status
+        self.body = body
+        self.headers = headers
+
+    @property
+    def ok(self):
+        return 200 <= self.status < 300
+
+    def text(self):
+        return self.body.decode('utf-8', errors='ignore')
+
+    def json(self):
+        text = self.text()
+        return json.loads(text) if text else {}
+
+
+def operation_timeout(operation, default=30):
+    timeouts = dict(DEFAULT_TIMEOUTS)
+    timeouts.update(getattr(settings, 'PROVIDER_HTTP_TIMEOUTS', {}) or {})
+    return float(timeouts.get(operation, default))
+
+
+class CircuitBreaker:
+    """Abre depois de `threshold` falhas seguidas; apos `reset_timeout` deixa passar uma tentativa."""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, threshold=5, reset_timeout=30):
+        self.threshold = max(1, int(threshold))
+        self.reset_timeout = float(reset_timeout)
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                if self.state != self.OPEN:
+                    logger.warning('Circuito aberto apos %s falhas seguidas.', self.failures)
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class TokenBucket:
+    """Limita as chamadas a `rate` por segundo, com rajada de ate `burst`."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = max(0.1, float(rate))
+        self.capacity = max(1.0, float(burst or rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class ProviderClient:
+    """Cliente HTTP de um provedor externo (Mercado Pago, W-API).
+
+    Mantem conexoes keep-alive reaproveitadas por host, novas tentativas com
+    espera aleatoria crescente, circuit breaker e metricas de latencia/erro.
+    O estado e por processo (cada worker do gunicorn tem o seu).
+    """
+
+    def __init__(self, name, *, max_idle=8, failure_threshold=5, reset_timeout=30, retries=2, backoff=0.3):
+        self.name = name
+        self.max_idle = max_idle
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._idle = {}
+        self._pool_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._latencies = deque(maxlen=500)
+        self._counters = {'requests': 0, 'errors': 0, 'retries': 0, 'rejected': 0, 'reused': 0}
+
+    def _acquire(self, scheme, host, port, timeout):
+        key = (scheme, host, port)
+        with self._pool_lock:
+            idle = self._idle.get(key)
+            conn = idle.pop() if idle else None
+        if conn is not None:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            return conn, True
+        connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return connection_class(host, port, timeout=timeout), False
+
+    def _release(self, scheme, host, port, conn):
+        key = (scheme, host, port)
+        with self._pool_lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def _count(self, name, latency=None):
+        with self._metrics_lock:
+            self._counters[name] += 1
+            if latency is not None:
+                self._latencies.append(latency)
+
+    def _send(self, method, parts, body, headers, timeout):
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        path = parts.path or '/'
+        if parts.query:
+            path = f'{path}?{parts.query}'
+        # Conexao ociosa pode ter sido fechada pelo servidor: uma segunda chance com conexao nova.
+        for fresh_retry in (False, True):
+            conn, reused = self._acquire(parts.scheme, parts.hostname, port, timeout)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                payload = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if reused and not fresh_retry:
+                    continue
+                raise
+            except BaseException:
+                conn.close()
+                raise
+            if reused:
+                self._count('reused')
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(parts.scheme, parts.hostname, port, conn)
+            return ProviderResponse(response.status, payload, dict(response.getheaders()))
+
+    def request(self, method, url, *, body=None, headers=None, operation='', timeout=None, retries=None):
+        """Executa a requisicao; qualquer status HTTP volta como resposta (5xx depois das
+        novas tentativas), falhas de rede/timeout e circuito aberto viram `ProviderError`."""
+        if not self.breaker.allow():
+            self._count('rejected')
+            raise CircuitOpenError('servico indisponivel no momento (circuito aberto).')
+        timeout = timeout or operation_timeout(operation)
+        retries = self.retries if retries is None else retries
+        parts = urlsplit(url)
+        headers = dict(headers or {})
+        headers.setdefault('Connection', 'keep-alive')
+        last_error = None
+        for attempt in range(retries + 1):
+            if attempt:
+                self._count('retries')
+                time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+            started = time.monotonic()
+            try:
+                response = self._send(method, parts, body, headers, timeout)
+            except (OSError, http.client.HTTPException) as exc:
+                self._count('errors', time.monotonic() - started)
+                last_error = exc
+                continue
+            self._count('requests', time.monotonic() - started)
+            if response.status in RETRY_STATUSES:
+                self._count('errors')
+                if attempt < retries:
+                    continue
+                self.breaker.record_failure()
+                return response
+            self.breaker.record_success()
+            return response
+        self.breaker.record_failure()
+        if isinstance(last_error, TimeoutError):
+            raise ProviderError('tempo de resposta excedido.') from last_error
+        reason = getattr(last_error, 'reason', '') or str(last_error)
+        raise ProviderError(f'falha de conexao ({reason}).') from last_error
+
+    def metrics(self):
+        with self._metrics_lock:
+            latencies = sorted(self._latencies)
+            counters = dict(self._counters)
+
+        def percentile(value):
+            if not latencies:
+                return 0
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * value))] * 1000)
+
+        counters.update({
+            'name': self.name,
+            'circuit': self.breaker.state,
+            'latency_p50_ms': percentile(0.5),
+            'latency_p95_ms': percentile(0.95),
+        })
+        return counters
+
+
+_circuit_options = {
+    'failure_threshold': getattr(settings, 'PROVIDER_CIRCUIT_FAILURES', 5),
+    'reset_timeout': getattr(settings, 'PROVIDER_CIRCUIT_RESET_SECONDS', 30),
+}
+mercadopago_client = ProviderClient('Mercado Pago', **_circuit_options)
+# Envio de mensagem nao e idempotente: sem nova tentativa automatica.
+wapi_client = ProviderClient('W-API', retries=0, **_circuit_options)
+
+
+def provider_metrics():
+    return [mercadopago_client.metrics(), wapi_client.metrics()]
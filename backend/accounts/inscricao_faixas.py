@@ -0,0 +1,181 @@
+import json
+import re
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+
+from .field_keys import classify_field_keys, normalize_lookup_text
+
+CENTAVOS = Decimal('0.01')
+# A idade vem de `\d{1,3}`, entao toda idade possivel cabe numa tabela de 0 a 999.
+IDADE_MAXIMA = 999
+_IDADE_RE = re.compile(r'\d{1,3}')
+DIRETORIA_VALORES_SIM = {'sim', 's', 'true', '1', 'yes'}
+
+
+def _row_has_any_value(row):
+    return isinstance(row, dict) and any(str(value or '').strip() for value in row.values())
+
+
+def _row_value(row, norm_target):
+    # Mesmo criterio de `EventoPublicoView._get_row_value_by_normalized_key`: primeira
+    # chave da linha cuja forma normalizada bate com o alvo.
+    for key, (norm_key, _roles) in classify_field_keys(tuple(row)).items():
+        if norm_key == norm_target:
+            return str(row.get(key) or '').strip()
+    return ''
+
+
+class TabelaFaixasIdade:
+    """`inscricao_valor_config` (modo faixa de idade) compilada numa tabela de regras.
+
+    `faixas` guarda as faixas validas na ordem da configuracao e `faixa_por_idade`
+    e um vetor indexado pela idade (0..999) com o indice da primeira faixa que a
+    cobre. Casar uma linha com a faixa vira uma consulta ao vetor, sem reler e
+    converter as faixas para cada participante. Compartilhada: somente leitura.
+    """
+
+    def __init__(self, *, repeat_field, age_field, faixas, diretoria_value, configurada):
+        self.repeat_field = repeat_field
+        self.age_field = age_field
+        self.age_field_key = normalize_lookup_text(age_field)
+        self.faixas = tuple(faixas)
+        self.diretoria_value = diretoria_value
+        self.configurada = configurada
+        faixa_por_idade = [None] * (IDADE_MAXIMA + 1)
+        for indice in range(len(self.faixas) - 1, -1, -1):
+            faixa = self.faixas[indice]
+            inicio = max(faixa['min'], 0)
+            fim = min(faixa['max'], IDADE_MAXIMA)
+            if inicio <= fim:
+                faixa_por_idade[inicio:fim + 1] = [indice] * (fim - inicio + 1)
+        self.faixa_por_idade = tuple(faixa_por_idade)
+
+    def ordenada(self):
+        """Mesma tabela com as faixas em ordem crescente (usada no relatorio em PDF)."""
+        return compile_faixas_idade_ordenada(self)
+
+    def faixa_da_idade(self, idade):
+        if idade is None or not 0 <= idade <= IDADE_MAXIMA:
+            return None
+        return self.faixa_por_idade[idade]
+
+    def idade_da_linha(self, row):
+        match = _IDADE_RE.search(_row_value(row, self.age_field_key))
+        return int(match.group(0)) if match else None
+
+    def valor_da_faixa(self, faixa_indice, is_diretoria):
+        if is_diretoria and self.diretoria_value is not None:
+            return self.diretoria_value
+        return self.faixas[faixa_indice]['value']
+
+
+def _parse_faixas(ranges):
+    faixas = []
+    for item in ranges:
+        if not isinstance(item, dict):
+            continue
+        try:
+            min_age = int(item.get('min'))
+            max_age = int(item.get('max'))
+            value = Decimal(str(item.get('value') or '0')).quantize(CENTAVOS)
+        except (TypeError, ValueError, InvalidOperation):
+            continue
+        # Faixa invertida nunca casa com nenhuma idade; fica fora da tabela.
+        if max_age < min_age:
+            continue
+        faixas.append({'min': min_age, 'max': max_age, 'value': value})
+    return faixas
+
+
+@lru_cache(maxsize=128)
+def _compile_config(config_json):
+    config = json.loads(config_json)
+    repeat_field = str(config.get('repeat_field') or '').strip()
+    age_field = str(config.get('age_field') or '').strip()
+    ranges = config.get('ranges') if isinstance(config.get('ranges'), list) else []
+    diretoria_value = None
+    diretoria_value_raw = config.get('diretoria_value')
+    if diretoria_value_raw not in {None, ''}:
+        try:
+            diretoria_value = Decimal(str(diretoria_value_raw or '0')).quantize(CENTAVOS)
+        except (TypeError, ValueError, InvalidOperation):
+            diretoria_value = None
+    return TabelaFaixasIdade(
+        repeat_field=repeat_field,
+        age_field=age_field,
+        faixas=_parse_faixas(ranges),
+        diretoria_value=diretoria_value,
+        configurada=bool(repeat_field and age_field and ranges),
+    )
+
+
+def compile_faixas_idade(config):
+    """Tabela compilada da configuracao; `None` se a configuracao nao for um dict."""
+    if not isinstance(config, dict):
+        return None
+    return _compile_config(json.dumps(config, sort_keys=True, default=str))
+
+
+@lru_cache(maxsize=128)
+def compile_faixas_idade_ordenada(tabela):
+    return TabelaFaixasIdade(
+        repeat_field=tabela.repeat_field,
+        age_field=tabela.age_field,
+        faixas=sorted(tabela.faixas, key=lambda faixa: (faixa['min'], faixa['max'])),
+        diretoria_value=tabela.diretoria_value,
+        configurada=tabela.configurada,
+    )
+
+
+def precificar_linhas(tabela, inscricoes, *, diretoria_key):
+    """Precifica de uma vez as linhas do repetidor de varias inscricoes.
+
+    Devolve uma linha por item preenchido do repetidor, na ordem das inscricoes:
+    `inscricao`, `posicao` (indice no repetidor, a partir de 0), `row`, `idade`,
+    `faixa` (indice em `tabela.faixas`), `is_diretoria` e `valor` (sem desconto).
+    Linhas sem idade numerica ou fora das faixas vem com `faixa`/`valor` em `None`.
+    """
+    if tabela is None or not tabela.configurada:
+        return []
+    linhas = []
+    idades = []
+    for inscricao in inscricoes or []:
+        dados = getattr(inscricao, 'dados', None) if inscricao is not None else None
+        if not isinstance(dados, dict):
+            continue
+        repeat_rows = dados.get(tabela.repeat_field)
+        if not isinstance(repeat_rows, list):
+            continue
+        for posicao, row in enumerate(repeat_rows):
+            if not _row_has_any_value(row):
+                continue
+            linhas.append({
+                'inscricao': inscricao,
+                'posicao': posicao,
+                'row': row,
+                'is_diretoria': normalize_lookup_text(_row_value(row, diretoria_key)) in DIRETORIA_VALORES_SIM,
+            })
+            idades.append(tabela.idade_da_linha(row))
+
+    # Segunda passada sobre os vetores ja extraidos: idade -> faixa -> valor.
+    faixas = [tabela.faixa_da_idade(idade) for idade in idades]
+    for linha, idade, faixa in zip(linhas, idades, faixas):
+        linha['idade'] = idade
+        linha['faixa'] = faixa
+        linha['valor'] = None if faixa is None else tabela.valor_da_faixa(faixa, linha['is_diretoria'])
+    return linhas
+
+
+def totais_por_faixa(tabela, linhas):
+    """Quantidade por faixa, separando a diretoria: `(quantidades, quantidades_diretoria)`."""
+    quantidades = [0] * len(tabela.faixas)
+    quantidades_diretoria = [0] * len(tabela.faixas)
+    for linha in linhas:
+        faixa = linha['faixa']
+        if faixa is None:
+            continue
+        if linha['is_diretoria']:
+            quantidades_diretoria[faixa] += 1
+        else:
+            quantidades[faixa] += 1
+    return quantidades, quantidades_diretoria
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from accounts.retention import enable_incremental_vacuum, run_retention
+
+
+class Command(BaseCommand):
+    help = 'Arquiva (JSONL.gz mensal) e remove auditoria e fila WhatsApp antigas; limpa sessoes expiradas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--audit-days', type=int, default=None, help='Idade minima (dias) dos logs de auditoria arquivados.')
+        parser.add_argument('--whatsapp-days', type=int, default=None, help='Idade minima (dias) das mensagens WhatsApp arquivadas.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Linhas apagadas por transacao.')
+        parser.add_argument('--pause', type=float, default=0.05, help='Pausa entre lotes, em segundos.')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas conta o que seria arquivado.')
+        parser.add_argument('--no-vacuum', action='store_true', help='Nao executa o incremental_vacuum no final.')
+        parser.add_argument(
+            '--enable-incremental-vacuum',
+            action='store_true',
+            help='Ativa auto_vacuum=INCREMENTAL no SQLite (executa um VACUUM completo uma unica vez).',
+        )
+
+    def handle(self, *args, **options):
+        if options['enable_incremental_vacuum']:
+            if enable_incremental_vacuum():
+                self.stdout.write(self.style.SUCCESS('auto_vacuum=INCREMENTAL ativado.'))
+            else:
+                self.stdout.write(self.style.WARNING('Banco nao e SQLite; nada a fazer.'))
+
+        result = run_retention(
+            audit_days=options['audit_days'],
+            whatsapp_days=options['whatsapp_days'],
+            batch_size=options['batch_size'],
+            pause=max(0.0, options['pause']),
+            dry_run=options['dry_run'],
+            vacuum=not options['no_vacuum'],
+        )
+        prefix = 'Seriam arquivados' if options['dry_run'] else 'Arquivados'
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}: auditoria={result['auditlog']}, whatsapp={result['whatsappqueue']}, "
+            f"sessoes expiradas={result['sessions']}, incremental_vacuum={'sim' if result['vacuum'] else 'nao'}."
+        ))
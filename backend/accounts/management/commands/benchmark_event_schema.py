@@ -0,0 +1,81 @@
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts.event_schema_cache import clear_local_event_schemas, event_schema_cache_key, get_cached_event_schema
+from accounts.models import Evento
+from accounts.views import EventoPublicoView
+
+
+def _sample_fields(total):
+    tipos = ['texto', 'data', 'numero', 'booleano', 'seletor', 'repetidor']
+    fields = []
+    for index in range(total):
+        field_type = tipos[index % len(tipos)]
+        field = {'name': f'Campo de exemplo numero {index + 1}', 'type': field_type, 'required': index % 2 == 0}
+        if field_type == 'seletor':
+            field['options'] = [f'Opcao {option}' for option in range(1, 9)]
+        if field_type == 'repetidor':
+            field['repeat_fields_data'] = [
+                {'name': 'Nome da crianca', 'type': 'texto', 'required': True},
+                {'name': 'Data de nascimento', 'type': 'data', 'required': True},
+                {'name': 'Tamanho da camiseta', 'type': 'seletor', 'options': ['P', 'M', 'G', 'GG']},
+            ]
+        fields.append(field)
+    return fields
+
+
+class Command(BaseCommand):
+    help = 'Mede o custo do schema do formulario de evento: compilando sempre x cache compartilhado x memoria.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fields', type=int, default=30, help='Campos do evento de exemplo.')
+        parser.add_argument('--iterations', type=int, default=200, help='Repeticoes de cada medicao.')
+
+    def _measure(self, func, iterations):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        return (time.perf_counter() - started) / iterations * 1000
+
+    def handle(self, *args, **options):
+        iterations = max(1, options['iterations'])
+        # Evento em memoria (nao e gravado); o pk negativo nao colide com eventos reais.
+        evento = Evento(
+            pk=-1,
+            name='Benchmark schema',
+            fields_data=_sample_fields(max(1, options['fields'])),
+            inscricao_valor_modo=Evento.INSCRICAO_VALOR_MODO_FAIXA_IDADE_REPETIDOR,
+            inscricao_valor_config={'repeat_field': 'Campo de exemplo numero 6'},
+            updated_at=timezone.now(),
+        )
+        helper = EventoPublicoView()
+        key = event_schema_cache_key(evento)
+
+        def _shared_hit():
+            clear_local_event_schemas()
+            get_cached_event_schema(evento, lambda: helper._compile_event_schema(evento))
+
+        try:
+            compile_ms = self._measure(lambda: helper._compile_event_schema(evento), iterations)
+            get_cached_event_schema(evento, lambda: helper._compile_event_schema(evento))
+            shared_ms = self._measure(_shared_hit, iterations)
+            get_cached_event_schema(evento, lambda: helper._compile_event_schema(evento))
+            local_ms = self._measure(
+                lambda: get_cached_event_schema(evento, lambda: helper._compile_event_schema(evento)),
+                iterations,
+            )
+        finally:
+            cache.delete(key)
+            clear_local_event_schemas()
+
+        self.stdout.write(f'Campos: {len(evento.fields_data)} | repeticoes: {iterations}')
+        self.stdout.write(f'Compilando a cada chamada: {compile_ms:.3f} ms')
+        self.stdout.write(f'Cache compartilhado:       {shared_ms:.3f} ms')
+        self.stdout.write(f'Memoria do processo:       {local_ms:.3f} ms')
+        self.stdout.write(self.style.SUCCESS(
+            f'Economia por chamada: {compile_ms - local_ms:.3f} ms (memoria), '
+            f'{compile_ms - shared_ms:.3f} ms (cache compartilhado).'
+        ))
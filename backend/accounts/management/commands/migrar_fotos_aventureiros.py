@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from accounts.models import Aventureiro, AventureiroFicha
+from accounts.thumbnails import import_inline_photo, refresh_aventureiro_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Move fotos 3x4 em base64 das fichas para arquivos e gera as miniaturas (96px/256px).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Fichas carregadas por vez.')
+        parser.add_argument('--force', action='store_true', help='Regera as miniaturas mesmo quando ja existem.')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas conta o que seria migrado.')
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        fichas = AventureiroFicha.objects.filter(inscricao_data__foto_3x4__startswith='data:image/')
+        aventureiros = Aventureiro.objects.exclude(foto='').exclude(foto__isnull=True)
+        if not options['force']:
+            aventureiros = aventureiros.exclude(foto_miniatura_origem=F('foto'))
+
+        if options['dry_run']:
+            self.stdout.write(
+                f'Fichas com foto em base64: {fichas.count()}. '
+                f'Aventureiros sem miniatura atualizada: {aventureiros.count()}.'
+            )
+            return
+
+        imported = 0
+        # Uma ficha por vez: o JSON com a foto e pesado, entao nada de carregar tudo na memoria.
+        ficha_ids = list(fichas.values_list('id', flat=True))
+        for start in range(0, len(ficha_ids), batch_size):
+            chunk = AventureiroFicha.objects.filter(id__in=ficha_ids[start:start + batch_size]).select_related('aventureiro')
+            for ficha in chunk.iterator(chunk_size=batch_size):
+                if import_inline_photo(ficha):
+                    imported += 1
+
+        generated = 0
+        for aventureiro in aventureiros.iterator(chunk_size=batch_size):
+            if refresh_aventureiro_thumbnails(aventureiro, force=options['force']):
+                generated += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Fotos migradas das fichas: {imported}. Aventureiros com miniaturas geradas: {generated}.'
+        ))
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.models import MercadoPagoWebhookInbox
+from accounts.mp_webhooks import drain_webhooks
+
+
+class Command(BaseCommand):
+    help = 'Processa a caixa de entrada de webhooks do Mercado Pago (consulta o pagamento e da a baixa).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help='Consultas simultaneas ao Mercado Pago (padrao: 4).')
+        parser.add_argument('--max-items', type=int, default=0, help='Limite de itens por execucao (0 = sem limite).')
+        parser.add_argument('--watch', action='store_true', help='Executa em loop continuo.')
+        parser.add_argument('--interval', type=float, default=2.0, help='Pausa com a fila vazia no modo --watch, em segundos.')
+
+    def handle(self, *args, **options):
+        concurrency = max(1, int(options['concurrency'] or 4))
+        max_items = max(0, int(options['max_items'] or 0))
+        interval = max(0.5, float(options['interval'] or 2.0))
+
+        while True:
+            items = drain_webhooks(concurrency=concurrency, max_items=max_items)
+            for item in items:
+                if item.status == MercadoPagoWebhookInbox.STATUS_DONE:
+                    self.stdout.write(self.style.SUCCESS(f'Pagamento {item.payment_id} sincronizado ({item.source}).'))
+                elif item.status == MercadoPagoWebhookInbox.STATUS_IGNORED:
+                    self.stdout.write(self.style.WARNING(f'Pagamento {item.payment_id} ignorado: {item.last_error}'))
+                else:
+                    self.stdout.write(self.style.ERROR(
+                        f'Pagamento {item.payment_id} falhou (tentativa {item.attempts}): {item.last_error}'
+                    ))
+            if not options['watch']:
+                self.stdout.write(self.style.SUCCESS(f'Processamento finalizado. Itens processados: {len(items)}.'))
+                break
+            if not items:
+                time.sleep(interval)
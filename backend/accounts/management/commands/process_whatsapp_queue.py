@@ -1,40 +1,61 @@
-import time
+import signal
 
 from django.core.management.base import BaseCommand
 
-from accounts.whatsapp import process_next_queue_item
+from accounts.whatsapp import WhatsAppQueueWorker
 
 
 class Command(BaseCommand):
-    help = 'Processa fila de notificacoes WhatsApp com pausa entre envios.'
+    help = 'Processa a fila de notificacoes WhatsApp com envios simultaneos e limite de taxa.'
 
     def add_arguments(self, parser):
         parser.add_argument('--once', action='store_true', help='Processa apenas um item da fila.')
-        parser.add_argument('--sleep', type=float, default=2.0, help='Intervalo entre envios, em segundos.')
         parser.add_argument('--max-items', type=int, default=0, help='Limite de itens por execucao (0 = sem limite).')
+        parser.add_argument('--watch', action='store_true', help='Executa em loop continuo ate receber SIGTERM/SIGINT.')
+        parser.add_argument('--interval', type=float, default=2.0, help='Pausa com a fila vazia no modo --watch, em segundos.')
+        parser.add_argument('--concurrency', type=int, default=0, help='Envios simultaneos (padrao: WHATSAPP_WORKER_CONCURRENCY).')
+        parser.add_argument('--rate', type=float, default=0, help='Envios por segundo no total (padrao: WHATSAPP_SEND_RATE).')
+        parser.add_argument(
+            '--per-phone-interval',
+            type=float,
+            default=None,
+            help='Segundos minimos entre mensagens para o mesmo numero (padrao: WHATSAPP_PER_PHONE_INTERVAL).',
+        )
+
+    def _report(self, item):
+        if item.status == item.STATUS_SENT:
+            self.stdout.write(self.style.SUCCESS(f'Enviado para {item.phone_number} ({item.notification_type}).'))
+        elif item.status == item.STATUS_FAILED:
+            self.stdout.write(self.style.ERROR(
+                f'Falha definitiva para {item.phone_number} apos {item.attempts} tentativas: {item.last_error}'
+            ))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f'Falha para {item.phone_number} (tentativa {item.attempts}), nova tentativa as '
+                f'{item.next_attempt_at:%H:%M:%S}: {item.last_error}'
+            ))
 
     def handle(self, *args, **options):
-        sleep_seconds = max(0.0, options['sleep'])
-        max_items = max(0, options['max_items'])
-        processed = 0
-
-        while True:
-            item = process_next_queue_item()
-            if not item:
-                if processed == 0:
-                    self.stdout.write(self.style.WARNING('Fila vazia.'))
-                break
-
-            processed += 1
-            if item.status == item.STATUS_SENT:
-                self.stdout.write(self.style.SUCCESS(f'Enviado para {item.phone_number} ({item.notification_type}).'))
-            else:
-                self.stdout.write(self.style.ERROR(f'Falha para {item.phone_number}: {item.last_error}'))
-
-            if options['once']:
-                break
-            if max_items and processed >= max_items:
-                break
-            time.sleep(sleep_seconds)
-
+        max_items = 1 if options['once'] else max(0, options['max_items'])
+        worker = WhatsAppQueueWorker(
+            concurrency=1 if options['once'] else options['concurrency'],
+            rate=options['rate'],
+            per_phone_interval=options['per_phone_interval'],
+            on_result=self._report,
+        )
+
+        def _stop(signum, frame):
+            self.stdout.write(self.style.WARNING('Encerrando: aguardando os envios em andamento.'))
+            worker.stop()
+
+        signal.signal(signal.SIGTERM, _stop)
+        signal.signal(signal.SIGINT, _stop)
+
+        processed = worker.run(
+            watch=options['watch'] and not options['once'],
+            idle_sleep=max(0.5, options['interval']),
+            max_items=max_items,
+        )
+        if processed == 0 and not options['watch']:
+            self.stdout.write(self.style.WARNING('Fila vazia.'))
         self.stdout.write(self.style.SUCCESS(f'Processamento finalizado. Itens processados: {processed}.'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from accounts.evento_busca import atualizar_busca
+from accounts.models import EventoInscricao
+
+
+class Command(BaseCommand):
+    help = 'Remonta o documento de busca (consulta do evento) das inscricoes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--evento', type=int, action='append', default=[], help='Id do evento (pode repetir). Sem ele, todos.')
+
+    def handle(self, *args, **options):
+        inscricoes = EventoInscricao.objects.select_related('evento', 'responsavel').order_by('id')
+        if options['evento']:
+            inscricoes = inscricoes.filter(evento_id__in=options['evento'])
+        total = inscricoes.count()
+        done = atualizar_busca(inscricoes.iterator(chunk_size=500))
+        self.stdout.write(self.style.SUCCESS(f'Documentos de busca atualizados: {done} de {total}.'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from accounts.evento_resumo import refresh_evento_resumos
+from accounts.models import Evento
+
+
+class Command(BaseCommand):
+    help = 'Recalcula do zero o resumo (participantes, pedidos, valores e custos) dos eventos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--evento', type=int, action='append', default=[], help='Id do evento (pode repetir). Sem ele, todos.')
+
+    def handle(self, *args, **options):
+        evento_ids = options['evento'] or list(Evento.objects.values_list('id', flat=True))
+        done = refresh_evento_resumos(evento_ids)
+        self.stdout.write(self.style.SUCCESS(f'Resumos recalculados: {done} de {len(set(evento_ids))}.'))
@@ -4,7 +4,9 @@ from datetime import timedelta
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 
+from accounts.evento_resumo import adiar_evento_resumos
 from accounts.models import LojaPedido
+from accounts.mp_reconcile import MODE_IDS, MODE_SEARCH, pending_loja_pedidos, reconcile_payments
 from accounts.views import LojaView
 
 
@@ -24,6 +26,18 @@ class Command(BaseCommand):
             default=150,
             help='Quantidade maxima de pedidos por execucao (padrao: 150).',
         )
+        parser.add_argument(
+            '--mode',
+            choices=[MODE_IDS, MODE_SEARCH],
+            default=MODE_IDS,
+            help='ids = um GET por pagamento; search = busca paginada por data no MP (padrao: ids).',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=0,
+            help='Consultas simultaneas ao MP (padrao: MP_RECONCILE_CONCURRENCY).',
+        )
         parser.add_argument(
             '--watch',
             action='store_true',
@@ -36,21 +50,12 @@ class Command(BaseCommand):
             help='Intervalo em segundos no modo --watch (padrao: 120).',
         )
 
-    def _run_once(self, *, days, max_items):
+    def _run_once(self, *, days, max_items, mode=MODE_IDS, concurrency=None, on_progress=None):
         cutoff = timezone.now() - timedelta(days=max(1, days))
-        pendentes_qs = (
-            LojaPedido.objects
-            .select_related('evento_inscricao')
-            .filter(
-                status__in=[LojaPedido.STATUS_PENDENTE, LojaPedido.STATUS_PROCESSANDO],
-                created_at__gte=cutoff,
-                mp_payment_id__isnull=False,
-            )
-            .exclude(mp_payment_id='')
-            .order_by('created_at', 'id')
-        )
+        pendentes = pending_loja_pedidos(cutoff, max_items)
         reconciliar_cashback_qs = (
             LojaPedido.objects
+            .for_listing()
             .select_related('evento_inscricao')
             .filter(
                 status=LojaPedido.STATUS_PAGO,
@@ -61,16 +66,12 @@ class Command(BaseCommand):
             .order_by('created_at', 'id')
         )
         if max_items > 0:
-            pedidos = list(pendentes_qs[:max_items])
-            remaining = max(0, max_items - len(pedidos))
-            if remaining > 0:
-                reconciliar = list(reconciliar_cashback_qs[:remaining])
-                pedidos.extend(reconciliar)
+            remaining = max(0, max_items - len(pendentes))
+            reconciliar = list(reconciliar_cashback_qs[:remaining]) if remaining > 0 else []
         else:
-            pedidos = list(pendentes_qs)
-            pedidos.extend(list(reconciliar_cashback_qs))
+            reconciliar = list(reconciliar_cashback_qs)
 
-        if not pedidos:
+        if not pendentes and not reconciliar:
             self.stdout.write(self.style.WARNING('Nenhum pedido para sincronizar/reconciliar no periodo informado.'))
             return {
                 'checked': 0,
@@ -81,50 +82,54 @@ class Command(BaseCommand):
             }
 
         loja_view = LojaView()
-        checked = 0
-        changed = 0
-        approved_now = 0
-        failed = 0
+
+        def apply(pedido, payment_data):
+            previous_status = pedido.status
+            loja_view._sync_pedido_loja_from_mp(pedido, payment_data)
+            pedido.refresh_from_db(fields=['status'])
+            if pedido.status != previous_status:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f'Pedido #{pedido.id}: {previous_status} -> {pedido.status}'
+                    )
+                )
+
+        # Pedidos do mesmo evento aprovados nesta rodada recalculam o resumo do evento uma vez so.
+        with adiar_evento_resumos():
+            result = reconcile_payments(
+                pendentes,
+                apply,
+                mode=mode,
+                since=cutoff,
+                concurrency=concurrency,
+                on_progress=on_progress,
+            )
+        checked = result['checked']
+        changed = result['changed']
+        failed = result['failed']
         cashback_reconciled = 0
 
-        for pedido in pedidos:
+        for pedido in reconciliar:
             checked += 1
-            previous_status = pedido.status
             try:
-                if previous_status in {LojaPedido.STATUS_PENDENTE, LojaPedido.STATUS_PROCESSANDO}:
-                    payment_data = loja_view._get_mp_payment(str(pedido.mp_payment_id or '').strip())
-                    loja_view._sync_pedido_loja_from_mp(pedido, payment_data)
-                    pedido.refresh_from_db(fields=['status', 'paid_at'])
-                    if pedido.status != previous_status:
-                        changed += 1
-                        self.stdout.write(
-                            self.style.SUCCESS(
-                                f'Pedido #{pedido.id}: {previous_status} -> {pedido.status}'
-                            )
-                        )
-                    if previous_status != LojaPedido.STATUS_PAGO and pedido.status == LojaPedido.STATUS_PAGO:
-                        approved_now += 1
+                before_creditado = bool(getattr(pedido.evento_inscricao, 'cashback_creditado', False))
+                loja_view._apply_cashback_after_paid(pedido)
+                if before_creditado:
                     continue
-
-                if previous_status == LojaPedido.STATUS_PAGO and getattr(pedido, 'evento_inscricao_id', None):
-                    before_creditado = bool(getattr(pedido.evento_inscricao, 'cashback_creditado', False))
-                    loja_view._apply_cashback_after_paid(pedido)
-                    if before_creditado:
-                        continue
-                    after_creditado = (
-                        LojaPedido.objects
-                        .filter(pk=pedido.pk)
-                        .values_list('evento_inscricao__cashback_creditado', flat=True)
-                        .first()
-                    )
-                    if bool(after_creditado):
-                        cashback_reconciled += 1
-                        changed += 1
-                        self.stdout.write(
-                            self.style.SUCCESS(
-                                f'Pedido #{pedido.id}: cashback de indicacao reconciliado.'
-                            )
+                after_creditado = (
+                    LojaPedido.objects
+                    .filter(pk=pedido.pk)
+                    .values_list('evento_inscricao__cashback_creditado', flat=True)
+                    .first()
+                )
+                if bool(after_creditado):
+                    cashback_reconciled += 1
+                    changed += 1
+                    self.stdout.write(
+                        self.style.SUCCESS(
+                            f'Pedido #{pedido.id}: cashback de indicacao reconciliado.'
                         )
+                    )
             except Exception as exc:  # noqa: BLE001
                 failed += 1
                 self.stdout.write(
@@ -134,7 +139,7 @@ class Command(BaseCommand):
         return {
             'checked': checked,
             'changed': changed,
-            'approved_now': approved_now,
+            'approved_now': result['approved_now'],
             'failed': failed,
             'cashback_reconciled': cashback_reconciled,
         }
@@ -148,7 +153,12 @@ class Command(BaseCommand):
         while True:
             started = timezone.localtime(timezone.now()).strftime('%d/%m/%Y %H:%M:%S')
             self.stdout.write(f'[sync_loja_pagamentos] Inicio: {started}')
-            result = self._run_once(days=days, max_items=max_items)
+            result = self._run_once(
+                days=days,
+                max_items=max_items,
+                mode=options.get('mode') or MODE_IDS,
+                concurrency=options.get('concurrency') or None,
+            )
             self.stdout.write(
                 self.style.SUCCESS(
                     (
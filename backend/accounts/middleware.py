@@ -26,12 +26,15 @@ class AuditLogMiddleware:
         action = ''
         details = ''
         view_name = ''
-        try:
-            match = resolve(request.path)
-            if match and match.view_name:
-                view_name = match.view_name
-        except Exception:
-            view_name = ''
+        # O resolver ja rodou para despachar a view; so recorre ao resolve() se faltar.
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            try:
+                match = resolve(request.path)
+            except Exception:
+                match = None
+        if match and match.view_name:
+            view_name = match.view_name
 
         is_api = bool(view_name and view_name.endswith('_api'))
         if request.method == 'GET':
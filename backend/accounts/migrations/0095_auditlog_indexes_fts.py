@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+FTS_TABLE = 'accounts_auditlog_fts'
+FTS_COLUMNS = ('username', 'location', 'action', 'details', 'path')
+
+
+def _sqlite_supports_trigram(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.audit_fts_probe USING fts5(a, tokenize='trigram')")
+            cursor.execute('DROP TABLE temp.audit_fts_probe')
+        except Exception:
+            return False
+    return True
+
+
+def create_auditlog_fts(apps, schema_editor):
+    connection = schema_editor.connection
+    if not _sqlite_supports_trigram(connection):
+        return
+    columns = ', '.join(FTS_COLUMNS)
+    new_values = ', '.join(f'new.{col}' for col in FTS_COLUMNS)
+    old_values = ', '.join(f'old.{col}' for col in FTS_COLUMNS)
+    statements = [
+        (
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"{columns}, content='accounts_auditlog', content_rowid='id', tokenize='trigram')"
+        ),
+        (
+            f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON accounts_auditlog BEGIN '
+            f'INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END'
+        ),
+        (
+            f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON accounts_auditlog BEGIN '
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END"
+        ),
+        (
+            f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON accounts_auditlog BEGIN '
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+            f'INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END'
+        ),
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+    ]
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def drop_auditlog_fts(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for suffix in ('ai', 'ad', 'au'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0094_auditlog_created_at_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['created_at'], name='accounts_au_created_606b86_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['username', 'created_at'], name='accounts_au_usernam_4c3a17_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['action', 'created_at'], name='accounts_au_action_c683b9_idx'),
+        ),
+        migrations.RunPython(create_auditlog_fts, drop_auditlog_fts),
+    ]
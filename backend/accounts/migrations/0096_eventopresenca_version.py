@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0095_auditlog_indexes_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventopresenca',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='versao'),
+        ),
+        migrations.AddIndex(
+            model_name='eventopresenca',
+            index=models.Index(fields=['evento', 'version'], name='accounts_presenca_evt_ver_idx'),
+        ),
+        migrations.CreateModel(
+            name='EventoPresencaVersao',
+            fields=[
+                ('evento', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='presenca_versao', serialize=False, to='accounts.evento')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='versao')),
+            ],
+            options={
+                'verbose_name': 'versão de presença do evento',
+                'verbose_name_plural': 'versões de presença do evento',
+            },
+        ),
+    ]
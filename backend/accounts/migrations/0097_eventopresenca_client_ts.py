@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0096_eventopresenca_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventopresenca',
+            name='client_ts',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='marcado no aparelho em'),
+        ),
+        migrations.AddField(
+            model_name='eventopresenca',
+            name='client_op_id',
+            field=models.CharField(blank=True, max_length=64, verbose_name='id da operacao no aparelho'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0097_eventopresenca_client_ts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aventureiro',
+            name='foto_miniatura',
+            field=models.ImageField(blank=True, null=True, upload_to='photos/aventura/miniaturas', verbose_name='miniatura da foto (96px)'),
+        ),
+        migrations.AddField(
+            model_name='aventureiro',
+            name='foto_media',
+            field=models.ImageField(blank=True, null=True, upload_to='photos/aventura/miniaturas', verbose_name='foto reduzida (256px)'),
+        ),
+        migrations.AddField(
+            model_name='aventureiro',
+            name='foto_miniatura_origem',
+            field=models.CharField(blank=True, max_length=255, verbose_name='foto usada nas miniaturas'),
+        ),
+    ]
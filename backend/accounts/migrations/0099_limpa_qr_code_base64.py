@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:10
+
+from django.db import migrations
+
+
+def limpa_qr_code_base64(apps, schema_editor):
+    # O QR passa a ser gerado a partir de mp_qr_code; a imagem salva so vale sem o codigo.
+    for model_name in ('LojaPedido', 'PagamentoMensalidade'):
+        model = apps.get_model('accounts', model_name)
+        model.objects.exclude(mp_qr_code='').exclude(mp_qr_code_base64='').update(mp_qr_code_base64='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0098_aventureiro_foto_miniaturas'),
+    ]
+
+    operations = [
+        migrations.RunPython(limpa_qr_code_base64, migrations.RunPython.noop),
+    ]
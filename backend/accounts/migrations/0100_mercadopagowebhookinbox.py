@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0099_limpa_qr_code_base64'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MercadoPagoWebhookInbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('mensalidade', 'Mensalidades'), ('loja', 'Loja/eventos')], max_length=16, verbose_name='origem')),
+                ('payment_id', models.CharField(max_length=64, verbose_name='id pagamento MP')),
+                ('request_id', models.CharField(max_length=128, verbose_name='x-request-id')),
+                ('status', models.CharField(choices=[('pending', 'Pendente'), ('processing', 'Processando'), ('done', 'Processado'), ('ignored', 'Ignorado'), ('failed', 'Falhou')], default='pending', max_length=16, verbose_name='status')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='tentativas')),
+                ('last_error', models.TextField(blank=True, verbose_name='ultimo erro')),
+                ('received_at', models.DateTimeField(auto_now_add=True, verbose_name='recebido em')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='proxima tentativa')),
+                ('claimed_at', models.DateTimeField(blank=True, null=True, verbose_name='em processamento desde')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='processado em')),
+            ],
+            options={
+                'verbose_name': 'webhook do Mercado Pago',
+                'verbose_name_plural': 'webhooks do Mercado Pago',
+                'ordering': ('received_at', 'id'),
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='accounts_mpwebhook_fila_idx')],
+                'constraints': [models.UniqueConstraint(fields=('payment_id', 'request_id'), name='uniq_mp_webhook_payment_request')],
+            },
+        ),
+    ]
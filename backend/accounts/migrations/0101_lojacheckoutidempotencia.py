@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0100_mercadopagowebhookinbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LojaCheckoutIdempotencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=40, verbose_name='escopo')),
+                ('key', models.CharField(max_length=64, verbose_name='chave')),
+                ('owner', models.CharField(max_length=80, verbose_name='dono')),
+                ('request_hash', models.CharField(max_length=64, verbose_name='hash da requisicao')),
+                ('status', models.CharField(choices=[('processing', 'Processando'), ('done', 'Concluido')], default='processing', max_length=16, verbose_name='status')),
+                ('response', models.JSONField(blank=True, default=dict, verbose_name='resposta')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='criado em')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='atualizado em')),
+                ('pedido', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='checkout_idempotencias', to='accounts.lojapedido')),
+            ],
+            options={
+                'verbose_name': 'chave de idempotencia do checkout',
+                'verbose_name_plural': 'chaves de idempotencia do checkout',
+                'ordering': ('-created_at', '-id'),
+                'indexes': [models.Index(fields=['created_at'], name='accounts_checkout_idem_dt_idx')],
+                'constraints': [models.UniqueConstraint(fields=('scope', 'key'), name='uniq_loja_checkout_scope_key')],
+            },
+        ),
+    ]
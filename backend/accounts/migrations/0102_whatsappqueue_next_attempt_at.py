@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0101_lojacheckoutidempotencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='whatsappqueue',
+            name='next_attempt_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='proxima tentativa'),
+        ),
+        migrations.AddField(
+            model_name='whatsappqueue',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='em envio desde'),
+        ),
+        migrations.AlterField(
+            model_name='whatsappqueue',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pendente'), ('processing', 'Enviando'), ('sent', 'Enviado'), ('failed', 'Falhou')], default='pending', max_length=16, verbose_name='status envio'),
+        ),
+        migrations.AddIndex(
+            model_name='whatsappqueue',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='accounts_waqueue_fila_idx'),
+        ),
+    ]
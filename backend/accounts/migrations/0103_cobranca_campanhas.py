@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:50
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0102_whatsappqueue_next_attempt_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='whatsappqueue',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pendente'), ('processing', 'Enviando'), ('paused', 'Pausado'), ('sent', 'Enviado'), ('failed', 'Falhou'), ('cancelled', 'Cancelado')], default='pending', max_length=16, verbose_name='status envio'),
+        ),
+        migrations.CreateModel(
+            name='CobrancaMensalidadeCampanha',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('running', 'Enviando'), ('paused', 'Pausada'), ('cancelled', 'Cancelada'), ('done', 'Concluida')], default='running', max_length=16, verbose_name='status')),
+                ('pause_seconds', models.PositiveIntegerField(default=4, verbose_name='intervalo entre envios (s)')),
+                ('total_responsaveis', models.PositiveIntegerField(default=0, verbose_name='responsaveis')),
+                ('total_mensalidades', models.PositiveIntegerField(default=0, verbose_name='mensalidades')),
+                ('skipped_sem_usuario', models.PositiveIntegerField(default=0, verbose_name='sem usuario')),
+                ('skipped_sem_telefone', models.PositiveIntegerField(default=0, verbose_name='sem telefone')),
+                ('skipped_sem_telefone_nomes', models.JSONField(blank=True, default=list, verbose_name='responsaveis sem telefone')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='criado em')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='atualizado em')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='finalizada em')),
+                ('aventureiro', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cobranca_campanhas', to='accounts.aventureiro')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cobranca_campanhas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'campanha de cobranca de mensalidades',
+                'verbose_name_plural': 'campanhas de cobranca de mensalidades',
+                'ordering': ('-created_at', '-id'),
+            },
+        ),
+        migrations.CreateModel(
+            name='CobrancaMensalidadeEnvio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('responsavel_nome', models.CharField(blank=True, max_length=200, verbose_name='responsavel')),
+                ('mensalidade_ids', models.JSONField(blank=True, default=list, verbose_name='mensalidades')),
+                ('total_em_aberto', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10, verbose_name='total em aberto')),
+                ('campanha', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='envios', to='accounts.cobrancamensalidadecampanha')),
+                ('queue_item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='cobranca_envio', to='accounts.whatsappqueue')),
+            ],
+            options={
+                'verbose_name': 'envio de cobranca de mensalidades',
+                'verbose_name_plural': 'envios de cobranca de mensalidades',
+                'ordering': ('campanha', 'id'),
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:40
+
+from django.db import migrations, models
+
+
+def preenche_resolved_phone(apps, schema_editor):
+    from accounts.whatsapp import normalize_phone_number
+
+    WhatsAppPreference = apps.get_model('accounts', 'WhatsAppPreference')
+    Diretoria = apps.get_model('accounts', 'Diretoria')
+    Responsavel = apps.get_model('accounts', 'Responsavel')
+    diretoria_phones = dict(Diretoria.objects.exclude(whatsapp='').values_list('user_id', 'whatsapp'))
+    responsavel_phones = {
+        row[0]: next((phone for phone in row[1:] if phone), '')
+        for row in Responsavel.objects.values_list(
+            'user_id',
+            'responsavel_celular',
+            'mae_celular',
+            'pai_celular',
+            'responsavel_telefone',
+            'mae_telefone',
+            'pai_telefone',
+        )
+    }
+    to_update = []
+    for preference in WhatsAppPreference.objects.only('pk', 'user_id', 'phone_number'):
+        preference.resolved_phone = normalize_phone_number(
+            preference.phone_number
+            or diretoria_phones.get(preference.user_id)
+            or responsavel_phones.get(preference.user_id)
+            or ''
+        )
+        if preference.resolved_phone:
+            to_update.append(preference)
+    WhatsAppPreference.objects.bulk_update(to_update, ['resolved_phone'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0103_cobranca_campanhas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='whatsapppreference',
+            name='resolved_phone',
+            field=models.CharField(blank=True, editable=False, max_length=16, verbose_name='numero whatsapp resolvido'),
+        ),
+        migrations.RunPython(preenche_resolved_phone, migrations.RunPython.noop),
+    ]
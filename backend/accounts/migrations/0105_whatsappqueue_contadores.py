@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:05
+
+from django.db import migrations, models
+
+QUEUE_TABLE = 'accounts_whatsappqueue'
+COUNTER_TABLE = 'accounts_whatsappqueuecontador'
+TRIGGER_PREFIX = 'accounts_waqueue_contador'
+
+
+def create_queue_counter_triggers(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    statements = [
+        (
+            f'CREATE TRIGGER IF NOT EXISTS {TRIGGER_PREFIX}_ai AFTER INSERT ON {QUEUE_TABLE} BEGIN '
+            f'INSERT OR IGNORE INTO {COUNTER_TABLE}(status, total) VALUES (new.status, 0); '
+            f'UPDATE {COUNTER_TABLE} SET total = total + 1 WHERE status = new.status; END'
+        ),
+        (
+            f'CREATE TRIGGER IF NOT EXISTS {TRIGGER_PREFIX}_ad AFTER DELETE ON {QUEUE_TABLE} BEGIN '
+            f'UPDATE {COUNTER_TABLE} SET total = total - 1 WHERE status = old.status; END'
+        ),
+        (
+            f'CREATE TRIGGER IF NOT EXISTS {TRIGGER_PREFIX}_au AFTER UPDATE OF status ON {QUEUE_TABLE} '
+            f'WHEN old.status <> new.status BEGIN '
+            f'UPDATE {COUNTER_TABLE} SET total = total - 1 WHERE status = old.status; '
+            f'INSERT OR IGNORE INTO {COUNTER_TABLE}(status, total) VALUES (new.status, 0); '
+            f'UPDATE {COUNTER_TABLE} SET total = total + 1 WHERE status = new.status; END'
+        ),
+        f'DELETE FROM {COUNTER_TABLE}',
+        (
+            f'INSERT INTO {COUNTER_TABLE}(status, total) '
+            f'SELECT status, COUNT(*) FROM {QUEUE_TABLE} GROUP BY status'
+        ),
+    ]
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def drop_queue_counter_triggers(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for suffix in ('ai', 'ad', 'au'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {TRIGGER_PREFIX}_{suffix}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0104_whatsapppreference_resolved_phone'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='whatsappqueue',
+            index=models.Index(fields=['status', 'created_at'], name='accounts_waqueue_status_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='whatsappqueue',
+            index=models.Index(fields=['phone_number', 'created_at'], name='accounts_waqueue_phone_dt_idx'),
+        ),
+        migrations.CreateModel(
+            name='WhatsAppQueueContador',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=16, unique=True, verbose_name='status envio')),
+                ('total', models.IntegerField(default=0, verbose_name='total')),
+            ],
+        ),
+        migrations.RunPython(create_queue_counter_triggers, drop_queue_counter_triggers),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0105_whatsappqueue_contadores'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='whatsappqueue',
+            name='merged_into',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='merged_items', to='accounts.whatsappqueue', verbose_name='agrupada na mensagem'),
+        ),
+    ]
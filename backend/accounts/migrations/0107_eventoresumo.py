@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:00
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0106_whatsappqueue_merged_into'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoResumo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('participantes', models.PositiveIntegerField(default=0, verbose_name='participantes')),
+                ('inscricoes_confirmadas', models.PositiveIntegerField(default=0, verbose_name='inscricoes confirmadas')),
+                ('pedidos_count', models.PositiveIntegerField(default=0, verbose_name='pedidos')),
+                ('pedidos_pagos', models.PositiveIntegerField(default=0, verbose_name='pedidos pagos')),
+                ('pedidos_total_pago', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='itens pagos')),
+                ('inscricoes_valor_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='valor das inscricoes')),
+                ('valor_bruto', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='valor bruto pago')),
+                ('valor_pix', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='pago via pix')),
+                ('valor_cartao', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='pago via cartao')),
+                ('custos_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='custos')),
+                ('receita_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='receita')),
+                ('lucro_liquido', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='lucro liquido')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='atualizado em')),
+                ('evento', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='resumo', to='accounts.evento')),
+            ],
+            options={
+                'verbose_name': 'resumo de evento',
+                'verbose_name_plural': 'resumos de eventos',
+            },
+        ),
+    ]
@@ -0,0 +1,113 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:40
+
+import logging
+
+import django.db.models.deletion
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import migrations, models, transaction
+
+logger = logging.getLogger(__name__)
+
+BUSCA_TABLE = 'accounts_eventoinscricaobusca'
+FTS_TABLE = 'accounts_eventoinscricaobusca_fts'
+TRIGGER_PREFIX = 'accounts_evbusca_fts'
+FTS_COLUMNS = ('documento', 'cpfs', 'telefones')
+RECURSO_INDICE = {
+    'sqlite': 'FTS5 com tokenizador trigram (SQLite 3.34 ou mais novo)',
+    'postgresql': 'extensao pg_trgm (CREATE EXTENSION exige permissao no banco)',
+}
+
+
+def create_busca_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        columns = ', '.join(FTS_COLUMNS)
+        new_values = ', '.join(f'new.{column}' for column in FTS_COLUMNS)
+        old_values = ', '.join(f'old.{column}' for column in FTS_COLUMNS)
+        statements = [
+            (
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5({columns}, '
+                f"content='{BUSCA_TABLE}', content_rowid='id', tokenize='trigram')"
+            ),
+            (
+                f'CREATE TRIGGER IF NOT EXISTS {TRIGGER_PREFIX}_ai AFTER INSERT ON {BUSCA_TABLE} BEGIN '
+                f'INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END'
+            ),
+            (
+                f'CREATE TRIGGER IF NOT EXISTS {TRIGGER_PREFIX}_ad AFTER DELETE ON {BUSCA_TABLE} BEGIN '
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END"
+            ),
+            (
+                f'CREATE TRIGGER IF NOT EXISTS {TRIGGER_PREFIX}_au AFTER UPDATE ON {BUSCA_TABLE} BEGIN '
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+                f'INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END'
+            ),
+        ]
+    elif connection.vendor == 'postgresql':
+        statements = ['CREATE EXTENSION IF NOT EXISTS pg_trgm'] + [
+            f'CREATE INDEX IF NOT EXISTS accounts_evbusca_{column}_trgm ON {BUSCA_TABLE} USING gin ({column} gin_trgm_ops)'
+            for column in FTS_COLUMNS
+        ]
+    else:
+        return
+    try:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+    except Exception as exc:
+        # Sem o indice a consulta ainda funciona com LIKE na tabela de busca (ver
+        # accounts/evento_busca.py), mas fica lenta: so segue se isso for pedido.
+        recurso = RECURSO_INDICE[connection.vendor]
+        if not getattr(settings, 'EVENTO_BUSCA_PERMITIR_SEM_INDICE', False):
+            raise ImproperlyConfigured(
+                f'Nao foi possivel criar o indice de busca das inscricoes: falta {recurso} ({exc}). '
+                'Defina DJANGO_EVENTO_BUSCA_PERMITIR_SEM_INDICE=1 para seguir com a busca por LIKE.'
+            ) from exc
+        logger.warning(
+            'Indice de busca das inscricoes nao criado: falta %s (%s). A consulta usara LIKE.',
+            recurso,
+            exc,
+        )
+
+
+def drop_busca_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {TRIGGER_PREFIX}_{suffix}')
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+        elif connection.vendor == 'postgresql':
+            for column in FTS_COLUMNS:
+                cursor.execute(f'DROP INDEX IF EXISTS accounts_evbusca_{column}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0107_eventoresumo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoInscricaoBusca',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cancelada', models.BooleanField(default=False, verbose_name='inscricao cancelada')),
+                ('codigo', models.CharField(blank=True, max_length=3, verbose_name='codigo da inscricao')),
+                ('documento', models.TextField(blank=True, verbose_name='texto de busca')),
+                ('cpfs', models.CharField(blank=True, max_length=255, verbose_name='cpfs')),
+                ('telefones', models.CharField(blank=True, max_length=255, verbose_name='telefones')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='atualizado em')),
+                ('evento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='accounts.evento')),
+                ('inscricao', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='busca', to='accounts.eventoinscricao')),
+            ],
+            options={
+                'verbose_name': 'busca de inscricao de evento',
+                'verbose_name_plural': 'buscas de inscricoes de eventos',
+                'indexes': [models.Index(fields=['evento', 'cancelada', 'codigo'], name='accounts_evbusca_codigo_idx')],
+            },
+        ),
+        migrations.RunPython(create_busca_index, drop_busca_index),
+    ]
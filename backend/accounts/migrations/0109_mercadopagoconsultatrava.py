@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0108_eventoinscricaobusca'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MercadoPagoConsultaTrava',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payment_id', models.CharField(max_length=64, unique=True, verbose_name='MP payment id')),
+                ('expires_at', models.DateTimeField(verbose_name='expira em')),
+            ],
+            options={
+                'verbose_name': 'trava de consulta ao Mercado Pago',
+                'verbose_name_plural': 'travas de consulta ao Mercado Pago',
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0109_mercadopagoconsultatrava'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MercadoPagoSincronizacaoTrava',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=16, unique=True, verbose_name='tipo')),
+                ('job_id', models.CharField(max_length=32, verbose_name='job')),
+                ('expires_at', models.DateTimeField(verbose_name='expira em')),
+            ],
+            options={
+                'verbose_name': 'trava de sincronizacao com o Mercado Pago',
+                'verbose_name_plural': 'travas de sincronizacao com o Mercado Pago',
+            },
+        ),
+    ]
@@ -38,6 +38,30 @@ def financeiro_comprovante_upload_to(instance, filename):
     return f'financeiro/comprovantes/{timestamp}_{safe_name}'
 
 
+# Colunas pesadas (JSON com fotos/assinaturas, QR em base64) que listagens e totais nao usam.
+LISTING_HEAVY_FIELDS = {
+    'AventureiroFicha': ('inscricao_data', 'ficha_medica_data', 'declaracao_medica_data', 'termo_imagem_data'),
+    'Evento': ('fields_data', 'event_description', 'event_inactive_message'),
+    'EventoInscricao': ('dados',),
+    'LojaPedido': ('mp_qr_code_base64',),
+    'PagamentoMensalidade': ('mp_qr_code_base64',),
+}
+
+
+class ListingQuerySet(models.QuerySet):
+    def for_listing(self, *related, include_self=True):
+        """Adia as colunas pesadas do modelo e das relacoes em `related` (caminhos do select_related)."""
+        fields = []
+        if include_self:
+            fields.extend(LISTING_HEAVY_FIELDS.get(self.model.__name__, ()))
+        for path in related:
+            related_model = self.model
+            for part in path.split('__'):
+                related_model = related_model._meta.get_field(part).related_model
+            fields.extend(f'{path}__{name}' for name in LISTING_HEAVY_FIELDS.get(related_model.__name__, ()))
+        return self.defer(*fields) if fields else self
+
+
 class UserAccess(models.Model):
     ROLE_RESPONSAVEL = 'responsavel'
     ROLE_DIRETORIA = 'diretoria'
@@ -192,6 +216,9 @@ class Aventureiro(models.Model):
     declaracao_medica = models.BooleanField('declaracao médica aceita', default=False)
     autorizacao_imagem = models.BooleanField('autorização de imagem', default=False)
     foto = models.ImageField('foto 3x4', upload_to='photos/aventura', null=True, blank=True)
+    foto_miniatura = models.ImageField('miniatura da foto (96px)', upload_to='photos/aventura/miniaturas', null=True, blank=True)
+    foto_media = models.ImageField('foto reduzida (256px)', upload_to='photos/aventura/miniaturas', null=True, blank=True)
+    foto_miniatura_origem = models.CharField('foto usada nas miniaturas', max_length=255, blank=True)
     assinatura = models.ImageField('assinatura do aventureiro', upload_to='signatures/aventura', null=True, blank=True)
     codigo_indicacao = models.CharField('codigo de indicacao', max_length=12, unique=True, blank=True, db_index=True)
     cashback_saldo = models.DecimalField('saldo cashback', max_digits=10, decimal_places=2, default=Decimal('0.00'))
@@ -270,6 +297,8 @@ class WhatsAppPreference(models.Model):
 
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='whatsapp_preference')
     phone_number = models.CharField('numero whatsapp', max_length=32, blank=True)
+    # Numero normalizado (preferencia ou cadastro), mantido pelos signals para o envio em lote.
+    resolved_phone = models.CharField('numero whatsapp resolvido', max_length=16, blank=True, editable=False)
     notify_cadastro = models.BooleanField('notificacao de cadastro', default=False)
     notify_diretoria = models.BooleanField('notificacao de cadastro de diretoria', default=False)
     notify_confirmacao = models.BooleanField('notificacao de confirmacao de inscricao', default=False)
@@ -328,13 +357,19 @@ class WhatsAppQueue(models.Model):
     ]
 
     STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_PAUSED = 'paused'
     STATUS_SENT = 'sent'
     STATUS_FAILED = 'failed'
+    STATUS_CANCELLED = 'cancelled'
 
     STATUS_CHOICES = [
         (STATUS_PENDING, 'Pendente'),
+        (STATUS_PROCESSING, 'Enviando'),
+        (STATUS_PAUSED, 'Pausado'),
         (STATUS_SENT, 'Enviado'),
         (STATUS_FAILED, 'Falhou'),
+        (STATUS_CANCELLED, 'Cancelado'),
     ]
 
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='whatsapp_queue')
@@ -347,14 +382,39 @@ class WhatsAppQueue(models.Model):
     last_error = models.TextField('ultimo erro', blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     sent_at = models.DateTimeField('enviado em', null=True, blank=True)
+    next_attempt_at = models.DateTimeField('proxima tentativa', default=timezone.now)
+    claimed_at = models.DateTimeField('em envio desde', null=True, blank=True)
+    merged_into = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='merged_items',
+        verbose_name='agrupada na mensagem',
+    )
 
     class Meta:
         ordering = ('created_at',)
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='accounts_waqueue_fila_idx'),
+            models.Index(fields=['status', 'created_at'], name='accounts_waqueue_status_dt_idx'),
+            models.Index(fields=['phone_number', 'created_at'], name='accounts_waqueue_phone_dt_idx'),
+        ]
 
     def __str__(self):
         return f'{self.phone_number} [{self.get_status_display()}]'
 
 
+class WhatsAppQueueContador(models.Model):
+    # Mantido por triggers do SQLite (migration 0105) a cada insert/delete/troca de status
+    # da fila, inclusive via update()/bulk_create; o painel le daqui em vez de contar a fila.
+    status = models.CharField('status envio', max_length=16, unique=True)
+    total = models.IntegerField('total', default=0)
+
+    def __str__(self):
+        return f'{self.status}: {self.total}'
+
+
 class WhatsAppTemplate(models.Model):
     TYPE_CADASTRO = WhatsAppPreference.NOTIFY_CADASTRO
     TYPE_DIRETORIA = WhatsAppPreference.NOTIFY_DIRETORIA
@@ -517,12 +577,18 @@ class AuditLog(models.Model):
     path = models.CharField('caminho', max_length=255, blank=True)
     ip_address = models.CharField('ip', max_length=64, blank=True)
     user_agent = models.CharField('user agent', max_length=255, blank=True)
-    created_at = models.DateTimeField('data/hora', auto_now_add=True)
+    # Sem auto_now_add: a gravacao em lote preserva o horario real da acao.
+    created_at = models.DateTimeField('data/hora', default=timezone.now, editable=False)
 
     class Meta:
         verbose_name = 'log de auditoria'
         verbose_name_plural = 'logs de auditoria'
         ordering = ('-created_at',)
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['username', 'created_at']),
+            models.Index(fields=['action', 'created_at']),
+        ]
 
     def __str__(self):
         when = timezone.localtime(self.created_at).strftime('%d/%m/%Y %H:%M')
@@ -599,6 +665,8 @@ class AventureiroFicha(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ListingQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'ficha completa do aventureiro'
         verbose_name_plural = 'fichas completas dos aventureiros'
@@ -717,6 +785,8 @@ class Evento(models.Model):
     created_at = models.DateTimeField('criado em', auto_now_add=True)
     updated_at = models.DateTimeField('atualizado em', auto_now=True)
 
+    objects = ListingQuerySet.as_manager()
+
     class Meta:
         ordering = ('-created_at',)
         verbose_name = 'evento'
@@ -779,6 +849,32 @@ class EventoCusto(models.Model):
         return f'{self.evento.name} - {self.nome}'
 
 
+class EventoResumo(models.Model):
+    """Totais do evento mantidos por `accounts.evento_resumo` (signals e sincronizacao de pagamentos)."""
+
+    evento = models.OneToOneField(Evento, on_delete=models.CASCADE, related_name='resumo')
+    participantes = models.PositiveIntegerField('participantes', default=0)
+    inscricoes_confirmadas = models.PositiveIntegerField('inscricoes confirmadas', default=0)
+    pedidos_count = models.PositiveIntegerField('pedidos', default=0)
+    pedidos_pagos = models.PositiveIntegerField('pedidos pagos', default=0)
+    pedidos_total_pago = models.DecimalField('itens pagos', max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    inscricoes_valor_total = models.DecimalField('valor das inscricoes', max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    valor_bruto = models.DecimalField('valor bruto pago', max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    valor_pix = models.DecimalField('pago via pix', max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    valor_cartao = models.DecimalField('pago via cartao', max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    custos_total = models.DecimalField('custos', max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    receita_total = models.DecimalField('receita', max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    lucro_liquido = models.DecimalField('lucro liquido', max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    updated_at = models.DateTimeField('atualizado em', auto_now=True)
+
+    class Meta:
+        verbose_name = 'resumo de evento'
+        verbose_name_plural = 'resumos de eventos'
+
+    def __str__(self):
+        return f'Resumo {self.evento_id}'
+
+
 class EventoCustoComprovante(models.Model):
     custo = models.ForeignKey(EventoCusto, on_delete=models.CASCADE, related_name='comprovantes')
     arquivo = models.FileField('comprovante', upload_to=evento_custo_comprovante_upload_to)
@@ -1022,6 +1118,8 @@ class EventoInscricao(models.Model):
     created_at = models.DateTimeField('criado em', auto_now_add=True)
     updated_at = models.DateTimeField('atualizado em', auto_now=True)
 
+    objects = ListingQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'inscrição de evento'
         verbose_name_plural = 'inscrições de eventos'
@@ -1061,6 +1159,34 @@ class EventoInscricao(models.Model):
         super().save(*args, **kwargs)
 
 
+class EventoInscricaoBusca(models.Model):
+    """Documento de busca da consulta do evento, mantido por `accounts.evento_busca`.
+
+    Texto ja normalizado (minusculo, sem acento) e digitos de CPF/telefone separados
+    por espaco. No SQLite fica indexado numa tabela FTS5 (trigram); no Postgres, em
+    indices trigram (`pg_trgm`). Ver migration `0108`.
+    """
+
+    inscricao = models.OneToOneField(EventoInscricao, on_delete=models.CASCADE, related_name='busca')
+    evento = models.ForeignKey(Evento, on_delete=models.CASCADE, related_name='+')
+    cancelada = models.BooleanField('inscricao cancelada', default=False)
+    codigo = models.CharField('codigo da inscricao', max_length=3, blank=True)
+    documento = models.TextField('texto de busca', blank=True)
+    cpfs = models.CharField('cpfs', max_length=255, blank=True)
+    telefones = models.CharField('telefones', max_length=255, blank=True)
+    updated_at = models.DateTimeField('atualizado em', auto_now=True)
+
+    class Meta:
+        verbose_name = 'busca de inscricao de evento'
+        verbose_name_plural = 'buscas de inscricoes de eventos'
+        indexes = [
+            models.Index(fields=['evento', 'cancelada', 'codigo'], name='accounts_evbusca_codigo_idx'),
+        ]
+
+    def __str__(self):
+        return f'Busca da inscricao {self.inscricao_id}'
+
+
 class EventoPresenca(models.Model):
     evento = models.ForeignKey(Evento, on_delete=models.CASCADE, related_name='presencas')
     aventureiro = models.ForeignKey(Aventureiro, on_delete=models.CASCADE, related_name='presencas_evento')
@@ -1073,18 +1199,41 @@ class EventoPresenca(models.Model):
         related_name='presencas_atualizadas',
     )
     updated_at = models.DateTimeField('atualizado em', auto_now=True)
+    version = models.PositiveBigIntegerField('versao', default=0)
+    client_ts = models.DateTimeField('marcado no aparelho em', null=True, blank=True)
+    client_op_id = models.CharField('id da operacao no aparelho', max_length=64, blank=True)
 
     class Meta:
         verbose_name = 'presença em evento'
         verbose_name_plural = 'presenças em evento'
         unique_together = ('evento', 'aventureiro')
         ordering = ('aventureiro__nome',)
+        indexes = [
+            models.Index(fields=['evento', 'version'], name='accounts_presenca_evt_ver_idx'),
+        ]
 
     def __str__(self):
         status = 'presente' if self.presente else 'ausente'
         return f'{self.evento.name} - {self.aventureiro.nome} ({status})'
 
 
+class EventoPresencaVersao(models.Model):
+    """Contador de versao das presencas de um evento (protocolo de deltas).
+
+    Fica fora de `Evento` para que salvar o evento nunca volte o contador.
+    """
+
+    evento = models.OneToOneField(Evento, on_delete=models.CASCADE, primary_key=True, related_name='presenca_versao')
+    version = models.PositiveBigIntegerField('versao', default=0)
+
+    class Meta:
+        verbose_name = 'versão de presença do evento'
+        verbose_name_plural = 'versões de presença do evento'
+
+    def __str__(self):
+        return f'{self.evento_id} v{self.version}'
+
+
 class EventoFaltaInscricao(models.Model):
     evento = models.ForeignKey(Evento, on_delete=models.CASCADE, related_name='faltas_inscricao')
     nome = models.CharField('nome informado', max_length=255)
@@ -1197,6 +1346,8 @@ class PagamentoMensalidade(models.Model):
     created_at = models.DateTimeField('criado em', auto_now_add=True)
     updated_at = models.DateTimeField('atualizado em', auto_now=True)
 
+    objects = ListingQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'pagamento de mensalidades'
         verbose_name_plural = 'pagamentos de mensalidades'
@@ -1421,6 +1572,8 @@ class LojaPedido(models.Model):
     created_at = models.DateTimeField('criado em', auto_now_add=True)
     updated_at = models.DateTimeField('atualizado em', auto_now=True)
 
+    objects = ListingQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'pedido da loja'
         verbose_name_plural = 'pedidos da loja'
@@ -1455,6 +1608,198 @@ class LojaPedidoItem(models.Model):
         return f'Item pedido #{self.pedido_id} - {self.produto_titulo} ({self.variacao_nome})'
 
 
+class MercadoPagoWebhookInbox(models.Model):
+    SOURCE_MENSALIDADE = 'mensalidade'
+    SOURCE_LOJA = 'loja'
+
+    SOURCE_CHOICES = [
+        (SOURCE_MENSALIDADE, 'Mensalidades'),
+        (SOURCE_LOJA, 'Loja/eventos'),
+    ]
+
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_DONE = 'done'
+    STATUS_IGNORED = 'ignored'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pendente'),
+        (STATUS_PROCESSING, 'Processando'),
+        (STATUS_DONE, 'Processado'),
+        (STATUS_IGNORED, 'Ignorado'),
+        (STATUS_FAILED, 'Falhou'),
+    ]
+
+    source = models.CharField('origem', max_length=16, choices=SOURCE_CHOICES)
+    payment_id = models.CharField('id pagamento MP', max_length=64)
+    request_id = models.CharField('x-request-id', max_length=128)
+    status = models.CharField('status', max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField('tentativas', default=0)
+    last_error = models.TextField('ultimo erro', blank=True)
+    received_at = models.DateTimeField('recebido em', auto_now_add=True)
+    next_attempt_at = models.DateTimeField('proxima tentativa', default=timezone.now)
+    claimed_at = models.DateTimeField('em processamento desde', null=True, blank=True)
+    processed_at = models.DateTimeField('processado em', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'webhook do Mercado Pago'
+        verbose_name_plural = 'webhooks do Mercado Pago'
+        ordering = ('received_at', 'id')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['payment_id', 'request_id'],
+                name='uniq_mp_webhook_payment_request',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='accounts_mpwebhook_fila_idx'),
+        ]
+
+    def __str__(self):
+        return f'Webhook MP {self.payment_id} [{self.get_status_display()}]'
+
+
+class LojaCheckoutIdempotencia(models.Model):
+    STATUS_PROCESSING = 'processing'
+    STATUS_DONE = 'done'
+
+    STATUS_CHOICES = [
+        (STATUS_PROCESSING, 'Processando'),
+        (STATUS_DONE, 'Concluido'),
+    ]
+
+    scope = models.CharField('escopo', max_length=40)
+    key = models.CharField('chave', max_length=64)
+    owner = models.CharField('dono', max_length=80)
+    request_hash = models.CharField('hash da requisicao', max_length=64)
+    status = models.CharField('status', max_length=16, choices=STATUS_CHOICES, default=STATUS_PROCESSING)
+    pedido = models.ForeignKey(
+        LojaPedido,
+        on_delete=models.SET_NULL,
+        related_name='checkout_idempotencias',
+        null=True,
+        blank=True,
+    )
+    response = models.JSONField('resposta', default=dict, blank=True)
+    created_at = models.DateTimeField('criado em', auto_now_add=True)
+    updated_at = models.DateTimeField('atualizado em', auto_now=True)
+
+    class Meta:
+        verbose_name = 'chave de idempotencia do checkout'
+        verbose_name_plural = 'chaves de idempotencia do checkout'
+        ordering = ('-created_at', '-id')
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='uniq_loja_checkout_scope_key'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at'], name='accounts_checkout_idem_dt_idx'),
+        ]
+
+    def __str__(self):
+        return f'Checkout {self.scope} {self.key} [{self.get_status_display()}]'
+
+
+class MercadoPagoConsultaTrava(models.Model):
+    """Consulta ao MP em andamento para um pagamento (ver `accounts.mp_status`).
+
+    A chave unica garante um unico dono entre todos os workers; `expires_at`
+    libera a trava de um worker que morreu no meio da consulta.
+    """
+
+    payment_id = models.CharField('MP payment id', max_length=64, unique=True)
+    expires_at = models.DateTimeField('expira em')
+
+    class Meta:
+        verbose_name = 'trava de consulta ao Mercado Pago'
+        verbose_name_plural = 'travas de consulta ao Mercado Pago'
+
+    def __str__(self):
+        return f'Consulta MP {self.payment_id}'
+
+
+class MercadoPagoSincronizacaoTrava(models.Model):
+    """Sincronizacao manual do financeiro em andamento, uma por tipo (ver `accounts.mp_reconcile`).
+
+    A chave unica em `kind` garante um unico job entre todos os workers; `expires_at`
+    e renovado enquanto o job roda e libera a trava de um worker que morreu.
+    """
+
+    kind = models.CharField('tipo', max_length=16, unique=True)
+    job_id = models.CharField('job', max_length=32)
+    expires_at = models.DateTimeField('expira em')
+
+    class Meta:
+        verbose_name = 'trava de sincronizacao com o Mercado Pago'
+        verbose_name_plural = 'travas de sincronizacao com o Mercado Pago'
+
+    def __str__(self):
+        return f'Sincronizacao MP {self.kind} ({self.job_id})'
+
+
+class CobrancaMensalidadeCampanha(models.Model):
+    STATUS_RUNNING = 'running'
+    STATUS_PAUSED = 'paused'
+    STATUS_CANCELLED = 'cancelled'
+    STATUS_DONE = 'done'
+
+    STATUS_CHOICES = [
+        (STATUS_RUNNING, 'Enviando'),
+        (STATUS_PAUSED, 'Pausada'),
+        (STATUS_CANCELLED, 'Cancelada'),
+        (STATUS_DONE, 'Concluida'),
+    ]
+
+    status = models.CharField('status', max_length=16, choices=STATUS_CHOICES, default=STATUS_RUNNING)
+    aventureiro = models.ForeignKey(
+        Aventureiro,
+        on_delete=models.SET_NULL,
+        related_name='cobranca_campanhas',
+        null=True,
+        blank=True,
+    )
+    pause_seconds = models.PositiveIntegerField('intervalo entre envios (s)', default=4)
+    total_responsaveis = models.PositiveIntegerField('responsaveis', default=0)
+    total_mensalidades = models.PositiveIntegerField('mensalidades', default=0)
+    skipped_sem_usuario = models.PositiveIntegerField('sem usuario', default=0)
+    skipped_sem_telefone = models.PositiveIntegerField('sem telefone', default=0)
+    skipped_sem_telefone_nomes = models.JSONField('responsaveis sem telefone', default=list, blank=True)
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        related_name='cobranca_campanhas',
+        null=True,
+        blank=True,
+    )
+    created_at = models.DateTimeField('criado em', auto_now_add=True)
+    updated_at = models.DateTimeField('atualizado em', auto_now=True)
+    finished_at = models.DateTimeField('finalizada em', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'campanha de cobranca de mensalidades'
+        verbose_name_plural = 'campanhas de cobranca de mensalidades'
+        ordering = ('-created_at', '-id')
+
+    def __str__(self):
+        return f'Cobranca #{self.pk} [{self.get_status_display()}]'
+
+
+class CobrancaMensalidadeEnvio(models.Model):
+    campanha = models.ForeignKey(CobrancaMensalidadeCampanha, on_delete=models.CASCADE, related_name='envios')
+    queue_item = models.OneToOneField(WhatsAppQueue, on_delete=models.CASCADE, related_name='cobranca_envio')
+    responsavel_nome = models.CharField('responsavel', max_length=200, blank=True)
+    mensalidade_ids = models.JSONField('mensalidades', default=list, blank=True)
+    total_em_aberto = models.DecimalField('total em aberto', max_digits=10, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        verbose_name = 'envio de cobranca de mensalidades'
+        verbose_name_plural = 'envios de cobranca de mensalidades'
+        ordering = ('campanha', 'id')
+
+    def __str__(self):
+        return f'{self.responsavel_nome} (campanha #{self.campanha_id})'
+
+
 class ApostilaRequisito(models.Model):
     CLASSE_ABELHINHAS = 'abelhinhas'
     CLASSE_LUMINARES = 'luminares'
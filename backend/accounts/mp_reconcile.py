@@ -0,0 +1,273 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, close_old_connections, connections, transaction
+from django.utils import timezone
+
+from .http_client import TokenBucket
+from .models import LojaPedido, MercadoPagoSincronizacaoTrava, PagamentoMensalidade
+from .mp_status import mark_payment_refreshed
+
+logger = logging.getLogger(__name__)
+
+MODE_IDS = 'ids'
+MODE_SEARCH = 'search'
+MP_SEARCH_PAGE_SIZE = 100
+
+SYNC_JOB_PREFIX = 'accounts:mp-reconcile'
+SYNC_JOB_TIMEOUT = 6 * 60 * 60
+# Sem sinal de vida nesse tempo, o worker que rodava o job morreu e outro pode comecar.
+SYNC_JOB_STALE_SECONDS = 300
+SYNC_JOB_HEARTBEAT_SECONDS = 30
+SYNC_JOB_LABELS = {
+    'loja': 'Verificacao dos pedidos da loja',
+    'geral': 'Verificacao geral de pagamentos',
+}
+
+
+def _mp_client():
+    from .views import FinanceiroView
+
+    return FinanceiroView()
+
+
+def _fetch_payment(client, bucket, payment_id):
+    bucket.acquire()
+    return client._get_mp_payment(payment_id)
+
+
+def search_payments(client, begin, end, bucket=None):
+    """Pagamentos criados no intervalo, via /v1/payments/search (uma chamada por 100)."""
+    found = {}
+    offset = 0
+    while True:
+        if bucket is not None:
+            bucket.acquire()
+        query = urlencode({
+            'range': 'date_created',
+            'begin_date': begin.isoformat(timespec='milliseconds'),
+            'end_date': end.isoformat(timespec='milliseconds'),
+            'sort': 'date_created',
+            'criteria': 'asc',
+            'limit': MP_SEARCH_PAGE_SIZE,
+            'offset': offset,
+        })
+        page = client._mp_api_request('GET', f'/v1/payments/search?{query}')
+        results = page.get('results') or []
+        for payment in results:
+            if payment.get('id'):
+                found[str(payment['id'])] = payment
+        total = int((page.get('paging') or {}).get('total') or 0)
+        offset += len(results)
+        if not results or offset >= total:
+            return found
+
+
+def reconcile_payments(
+    rows, apply, *, mode=MODE_IDS, since=None, concurrency=None, rate=None, on_progress=None,
+):
+    """Consulta no MP os pagamentos de `rows` e aplica `apply(row, payment_data)`.
+
+    As consultas rodam em paralelo (limitadas por `concurrency` e pelo token bucket);
+    `apply` roda na thread chamadora, uma linha por vez, para nao disputar o lock de
+    escrita do SQLite. Erro em um pagamento so conta como falha daquele pagamento.
+    No modo `search` uma busca paginada por data substitui os GETs individuais;
+    o que a busca nao trouxer cai no GET por id.
+    """
+    concurrency = max(1, int(concurrency or getattr(settings, 'MP_RECONCILE_CONCURRENCY', 6)))
+    bucket = TokenBucket(rate or getattr(settings, 'MP_RECONCILE_RATE', 10))
+    client = _mp_client()
+    result = {'checked': 0, 'changed': 0, 'approved_now': 0, 'failed': 0, 'total': len(rows)}
+
+    def _apply(row, payment_data):
+        previous_status = row.status
+        try:
+            apply(row, payment_data)
+            mark_payment_refreshed(row.mp_payment_id, row.created_at)
+            row.refresh_from_db(fields=['status', 'paid_at'])
+        except Exception:  # noqa: BLE001
+            logger.exception('Falha ao aplicar pagamento MP %s.', row.mp_payment_id)
+            result['failed'] += 1
+        else:
+            if row.status != previous_status:
+                result['changed'] += 1
+            if previous_status != row.STATUS_PAGO and row.status == row.STATUS_PAGO:
+                result['approved_now'] += 1
+        result['checked'] += 1
+        if on_progress:
+            on_progress(result)
+
+    pending = list(rows)
+    if mode == MODE_SEARCH and pending:
+        begin = since or min(row.created_at for row in pending)
+        try:
+            found = search_payments(client, begin - timedelta(minutes=5), timezone.now(), bucket)
+        except Exception:  # noqa: BLE001
+            logger.exception('Busca de pagamentos no MP falhou; usando consulta por id.')
+            found = {}
+        remaining = []
+        for row in pending:
+            payment_data = found.get(str(row.mp_payment_id or '').strip())
+            if payment_data is None:
+                remaining.append(row)
+            else:
+                _apply(row, payment_data)
+        pending = remaining
+
+    if not pending:
+        return result
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(_fetch_payment, client, bucket, str(row.mp_payment_id or '').strip()): row
+            for row in pending
+        }
+        for future in as_completed(futures):
+            row = futures[future]
+            try:
+                payment_data = future.result()
+            except Exception as exc:  # noqa: BLE001
+                logger.warning('Consulta MP do pagamento %s falhou: %s', row.mp_payment_id, exc)
+                result['failed'] += 1
+                result['checked'] += 1
+                if on_progress:
+                    on_progress(result)
+                continue
+            _apply(row, payment_data)
+    return result
+
+
+def pending_loja_pedidos(cutoff, max_items):
+    qs = (
+        LojaPedido.objects
+        .for_listing()
+        .select_related('evento_inscricao')
+        .filter(
+            status__in=[LojaPedido.STATUS_PENDENTE, LojaPedido.STATUS_PROCESSANDO],
+            created_at__gte=cutoff,
+            mp_payment_id__isnull=False,
+        )
+        .exclude(mp_payment_id='')
+        .order_by('created_at', 'id')
+    )
+    return list(qs[:max_items]) if max_items > 0 else list(qs)
+
+
+def pending_mensalidade_pagamentos(cutoff, max_items):
+    qs = (
+        PagamentoMensalidade.objects
+        .for_listing()
+        .filter(
+            status__in=[PagamentoMensalidade.STATUS_PENDENTE, PagamentoMensalidade.STATUS_PROCESSANDO],
+            created_at__gte=cutoff,
+            mp_payment_id__isnull=False,
+        )
+        .exclude(mp_payment_id='')
+        .order_by('created_at', 'id')
+    )
+    return list(qs[:max_items]) if max_items > 0 else list(qs)
+
+
+# Sincronizacao manual do financeiro em segundo plano; o progresso fica no cache compartilhado.
+
+def _job_key(job_id):
+    return f'{SYNC_JOB_PREFIX}:job:{job_id}'
+
+
+def get_sync_job(job_id):
+    return cache.get(_job_key(job_id))
+
+
+def _save_job(job_id, data):
+    data['heartbeat'] = time.time()
+    cache.set(_job_key(job_id), data, SYNC_JOB_TIMEOUT)
+
+
+def _claim_sync_lock(kind, job_id):
+    # Mesmo esquema de `claim_payment_refresh`: a chave unica no banco e atomica entre
+    # processos (o add do cache em arquivo nao e).
+    expires_at = timezone.now() + timedelta(seconds=SYNC_JOB_STALE_SECONDS)
+    try:
+        with transaction.atomic():
+            MercadoPagoSincronizacaoTrava.objects.create(kind=kind, job_id=job_id, expires_at=expires_at)
+        return True
+    except IntegrityError:
+        pass
+    return MercadoPagoSincronizacaoTrava.objects.filter(
+        kind=kind,
+        expires_at__lte=timezone.now(),
+    ).update(job_id=job_id, expires_at=expires_at) == 1
+
+
+def start_sync_job(kind, runner):
+    """Roda `runner(progress)` numa thread; no maximo um job por `kind` entre todos os workers.
+
+    Devolve `(job_id, kind, iniciado)`: com um job do mesmo tipo ja em andamento,
+    devolve o id e o tipo dele e `iniciado=False`.
+    """
+    job_id = uuid.uuid4().hex
+    state = {
+        'id': job_id,
+        'kind': kind,
+        'status': 'running',
+        'started_at': timezone.now().isoformat(),
+        'finished_at': '',
+        'progress': {},
+        'result': {},
+        'message': '',
+    }
+    # Estado gravado antes de publicar a trava: quem encontra a trava sempre acha o job.
+    _save_job(job_id, state)
+    for _attempt in range(3):
+        if _claim_sync_lock(kind, job_id):
+            break
+        current = MercadoPagoSincronizacaoTrava.objects.filter(kind=kind).first()
+        if current is not None:
+            cache.delete(_job_key(job_id))
+            current_job = get_sync_job(current.job_id) or {}
+            return current.job_id, current_job.get('kind') or current.kind, False
+    else:
+        cache.delete(_job_key(job_id))
+        raise RuntimeError(f'Nao foi possivel reservar a sincronizacao "{kind}".')
+    last_saved = [0.0]
+    last_heartbeat = [time.monotonic()]
+
+    def save():
+        _save_job(job_id, state)
+        now = time.monotonic()
+        if now - last_heartbeat[0] >= SYNC_JOB_HEARTBEAT_SECONDS:
+            last_heartbeat[0] = now
+            MercadoPagoSincronizacaoTrava.objects.filter(kind=kind, job_id=job_id).update(
+                expires_at=timezone.now() + timedelta(seconds=SYNC_JOB_STALE_SECONDS),
+            )
+
+    def progress(label, data):
+        state['progress'][label] = {key: data[key] for key in ('checked', 'total', 'changed', 'approved_now', 'failed')}
+        now = time.monotonic()
+        if now - last_saved[0] >= 1 or data['checked'] >= data['total']:
+            last_saved[0] = now
+            save()
+
+    def run():
+        close_old_connections()
+        try:
+            state['result'] = runner(progress)
+            state['status'] = 'done'
+        except Exception as exc:  # noqa: BLE001
+            logger.exception('Sincronizacao manual de pagamentos falhou.')
+            state['status'] = 'failed'
+            state['message'] = str(exc)
+        finally:
+            state['finished_at'] = timezone.now().isoformat()
+            _save_job(job_id, state)
+            MercadoPagoSincronizacaoTrava.objects.filter(kind=kind, job_id=job_id).delete()
+            connections.close_all()
+
+    threading.Thread(target=run, name=f'mp-reconcile-{job_id[:8]}', daemon=True).start()
+    return job_id, kind, True
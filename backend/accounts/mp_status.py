@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import MercadoPagoConsultaTrava
+
+MP_STATUS_CACHE_PREFIX = 'accounts:mp-status'
+
+# (idade maxima do pedido em segundos, segundos entre consultas ao MP)
+MP_STATUS_TTLS = (
+    (2 * 60, 4),
+    (15 * 60, 10),
+    (60 * 60, 30),
+    (6 * 60 * 60, 120),
+)
+MP_STATUS_TTL_MAX = 600
+# Depois de um webhook o estado local ja e o do MP; o proximo webhook avisa a mudanca seguinte.
+MP_STATUS_WEBHOOK_TTL = 60
+
+
+def _fresh_key(payment_id):
+    return f'{MP_STATUS_CACHE_PREFIX}:{payment_id}'
+
+
+def payment_status_ttl(created_at=None):
+    """Pedido recem-criado e consultado no MP a cada poucos segundos; pedido velho, raramente."""
+    if created_at is None:
+        return MP_STATUS_TTLS[0][1]
+    age = (timezone.now() - created_at).total_seconds()
+    for max_age, ttl in MP_STATUS_TTLS:
+        if age < max_age:
+            return ttl
+    return MP_STATUS_TTL_MAX
+
+
+def claim_payment_refresh(payment_id):
+    """True se este request deve consultar o MP agora.
+
+    Falso quando o estado local ainda e recente (consulta ou webhook dentro do TTL)
+    ou quando outro request, em qualquer worker, ja esta consultando o mesmo pagamento.
+    Quem recebe True deve chamar `mark_payment_refreshed` ao terminar, com ou sem erro.
+    """
+    payment_id = str(payment_id or '').strip()
+    if not payment_id:
+        return False
+    if cache.get(_fresh_key(payment_id)):
+        return False
+    lock_seconds = int(getattr(settings, 'MP_STATUS_LOCK_SECONDS', 70))
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=lock_seconds)
+    # O add do cache em arquivo verifica e depois grava (nao e atomico entre
+    # processos); a chave unica no banco e.
+    try:
+        with transaction.atomic():
+            MercadoPagoConsultaTrava.objects.create(payment_id=payment_id, expires_at=expires_at)
+        return True
+    except IntegrityError:
+        pass
+    # Trava vencida: o UPDATE condicional deixa um unico request assumir.
+    return MercadoPagoConsultaTrava.objects.filter(
+        payment_id=payment_id,
+        expires_at__lte=now,
+    ).update(expires_at=expires_at) == 1
+
+
+def mark_payment_refreshed(payment_id, created_at=None, ttl=None):
+    """Marca o estado local como atual pelo TTL do pedido e libera a consulta em andamento."""
+    payment_id = str(payment_id or '').strip()
+    if not payment_id:
+        return
+    cache.set(_fresh_key(payment_id), 1, ttl or payment_status_ttl(created_at))
+    MercadoPagoConsultaTrava.objects.filter(payment_id=payment_id).delete()
@@ -0,0 +1,151 @@
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connections, transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .models import MercadoPagoWebhookInbox
+from .mp_status import MP_STATUS_WEBHOOK_TTL, mark_payment_refreshed
+
+logger = logging.getLogger(__name__)
+
+# Item em "processando" ha mais que isso e de um worker que morreu: volta para a fila.
+MP_WEBHOOK_STALE_CLAIM = timedelta(minutes=10)
+
+
+def enqueue_webhook(source, payment_id, request_id=''):
+    """Grava a notificacao na caixa de entrada e retorna `(item, criado)`.
+
+    Reenvio do MP (mesmo `payment_id` + `x-request-id`) nao gera item novo, e
+    notificacoes sem `x-request-id` entram no item pendente do mesmo pagamento,
+    que ja vai consultar o estado atual no MP.
+    """
+    payment_id = str(payment_id or '').strip()[:64]
+    request_id = str(request_id or '').strip()[:128]
+    if request_id:
+        existing = MercadoPagoWebhookInbox.objects.filter(payment_id=payment_id, request_id=request_id).first()
+        if existing:
+            return existing, False
+    pending = (
+        MercadoPagoWebhookInbox.objects
+        .filter(payment_id=payment_id, status=MercadoPagoWebhookInbox.STATUS_PENDING)
+        .first()
+    )
+    if pending:
+        return pending, False
+    try:
+        with transaction.atomic():
+            item = MercadoPagoWebhookInbox.objects.create(
+                source=source,
+                payment_id=payment_id,
+                request_id=request_id or f'local-{uuid.uuid4().hex}',
+            )
+        return item, True
+    except IntegrityError:
+        return MercadoPagoWebhookInbox.objects.filter(payment_id=payment_id, request_id=request_id).first(), False
+
+
+def claim_webhooks(limit):
+    now = timezone.now()
+    MercadoPagoWebhookInbox.objects.filter(
+        status=MercadoPagoWebhookInbox.STATUS_PROCESSING,
+        claimed_at__lt=now - MP_WEBHOOK_STALE_CLAIM,
+    ).update(status=MercadoPagoWebhookInbox.STATUS_PENDING, claimed_at=None)
+    ids = list(
+        MercadoPagoWebhookInbox.objects
+        .filter(status=MercadoPagoWebhookInbox.STATUS_PENDING, next_attempt_at__lte=now)
+        .order_by('next_attempt_at', 'id')
+        .values_list('id', flat=True)[:limit]
+    )
+    if not ids:
+        return []
+    with transaction.atomic():
+        MercadoPagoWebhookInbox.objects.filter(
+            id__in=ids,
+            status=MercadoPagoWebhookInbox.STATUS_PENDING,
+        ).update(status=MercadoPagoWebhookInbox.STATUS_PROCESSING, claimed_at=now)
+    return list(
+        MercadoPagoWebhookInbox.objects
+        .filter(id__in=ids, status=MercadoPagoWebhookInbox.STATUS_PROCESSING, claimed_at=now)
+        .order_by('next_attempt_at', 'id')
+    )
+
+
+def _sync_webhook(item):
+    from .views import LojaPedidoWebhookView, PagamentoMensalidadeWebhookView
+
+    if item.source == MercadoPagoWebhookInbox.SOURCE_LOJA:
+        return LojaPedidoWebhookView()._sync_by_payment_id(item.payment_id)
+    return PagamentoMensalidadeWebhookView()._sync_by_payment_id(item.payment_id)
+
+
+def process_webhook(item):
+    max_attempts = max(1, int(getattr(settings, 'MP_WEBHOOK_MAX_ATTEMPTS', 8)))
+    item.attempts += 1
+    try:
+        synced, reason = _sync_webhook(item)
+    except Exception as exc:  # noqa: BLE001
+        logger.warning('Webhook MP %s falhou (tentativa %s): %s', item.payment_id, item.attempts, exc)
+        item.last_error = str(exc)[:2000]
+        if item.attempts >= max_attempts:
+            item.status = MercadoPagoWebhookInbox.STATUS_FAILED
+        else:
+            item.status = MercadoPagoWebhookInbox.STATUS_PENDING
+            item.next_attempt_at = timezone.now() + timedelta(seconds=min(3600, 15 * 2 ** (item.attempts - 1)))
+    else:
+        item.status = MercadoPagoWebhookInbox.STATUS_DONE if synced else MercadoPagoWebhookInbox.STATUS_IGNORED
+        item.last_error = reason or ''
+        item.processed_at = timezone.now()
+        if synced:
+            # O polling passa a responder com o estado local, sem consultar o MP de novo.
+            mark_payment_refreshed(item.payment_id, ttl=MP_STATUS_WEBHOOK_TTL)
+    item.claimed_at = None
+    item.save(update_fields=['status', 'attempts', 'last_error', 'next_attempt_at', 'claimed_at', 'processed_at'])
+    return item
+
+
+def _process_in_thread(item):
+    close_old_connections()
+    try:
+        return process_webhook(item)
+    finally:
+        connections.close_all()
+
+
+def drain_webhooks(concurrency=4, max_items=0):
+    """Processa a caixa de entrada em lotes; ate `concurrency` consultas ao MP em paralelo."""
+    concurrency = max(1, int(concurrency))
+    processed = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while True:
+            limit = concurrency * 4
+            if max_items:
+                limit = min(limit, max_items - len(processed))
+                if limit <= 0:
+                    break
+            items = claim_webhooks(limit)
+            if not items:
+                break
+            processed.extend(executor.map(_process_in_thread, items))
+    return processed
+
+
+def webhook_inbox_stats():
+    now = timezone.now()
+    pending = MercadoPagoWebhookInbox.objects.filter(
+        status__in=[MercadoPagoWebhookInbox.STATUS_PENDING, MercadoPagoWebhookInbox.STATUS_PROCESSING],
+    )
+    oldest = pending.aggregate(oldest=Min('received_at'))['oldest']
+    return {
+        'pending': pending.count(),
+        'lag_seconds': int((now - oldest).total_seconds()) if oldest else 0,
+        'failed': MercadoPagoWebhookInbox.objects.filter(status=MercadoPagoWebhookInbox.STATUS_FAILED).count(),
+        'processed_24h': MercadoPagoWebhookInbox.objects.filter(
+            status=MercadoPagoWebhookInbox.STATUS_DONE,
+            processed_at__gte=now - timedelta(hours=24),
+        ).count(),
+    }
@@ -0,0 +1,41 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+PERMISSION_VERSION_KEY = 'accounts:permissoes:versao'
+PERMISSION_CACHE_TIMEOUT = 6 * 60 * 60
+
+
+def permission_cache_version():
+    # A versao fica no cache compartilhado (arquivo), entao todos os workers do
+    # gunicorn enxergam a mesma invalidacao.
+    version = cache.get(PERMISSION_VERSION_KEY)
+    if version is None:
+        cache.add(PERMISSION_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(PERMISSION_VERSION_KEY) or 0
+    return version
+
+
+def permission_cache_key(name, *parts):
+    suffix = ':'.join(str(part) for part in parts)
+    base = f'accounts:permissoes:{permission_cache_version()}:{name}'
+    return f'{base}:{suffix}' if suffix else base
+
+
+def _bump_permission_cache_version():
+    cache.set(PERMISSION_VERSION_KEY, time.time_ns(), None)
+
+
+def invalidate_permission_cache():
+    # So invalida depois do commit para nenhum worker recompilar com dados antigos.
+    transaction.on_commit(_bump_permission_cache_version)
+
+
+def get_cached_permission_data(name, *parts, builder):
+    key = permission_cache_key(name, *parts)
+    data = cache.get(key)
+    if data is None:
+        data = builder()
+        cache.set(key, data, PERMISSION_CACHE_TIMEOUT)
+    return data
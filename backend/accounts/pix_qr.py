@@ -0,0 +1,114 @@
+import base64
+import binascii
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from pathlib import Path
+
+import qrcode
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+
+from .models import LojaPedido, PagamentoMensalidade
+
+logger = logging.getLogger(__name__)
+
+PIX_QR_MODELS = {
+    'loja': LojaPedido,
+    'mensalidade': PagamentoMensalidade,
+}
+_SIGNER_SALT = 'accounts.pix_qr'
+
+_memory = OrderedDict()
+_memory_lock = threading.Lock()
+
+
+def cache_dir():
+    return Path(getattr(settings, 'PIX_QR_CACHE_DIR', settings.BASE_DIR / 'pix_qr_cache'))
+
+
+def code_digest(pix_code):
+    return hashlib.sha256(str(pix_code or '').encode('utf-8')).hexdigest()[:16]
+
+
+def _cache_key(obj):
+    # Um Pix por pagamento no MP; pedidos antigos sem payment id caem no pk.
+    payment_id = ''.join(ch for ch in str(obj.mp_payment_id or '') if ch.isalnum())
+    return payment_id or f'{obj._meta.model_name}-{obj.pk}'
+
+
+def render_pix_qr(pix_code):
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=8, border=2)
+    qr.add_data(pix_code)
+    qr.make(fit=True)
+    output = BytesIO()
+    qr.make_image(fill_color='black', back_color='white').save(output, format='PNG')
+    return output.getvalue()
+
+
+def _remember(key, png):
+    limit = max(1, int(getattr(settings, 'PIX_QR_MEMORY_ITEMS', 128)))
+    with _memory_lock:
+        _memory[key] = png
+        _memory.move_to_end(key)
+        while len(_memory) > limit:
+            _memory.popitem(last=False)
+
+
+def pix_qr_png(obj):
+    """PNG do QR do Pix: memoria do worker, depois disco, depois renderiza."""
+    pix_code = str(obj.mp_qr_code or '').strip()
+    if not pix_code:
+        # Linhas anteriores ao QR sob demanda que so guardaram a imagem.
+        try:
+            return base64.b64decode(obj.mp_qr_code_base64 or '', validate=True) or None
+        except (binascii.Error, ValueError):
+            return None
+    key = f'{_cache_key(obj)}-{code_digest(pix_code)}'
+    with _memory_lock:
+        png = _memory.get(key)
+        if png is not None:
+            _memory.move_to_end(key)
+            return png
+    path = cache_dir() / f'{key}.png'
+    try:
+        png = path.read_bytes()
+    except OSError:
+        png = render_pix_qr(pix_code)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix('.tmp')
+            tmp_path.write_bytes(png)
+            tmp_path.replace(path)
+        except OSError:
+            logger.warning('Nao foi possivel gravar o QR Pix em cache: %s', path)
+    _remember(key, png)
+    return png
+
+
+def pix_qr_url(kind, obj):
+    """URL assinada da imagem; muda junto com o codigo Pix, entao pode ficar em cache."""
+    pix_code = str(obj.mp_qr_code or '').strip()
+    if not pix_code and not obj.mp_qr_code_base64:
+        return ''
+    token = signing.Signer(salt=_SIGNER_SALT).sign(f'{kind}.{obj.pk}.{code_digest(pix_code)}')
+    return reverse('accounts:pix_qr_image_api', kwargs={'token': token})
+
+
+def resolve_pix_qr_token(token):
+    """Devolve o pedido/pagamento do token, ou `None` se invalido ou de outro codigo Pix."""
+    try:
+        value = signing.Signer(salt=_SIGNER_SALT).unsign(token)
+        kind, pk, digest = value.split('.', 2)
+    except (signing.BadSignature, ValueError):
+        return None
+    model = PIX_QR_MODELS.get(kind)
+    if model is None or not pk.isdigit():
+        return None
+    obj = model.objects.filter(pk=int(pk)).only('id', 'mp_payment_id', 'mp_qr_code', 'mp_qr_code_base64').first()
+    if obj is None or code_digest(str(obj.mp_qr_code or '').strip()) != digest:
+        return None
+    return obj
@@ -0,0 +1,252 @@
+import json
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Aventureiro, EventoPresenca, EventoPresencaVersao
+
+PRESENCA_BATCH_MAX_OPS = 500
+PRESENCA_VERSION_KEY = 'accounts:presenca:versao:{evento_id}'
+PRESENCA_STREAM_MIN_WAIT = 1.0
+
+# Acorda os streams deste processo quando uma marcacao feita aqui e gravada;
+# mudancas vindas de outros workers aparecem na proxima verificacao do cache.
+_version_changed = threading.Condition()
+
+
+def presenca_payload(row):
+    return {
+        'presente': bool(row.presente),
+        'updated_at': timezone.localtime(row.updated_at).isoformat(),
+        'updated_by': row.updated_by.username if row.updated_by else '',
+        'version': row.version,
+    }
+
+
+def current_version(evento_id):
+    return (
+        EventoPresencaVersao.objects
+        .filter(evento_id=evento_id)
+        .values_list('version', flat=True)
+        .first()
+    ) or 0
+
+
+def _next_version(evento_id):
+    # O UPDATE trava o contador ate o commit: as versoes ficam visiveis em ordem.
+    # Registrado antes de qualquer retorno: toda gravacao publica a versao no cache.
+    transaction.on_commit(lambda: _publish_version(evento_id))
+    updated = EventoPresencaVersao.objects.filter(evento_id=evento_id).update(version=F('version') + 1)
+    if not updated:
+        try:
+            with transaction.atomic():
+                EventoPresencaVersao.objects.create(evento_id=evento_id, version=1)
+            return 1
+        except IntegrityError:
+            EventoPresencaVersao.objects.filter(evento_id=evento_id).update(version=F('version') + 1)
+    return current_version(evento_id)
+
+
+def _publish_version(evento_id):
+    cache.set(PRESENCA_VERSION_KEY.format(evento_id=evento_id), current_version(evento_id), None)
+    with _version_changed:
+        _version_changed.notify_all()
+
+
+def published_version(evento_id):
+    """Versao do evento pelo cache compartilhado; so consulta o banco se a chave sumiu."""
+    version = cache.get(PRESENCA_VERSION_KEY.format(evento_id=evento_id))
+    if version is None:
+        version = current_version(evento_id)
+        cache.set(PRESENCA_VERSION_KEY.format(evento_id=evento_id), version, None)
+    return version
+
+
+def mark_presence(evento, aventureiro, presente, user):
+    with transaction.atomic():
+        version = _next_version(evento.id)
+        presenca, _created = EventoPresenca.objects.update_or_create(
+            evento=evento,
+            aventureiro=aventureiro,
+            defaults={
+                'presente': presente,
+                'updated_by': user,
+                'version': version,
+                'client_ts': timezone.now(),
+                'client_op_id': '',
+            },
+        )
+    return presenca
+
+
+def parse_client_ts(value, now=None):
+    """Aceita epoch em ms (Date.now()) ou ISO 8601; relogio adiantado e limitado ao horario do servidor."""
+    now = now or timezone.now()
+    parsed = None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        try:
+            parsed = datetime.fromtimestamp(value / 1000, tz=dt_timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            return None
+    elif isinstance(value, str) and value.strip():
+        parsed = parse_datetime(value.strip())
+        if parsed is not None and timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+    if parsed is None:
+        return None
+    return min(parsed, now)
+
+
+def apply_presence_ops(evento, ops, user):
+    """Aplica um diario de marcacoes vindo do aparelho numa unica transacao.
+
+    Cada operacao tem `aventureiro_id`, `presente`, `client_ts` e `op_id`. Vence a
+    mais recente por `(client_ts, op_id)`; reenviar a mesma operacao nao muda nada.
+    Retorna `(resultados por op_id, presencas tocadas, versao, linhas alteradas)`.
+    """
+    now = timezone.now()
+    results = {}
+    latest = {}
+    for op in ops:
+        op_id = str(op.get('op_id') or '').strip()[:64]
+        if not op_id:
+            continue
+        aventureiro_id = op.get('aventureiro_id')
+        client_ts = parse_client_ts(op.get('client_ts'), now)
+        if not str(aventureiro_id).isdigit() or client_ts is None or not isinstance(op.get('presente'), bool):
+            results[op_id] = 'invalid'
+            continue
+        item = {
+            'aventureiro_id': int(aventureiro_id),
+            'presente': op['presente'],
+            'client_ts': client_ts,
+            'op_id': op_id,
+        }
+        current = latest.get(item['aventureiro_id'])
+        if current is None or (client_ts, op_id) > (current['client_ts'], current['op_id']):
+            if current is not None:
+                results[current['op_id']] = 'superseded'
+            latest[item['aventureiro_id']] = item
+        else:
+            results[op_id] = 'superseded'
+
+    valid_ids = set(Aventureiro.objects.filter(id__in=latest).values_list('id', flat=True))
+    for aventureiro_id, item in list(latest.items()):
+        if aventureiro_id not in valid_ids:
+            results[item['op_id']] = 'invalid'
+            del latest[aventureiro_id]
+
+    with transaction.atomic():
+        existing = {
+            row.aventureiro_id: row
+            for row in EventoPresenca.objects.select_for_update().filter(evento=evento, aventureiro_id__in=latest)
+        }
+        to_create = []
+        to_update = []
+        for aventureiro_id, item in latest.items():
+            row = existing.get(aventureiro_id)
+            if row is not None and row.client_op_id == item['op_id']:
+                results[item['op_id']] = 'duplicate'
+                continue
+            if row is not None and row.client_ts and (row.client_ts, row.client_op_id) >= (item['client_ts'], item['op_id']):
+                results[item['op_id']] = 'stale'
+                continue
+            if row is None:
+                row = EventoPresenca(evento=evento, aventureiro_id=aventureiro_id)
+                to_create.append(row)
+            else:
+                to_update.append(row)
+            row.presente = item['presente']
+            row.updated_by = user
+            row.updated_at = now
+            row.client_ts = item['client_ts']
+            row.client_op_id = item['op_id']
+            results[item['op_id']] = 'applied'
+        if to_create or to_update:
+            version = _next_version(evento.id)
+            for row in to_create + to_update:
+                row.version = version
+            EventoPresenca.objects.bulk_create(to_create)
+            EventoPresenca.objects.bulk_update(
+                to_update,
+                ['presente', 'updated_by', 'updated_at', 'client_ts', 'client_op_id', 'version'],
+            )
+
+    rows = EventoPresenca.objects.filter(evento=evento, aventureiro_id__in=latest).select_related('updated_by')
+    touched = {str(row.aventureiro_id): presenca_payload(row) for row in rows}
+    return results, touched, current_version(evento.id), len(to_create) + len(to_update)
+
+
+def presence_changes(evento_id, since=None):
+    """Retorna `(presencas, versao)`; com `since` traz so as linhas alteradas depois dele."""
+    version = current_version(evento_id)
+    rows = EventoPresenca.objects.filter(evento_id=evento_id).select_related('updated_by')
+    if since is not None:
+        if since >= version:
+            return {}, version
+        rows = rows.filter(version__gt=since)
+    data = {}
+    for row in rows:
+        data[str(row.aventureiro_id)] = presenca_payload(row)
+        version = max(version, row.version)
+    return data, version
+
+
+def count_present(evento_id):
+    return EventoPresenca.objects.filter(evento_id=evento_id, presente=True).count()
+
+
+# Cada stream ocupa uma thread do worker; acima do limite o cliente volta ao polling.
+_stream_slots = threading.BoundedSemaphore(max(1, int(getattr(settings, 'PRESENCA_STREAM_MAX_PER_WORKER', 4))))
+
+
+def presence_event_stream(evento_id, since):
+    """Gerador SSE: envia deltas quando a versao do evento muda e encerra apos alguns segundos.
+
+    Parado, o stream espera a notificacao de mudanca (ou um intervalo crescente de 1s ate
+    `PRESENCA_STREAM_MAX_WAIT`) e confere so a versao no cache; o banco e lido apenas
+    quando ha delta para enviar. O navegador reconecta sozinho (EventSource) mandando
+    `Last-Event-ID` com a ultima versao. Com o stream desligado ou sem vaga livre no
+    worker envia o evento `fallback` e o cliente volta ao polling.
+    """
+    if not getattr(settings, 'PRESENCA_STREAM_ENABLED', False) or not _stream_slots.acquire(blocking=False):
+        yield 'event: fallback\ndata: {}\n\n'
+        return
+    duration = float(getattr(settings, 'PRESENCA_STREAM_SECONDS', 25))
+    max_wait = max(PRESENCA_STREAM_MIN_WAIT, float(getattr(settings, 'PRESENCA_STREAM_MAX_WAIT', 5)))
+    deadline = time.monotonic() + duration
+    last_sent = time.monotonic()
+    wait = PRESENCA_STREAM_MIN_WAIT
+    try:
+        yield 'retry: 1000\n\n'
+        while True:
+            if published_version(evento_id) > since:
+                data, since = presence_changes(evento_id, since)
+                payload = {
+                    'evento_id': evento_id,
+                    'version': since,
+                    'presencas': data,
+                    'present_count': count_present(evento_id),
+                    'server_time': timezone.localtime(timezone.now()).isoformat(),
+                }
+                yield f'id: {since}\nevent: presenca\ndata: {json.dumps(payload)}\n\n'
+                last_sent = time.monotonic()
+                wait = PRESENCA_STREAM_MIN_WAIT
+            elif time.monotonic() - last_sent >= 10:
+                yield ': ping\n\n'
+                last_sent = time.monotonic()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            with _version_changed:
+                notified = _version_changed.wait(timeout=min(wait, remaining))
+            wait = PRESENCA_STREAM_MIN_WAIT if notified else min(wait * 2, max_wait)
+    finally:
+        _stream_slots.release()
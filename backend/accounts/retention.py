@@ -0,0 +1,233 @@
+import gzip
+import json
+import logging
+import os
+import time
+import unicodedata
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import AuditLog, WhatsAppQueue
+
+logger = logging.getLogger(__name__)
+
+AUDIT_ARCHIVE_NAME = 'auditlog'
+WHATSAPP_ARCHIVE_NAME = 'whatsappqueue'
+
+
+def archive_dir():
+    return Path(getattr(settings, 'RETENTION_ARCHIVE_DIR', settings.BASE_DIR / 'archive'))
+
+
+def _month_key(value):
+    return timezone.localtime(value).strftime('%Y-%m')
+
+
+def _archive_path(name, month):
+    return archive_dir() / name / f'{month}.jsonl.gz'
+
+
+def _write_archive(name, rows):
+    """Acrescenta as linhas aos arquivos mensais (um membro gzip por lote)."""
+    by_month = {}
+    for row in rows:
+        by_month.setdefault(_month_key(row['created_at']), []).append(row)
+    for month, month_rows in by_month.items():
+        path = _archive_path(name, month)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = ''.join(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n' for row in month_rows)
+        with open(path, 'ab') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as handle:
+                handle.write(payload.encode('utf-8'))
+            raw.flush()
+            os.fsync(raw.fileno())
+
+
+def archive_queryset(name, queryset, batch_size=500, pause=0.05, dry_run=False):
+    """Arquiva e apaga as linhas do queryset em lotes pequenos.
+
+    Cada lote e gravado no arquivo antes de ser apagado, numa transacao curta,
+    para nunca segurar o lock de escrita do SQLite por muito tempo.
+    """
+    batch_size = max(1, int(batch_size))
+    fields = [field.attname for field in queryset.model._meta.concrete_fields]
+    if dry_run:
+        return queryset.count()
+    total = 0
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(id__gt=last_id).order_by('id').values(*fields)[:batch_size])
+        if not rows:
+            break
+        _write_archive(name, rows)
+        ids = [row['id'] for row in rows]
+        with transaction.atomic():
+            queryset.model.objects.filter(id__in=ids).delete()
+        total += len(rows)
+        last_id = ids[-1]
+        if pause:
+            time.sleep(pause)
+    return total
+
+
+def purge_expired_sessions(batch_size=500, pause=0.05, dry_run=False):
+    expired = Session.objects.filter(expire_date__lt=timezone.now())
+    if dry_run:
+        return expired.count()
+    total = 0
+    while True:
+        keys = list(expired.values_list('session_key', flat=True)[:batch_size])
+        if not keys:
+            break
+        with transaction.atomic():
+            Session.objects.filter(session_key__in=keys).delete()
+        total += len(keys)
+        if pause:
+            time.sleep(pause)
+    return total
+
+
+def incremental_vacuum(pages=0):
+    """Devolve paginas livres do SQLite ao disco sem o VACUUM completo.
+
+    So tem efeito com `auto_vacuum=INCREMENTAL` (ver `enable_incremental_vacuum`).
+    """
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA auto_vacuum')
+        if cursor.fetchone()[0] != 2:
+            return False
+        if pages:
+            cursor.execute(f'PRAGMA incremental_vacuum({int(pages)})')
+        else:
+            cursor.execute('PRAGMA incremental_vacuum')
+        cursor.fetchall()
+    return True
+
+
+def enable_incremental_vacuum():
+    # Trocar o modo exige um VACUUM completo (uma unica vez, fora do horario de uso).
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        cursor.execute('VACUUM')
+    return True
+
+
+def run_retention(audit_days=None, whatsapp_days=None, batch_size=500, pause=0.05, dry_run=False, vacuum=True):
+    now = timezone.now()
+    audit_days = getattr(settings, 'AUDIT_LOG_RETENTION_DAYS', 365) if audit_days is None else audit_days
+    whatsapp_days = getattr(settings, 'WHATSAPP_QUEUE_RETENTION_DAYS', 180) if whatsapp_days is None else whatsapp_days
+    result = {'auditlog': 0, 'whatsappqueue': 0, 'sessions': 0, 'vacuum': False}
+
+    if audit_days and audit_days > 0:
+        result['auditlog'] = archive_queryset(
+            AUDIT_ARCHIVE_NAME,
+            AuditLog.objects.filter(created_at__lt=now - timedelta(days=audit_days)),
+            batch_size=batch_size,
+            pause=pause,
+            dry_run=dry_run,
+        )
+    if whatsapp_days and whatsapp_days > 0:
+        # Pendentes continuam na fila independentemente da idade.
+        result['whatsappqueue'] = archive_queryset(
+            WHATSAPP_ARCHIVE_NAME,
+            WhatsAppQueue.objects.filter(created_at__lt=now - timedelta(days=whatsapp_days)).exclude(
+                status__in=[WhatsAppQueue.STATUS_PENDING, WhatsAppQueue.STATUS_PROCESSING, WhatsAppQueue.STATUS_PAUSED]
+            ),
+            batch_size=batch_size,
+            pause=pause,
+            dry_run=dry_run,
+        )
+    result['sessions'] = purge_expired_sessions(batch_size=batch_size, pause=pause, dry_run=dry_run)
+    if vacuum and not dry_run:
+        result['vacuum'] = incremental_vacuum()
+    logger.info('Retencao concluida: %s', result)
+    return result
+
+
+def _fold(value):
+    text = unicodedata.normalize('NFKD', str(value or ''))
+    return ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+
+def search_audit_archive(
+    query='', usuario='', acao='', onde='', assunto='', metodo='',
+    start_at=None, end_at=None, before=None, limit=200,
+):
+    """Busca sequencial nos arquivos mensais de auditoria (mais recentes primeiro).
+
+    `before` e o cursor `(created_at, id)` da pagina anterior.
+    """
+    if before is not None:
+        cursor_end = before[0] + timedelta(microseconds=1)
+        end_at = min(end_at, cursor_end) if end_at else cursor_end
+    base = archive_dir() / AUDIT_ARCHIVE_NAME
+    if not base.is_dir():
+        return []
+    paths = sorted(base.glob('*.jsonl.gz'), reverse=True)
+    # O nome do arquivo e o mes (AAAA-MM): descarta meses fora do intervalo sem abrir.
+    if start_at:
+        first = _month_key(start_at)
+        paths = [path for path in paths if path.name[:7] >= first]
+    if end_at:
+        last = _month_key(end_at)
+        paths = [path for path in paths if path.name[:7] <= last]
+
+    terms = {
+        ('username', 'action', 'location', 'details', 'path'): _fold(query),
+        ('username',): _fold(usuario),
+        ('location', 'path'): _fold(onde),
+        ('details', 'action', 'location'): _fold(assunto),
+    }
+    terms = {columns: term for columns, term in terms.items() if term}
+    method = str(metodo or '').upper()
+
+    results = []
+    for path in paths:
+        month_rows = []
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as handle:
+                for line in handle:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        continue
+                    if acao and row.get('action') != acao:
+                        continue
+                    if method and row.get('method') != method:
+                        continue
+                    created_at = parse_datetime(row.get('created_at') or '')
+                    if created_at is None:
+                        continue
+                    if start_at and created_at < start_at:
+                        continue
+                    if end_at and created_at >= end_at:
+                        continue
+                    if before is not None and (created_at, row.get('id') or 0) >= before:
+                        continue
+                    if any(
+                        not any(term in _fold(row.get(column)) for column in columns)
+                        for columns, term in terms.items()
+                    ):
+                        continue
+                    row['created_at'] = created_at
+                    row['archived'] = True
+                    month_rows.append(row)
+        except (OSError, EOFError):
+            logger.exception('Falha ao ler arquivo de auditoria %s.', path)
+            continue
+        month_rows.sort(key=lambda item: (item['created_at'], item.get('id') or 0), reverse=True)
+        results.extend(month_rows)
+        if len(results) >= limit:
+            break
+    return results[:limit]
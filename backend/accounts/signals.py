@@ -1,7 +1,29 @@
 ﻿from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 
 from .audit import record_audit
+from .evento_busca import atualizar_busca
+from .evento_resumo import schedule_evento_resumo, schedule_resumos_do_responsavel
+from .models import (
+    AccessGroup,
+    Aventureiro,
+    Diretoria,
+    Evento,
+    EventoAtendente,
+    EventoCusto,
+    EventoInscricao,
+    LojaPedido,
+    Responsavel,
+    UserAccess,
+    WhatsAppGatewayConfig,
+    WhatsAppPreference,
+    WhatsAppTemplate,
+)
+from .permission_cache import invalidate_permission_cache
+from .thumbnails import refresh_aventureiro_thumbnails
+from .whatsapp import refresh_resolved_phone
+from .whatsapp_cache import invalidate_whatsapp_cache
 
 
 @receiver(user_logged_in)
@@ -26,3 +48,127 @@ def on_user_logged_out(sender, request, user, **kwargs):
         details='Sessao encerrada.',
         location='Logout',
     )
+
+
+@receiver(post_save, sender=UserAccess)
+@receiver(post_delete, sender=UserAccess)
+@receiver(post_save, sender=AccessGroup)
+@receiver(post_delete, sender=AccessGroup)
+@receiver(post_save, sender=EventoAtendente)
+@receiver(post_delete, sender=EventoAtendente)
+@receiver(post_save, sender=Evento)
+@receiver(post_delete, sender=Evento)
+def on_permission_source_changed(sender, **kwargs):
+    invalidate_permission_cache()
+
+
+@receiver(m2m_changed, sender=AccessGroup.users.through)
+@receiver(m2m_changed, sender=EventoAtendente.eventos.through)
+def on_permission_relation_changed(sender, action, **kwargs):
+    if action in {'post_add', 'post_remove', 'post_clear'}:
+        invalidate_permission_cache()
+
+
+@receiver(post_save, sender=WhatsAppTemplate)
+@receiver(post_delete, sender=WhatsAppTemplate)
+@receiver(post_save, sender=WhatsAppGatewayConfig)
+@receiver(post_delete, sender=WhatsAppGatewayConfig)
+@receiver(post_save, sender=WhatsAppPreference)
+@receiver(post_delete, sender=WhatsAppPreference)
+def on_whatsapp_config_changed(sender, **kwargs):
+    invalidate_whatsapp_cache()
+
+
+@receiver(post_save, sender=WhatsAppPreference)
+def on_whatsapp_preference_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    refresh_resolved_phone(instance.user, instance)
+
+
+@receiver(post_save, sender=Diretoria)
+@receiver(post_save, sender=Responsavel)
+def on_contact_phone_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    refresh_resolved_phone(instance.user)
+
+
+@receiver(post_save, sender=Aventureiro)
+def on_aventureiro_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    refresh_aventureiro_thumbnails(instance)
+
+
+# Campos do pedido que nao mudam os totais do evento (notificacao, entrega, QR do Pix).
+PEDIDO_CAMPOS_SEM_RESUMO = {
+    'whatsapp_notified_at',
+    'entregue',
+    'mp_qr_code',
+    'mp_qr_code_base64',
+    'mp_status_detail',
+    'updated_at',
+}
+
+
+@receiver(post_save, sender=LojaPedido)
+@receiver(post_delete, sender=LojaPedido)
+def on_evento_pedido_changed(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or not instance.evento_id:
+        return
+    if update_fields and set(update_fields) <= PEDIDO_CAMPOS_SEM_RESUMO:
+        return
+    schedule_evento_resumo(instance.evento_id)
+
+
+@receiver(post_save, sender=EventoInscricao)
+@receiver(post_delete, sender=EventoInscricao)
+@receiver(post_save, sender=EventoCusto)
+@receiver(post_delete, sender=EventoCusto)
+def on_evento_totais_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    schedule_evento_resumo(instance.evento_id)
+
+
+# Campos do aventureiro que mudam a contagem de participantes dos eventos.
+AVENTUREIRO_CAMPOS_RESUMO = {'nome', 'responsavel', 'responsavel_id'}
+
+
+@receiver(post_save, sender=Aventureiro)
+@receiver(post_delete, sender=Aventureiro)
+def on_aventureiro_resumo_changed(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields and not set(update_fields) & AVENTUREIRO_CAMPOS_RESUMO):
+        return
+    schedule_resumos_do_responsavel(instance.responsavel_id)
+
+
+@receiver(post_save, sender=Evento)
+def on_evento_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    # O modo de valor da inscricao muda a contagem de participantes.
+    if raw or (update_fields and 'inscricao_valor_modo' not in update_fields):
+        return
+    schedule_evento_resumo(instance.pk)
+
+
+# Campos da inscricao que entram no documento de busca da consulta do evento.
+INSCRICAO_CAMPOS_BUSCA = {'dados', 'responsavel', 'responsavel_id', 'codigo_inscricao', 'cancelada'}
+
+
+@receiver(post_save, sender=EventoInscricao)
+def on_evento_inscricao_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields and not set(update_fields) & INSCRICAO_CAMPOS_BUSCA):
+        return
+    atualizar_busca([instance])
+
+
+@receiver(post_save, sender=Responsavel)
+def on_responsavel_busca_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    atualizar_busca(
+        EventoInscricao.objects
+        .filter(responsavel=instance)
+        .select_related('evento', 'responsavel')
+    )
@@ -0,0 +1,709 @@
+import importlib
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, OperationalError, connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from PIL import Image
+
+from . import mp_reconcile, whatsapp
+from .audit import AUDIT_SPILL_CLAIM_TIMEOUT, AuditBuffer
+from .cobranca_campanhas import create_campanha
+from .evento_resumo import refresh_evento_resumos
+from .inscricao_faixas import compile_faixas_idade
+from .mp_status import claim_payment_refresh, mark_payment_refreshed
+from .presenca import PRESENCA_VERSION_KEY, mark_presence, presence_event_stream, published_version
+from .models import (
+    LISTING_HEAVY_FIELDS,
+    AuditLog,
+    Aventureiro,
+    Evento,
+    EventoInscricao,
+    EventoResumo,
+    LojaPedido,
+    LojaProduto,
+    LojaProdutoVariacao,
+    MensalidadeAventureiro,
+    MercadoPagoConsultaTrava,
+    MercadoPagoSincronizacaoTrava,
+    PagamentoMensalidade,
+    Responsavel,
+    WhatsAppQueue,
+)
+from .views import (
+    EventoPublicoView,
+    EventoRelatorioPdfView,
+    EventosView,
+    FinanceiroView,
+    LojaRelatorioPedidosPagosPdfView,
+    LojaView,
+    PresencaView,
+)
+
+User = get_user_model()
+
+PIX_CODE_EXEMPLO = '00020126360014BR.GOV.BCB.PIX0114+55119999999995204000053039865406010.005802BR5913Clube Pinhal6009SAO PAULO62070503***6304ABCD'
+
+
+def _criar_responsavel(username='responsavel'):
+    user = User.objects.create_user(username=username, password='senha-de-teste')
+    return Responsavel.objects.create(user=user, responsavel_nome='Responsavel Teste')
+
+
+@override_settings(PIX_QR_CACHE_DIR=tempfile.mkdtemp(prefix='pix_qr_tests_'))
+class PixQrPayloadTests(TestCase):
+    def test_payload_pix_da_loja_aponta_para_a_imagem_do_qr(self):
+        pedido = LojaPedido.objects.create(
+            responsavel=_criar_responsavel(),
+            valor_total=Decimal('10.00'),
+            mp_payment_id='123456',
+            mp_qr_code=PIX_CODE_EXEMPLO,
+        )
+
+        payload = LojaView()._pix_modal_context_loja(pedido)
+
+        self.assertEqual(payload['pix_code'], PIX_CODE_EXEMPLO)
+        self.assertEqual(resolve(payload['qr_image_url']).view_name, 'accounts:pix_qr_image_api')
+        response = self.client.get(payload['qr_image_url'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertTrue(response.content.startswith(b'\x89PNG'))
+
+
+def _audit_entry(action, user_id=None):
+    # Mesmo formato que `record_audit` coloca na fila.
+    return {
+        'user_id': user_id,
+        'username': 'teste',
+        'profile': '',
+        'location': '/auditoria/',
+        'action': action,
+        'details': '',
+        'method': 'POST',
+        'path': '/auditoria/',
+        'ip_address': '127.0.0.1',
+        'user_agent': '',
+        'created_at': '2026-10-17T12:00:00+00:00',
+    }
+
+
+class AuditBufferSpillTests(TestCase):
+    def setUp(self):
+        self.spill_dir = Path(tempfile.mkdtemp(prefix='audit_spill_tests_'))
+        self.buffer = AuditBuffer(batch_size=2, spill_dir=self.spill_dir)
+
+    def _write_spill(self, name, *actions):
+        path = self.spill_dir / name
+        with open(path, 'a', encoding='utf-8') as handle:
+            for action in actions:
+                handle.write(json.dumps(_audit_entry(action)) + '\n')
+        return path
+
+    def _spilled_actions(self):
+        actions = []
+        for path in self.spill_dir.iterdir():
+            with open(path, encoding='utf-8') as handle:
+                actions += [json.loads(line)['action'] for line in handle if line.strip()]
+        return sorted(actions)
+
+    def test_falha_na_reimportacao_nao_sobrescreve_espera_nova(self):
+        self._write_spill('audit_spill_999.jsonl', 'antigo')
+
+        def _banco_ocupado(entries):
+            # O dono do arquivo grava mais registros enquanto a importacao roda.
+            self._write_spill('audit_spill_999.jsonl', 'novo')
+            return False
+
+        with mock.patch.object(self.buffer, '_write', side_effect=_banco_ocupado):
+            self.buffer._reload_spill()
+
+        self.assertEqual(self._spilled_actions(), ['antigo', 'novo'])
+        self.assertEqual(AuditLog.objects.count(), 0)
+
+    def test_importacao_abandonada_e_retomada_depois_do_prazo(self):
+        path = self._write_spill('audit_spill_5.5.1.importando', 'abandonado')
+        antigo = time.time() - AUDIT_SPILL_CLAIM_TIMEOUT - 60
+        os.utime(path, (antigo, antigo))
+        recente = self._write_spill('audit_spill_6.6.1.importando', 'em andamento')
+
+        self.buffer.flush()
+
+        self.assertEqual(list(AuditLog.objects.values_list('action', flat=True)), ['abandonado'])
+        self.assertTrue(recente.exists())
+
+    def test_lote_com_falha_nao_grava_lotes_anteriores(self):
+        entries = [_audit_entry(f'acao {index}') for index in range(5)]
+        original_bulk_create = AuditLog.objects.bulk_create
+        calls = []
+
+        def _falha_no_terceiro(rows, *args, **kwargs):
+            calls.append(len(rows))
+            if len(calls) == 3:
+                raise OperationalError('database is locked')
+            return original_bulk_create(rows, *args, **kwargs)
+
+        with mock.patch.object(AuditLog.objects, 'bulk_create', side_effect=_falha_no_terceiro):
+            self.assertFalse(self.buffer._write(entries))
+
+        self.assertEqual(AuditLog.objects.count(), 0)
+
+    def test_usuario_removido_nao_derruba_o_lote(self):
+        user = User.objects.create_user(username='removido', password='senha-de-teste')
+        user_id = user.pk
+        user.delete()
+
+        self.assertTrue(self.buffer._write([_audit_entry('valida'), _audit_entry('sem usuario', user_id=user_id)]))
+
+        self.assertEqual(
+            sorted(AuditLog.objects.values_list('action', 'user_id')),
+            [('sem usuario', None), ('valida', None)],
+        )
+        self.assertEqual(list(self.spill_dir.iterdir()), [])
+
+    def test_erro_de_dados_descarta_so_o_registro_rejeitado(self):
+        entries = [_audit_entry('valida'), _audit_entry(None)]
+        original_bulk_create = AuditLog.objects.bulk_create
+
+        def _rejeita_sem_acao(rows, *args, **kwargs):
+            if any(not row.action for row in rows):
+                raise IntegrityError('NOT NULL constraint failed: accounts_auditlog.action')
+            return original_bulk_create(rows, *args, **kwargs)
+
+        with mock.patch.object(AuditLog.objects, 'bulk_create', side_effect=_rejeita_sem_acao):
+            self.assertTrue(self.buffer._write(entries))
+
+        self.assertEqual(list(AuditLog.objects.values_list('action', flat=True)), ['valida'])
+        self.assertEqual(self.buffer.dropped, 1)
+        self.assertEqual(list(self.spill_dir.iterdir()), [])
+
+    def test_arquivo_que_volta_a_falhar_nao_trava_os_seguintes(self):
+        self._write_spill('audit_spill_1.jsonl', 'primeiro')
+        self._write_spill('audit_spill_2.jsonl', 'segundo')
+        original_write = self.buffer._write
+        calls = []
+
+        def _primeiro_falha(entries):
+            calls.append(entries[0]['action'])
+            if len(calls) == 1:
+                return False
+            return original_write(entries)
+
+        with mock.patch.object(self.buffer, '_write', side_effect=_primeiro_falha):
+            self.buffer._reload_spill()
+
+        self.assertEqual(calls, ['primeiro', 'segundo'])
+        self.assertEqual(list(AuditLog.objects.values_list('action', flat=True)), ['segundo'])
+        self.assertEqual(self._spilled_actions(), ['primeiro'])
+
+
+# Valores esperados calculados com o algoritmo linha a linha anterior a tabela
+# compilada (faixas na ordem da configuracao, primeira que cobre a idade vence).
+FAIXAS_CONFIG = {
+    'repeat_field': 'Criancas',
+    'age_field': 'Idade',
+    'ranges': [
+        {'min': 0, 'max': 5, 'value': '0'},
+        {'min': 4, 'max': 10, 'value': '50'},
+        {'min': 12, 'max': 8, 'value': '999'},
+        {'min': 11, 'max': 17, 'value': '80.5'},
+        {'min': 'x', 'max': 20, 'value': '1'},
+    ],
+    'diretoria_value': '30',
+}
+CRIANCAS_VALIDAS = [
+    {'Nome': 'Ana', 'Idade': '4 anos'},
+    {'Nome': 'Bia', 'Idade': '7'},
+    {'Nome': 'Caio', 'Idade': '9', 'Integrante diretoria': 'Sim'},
+    {'Nome': 'Davi', 'Idade': '15'},
+    {'Nome': 'Eva', 'Idade': '12'},
+    {},
+]
+
+
+def _evento_faixas(config=None):
+    return Evento(
+        name='Acampamento',
+        inscricao_valor_modo=Evento.INSCRICAO_VALOR_MODO_FAIXA_IDADE_REPETIDOR,
+        inscricao_valor_config=FAIXAS_CONFIG if config is None else config,
+    )
+
+
+class FaixasIdadeGoldenTests(TestCase):
+    def setUp(self):
+        self.helper = EventoPublicoView()
+
+    def _detalhes(self, rows, config=None):
+        return self.helper._event_age_repeat_fee_details(_evento_faixas(config), {'Criancas': rows})
+
+    def test_faixas_sobrepostas_invertidas_e_diretoria(self):
+        detalhes = self._detalhes(CRIANCAS_VALIDAS)
+
+        self.assertEqual(detalhes['error'], '')
+        self.assertEqual(detalhes['units'], 5)
+        self.assertEqual(detalhes['total_original'], Decimal('241.00'))
+        self.assertEqual(detalhes['total_final'], Decimal('241.00'))
+        self.assertEqual(
+            [(item['nome'], item['idade'], item['is_diretoria'], item['valor_original']) for item in detalhes['breakdown']],
+            [
+                ('Ana', 4, False, Decimal('0.00')),
+                ('Bia', 7, False, Decimal('50.00')),
+                ('Caio', 9, True, Decimal('30.00')),
+                ('Davi', 15, False, Decimal('80.50')),
+                ('Eva', 12, False, Decimal('80.50')),
+            ],
+        )
+
+    def test_calcular_inscricao_valor_usa_o_total_das_faixas(self):
+        mode, units, total, error = self.helper._calcular_inscricao_valor(
+            _evento_faixas(), [], {'Criancas': CRIANCAS_VALIDAS},
+        )
+
+        self.assertEqual((mode, units, total, error), (Evento.INSCRICAO_VALOR_MODO_FAIXA_IDADE_REPETIDOR, 5, Decimal('241.00'), ''))
+
+    def test_diretoria_sem_valor_proprio_paga_a_faixa(self):
+        config = dict(FAIXAS_CONFIG, diretoria_value='')
+        detalhes = self._detalhes([{'Nome': 'Caio', 'Idade': '9', 'Integrante diretoria': 'sim'}], config)
+
+        self.assertEqual(detalhes['breakdown'][0]['valor_original'], Decimal('50.00'))
+        self.assertTrue(detalhes['breakdown'][0]['is_diretoria'])
+
+    def test_idade_ausente_ou_nao_numerica_recusa_a_inscricao(self):
+        esperado = 'Preencha o subcampo "Idade" com idade numerica em todos os itens de "Criancas".'
+        for idade in ['', 'dez']:
+            with self.subTest(idade=idade):
+                detalhes = self._detalhes([{'Nome': 'Ana', 'Idade': '4'}, {'Nome': 'Fabi', 'Idade': idade}])
+                self.assertEqual(detalhes['error'], esperado)
+                self.assertEqual(detalhes['units'], 0)
+                self.assertEqual(detalhes['total_final'], Decimal('0.00'))
+
+    def test_idade_fora_de_todas_as_faixas_recusa_a_inscricao(self):
+        for idade in ['18', '30']:
+            with self.subTest(idade=idade):
+                detalhes = self._detalhes([{'Nome': 'Hugo', 'Idade': idade}])
+                self.assertEqual(detalhes['error'], f'Idade {idade} sem faixa de cobranca configurada no evento.')
+
+    def test_configuracao_incompleta(self):
+        detalhes = self._detalhes(CRIANCAS_VALIDAS, dict(FAIXAS_CONFIG, ranges=[]))
+
+        self.assertEqual(detalhes['error'], 'Configuracao de faixa de idade incompleta no evento.')
+
+    def test_resumo_por_faixa(self):
+        inscricoes = [
+            EventoInscricao(dados={'Criancas': CRIANCAS_VALIDAS}),
+            EventoInscricao(dados={'Criancas': [
+                {'Nome': 'Gui', 'Idade': 'dez'},
+                {'Nome': 'Hugo', 'Idade': '30'},
+                {'Nome': 'Ivo', 'Idade': '5'},
+            ]}),
+            EventoInscricao(dados={'Outro': []}),
+        ]
+
+        resumo = self.helper._inscricao_faixas_resumo(_evento_faixas(), inscricoes)
+
+        self.assertEqual(
+            [
+                (item['label'], item['quantidade'], item['quantidade_diretoria'], item['is_diretoria_summary'], item['valor_total_raw'])
+                for item in resumo
+            ],
+            [
+                ('0-5', 2, 0, False, '0.00'),
+                ('4-10', 1, 0, False, '50.00'),
+                ('11-17', 2, 0, False, '161.00'),
+                ('Diretoria', 1, 1, True, '30.00'),
+            ],
+        )
+
+    def test_resumo_diretoria_sem_valor_proprio_soma_o_valor_da_faixa(self):
+        config = dict(FAIXAS_CONFIG, diretoria_value=None)
+        inscricoes = [EventoInscricao(dados={'Criancas': [{'Nome': 'Caio', 'Idade': '9', 'Integrante diretoria': 'Sim'}]})]
+
+        resumo = self.helper._inscricao_faixas_resumo(_evento_faixas(config), inscricoes)
+
+        self.assertEqual(resumo[-1]['label'], 'Diretoria')
+        self.assertEqual(resumo[-1]['valor_total_raw'], '50.00')
+        self.assertEqual(resumo[1]['quantidade'], 0)
+
+    def test_relatorio_casa_faixas_em_ordem_crescente(self):
+        # O PDF ordenava as faixas por (min, max) antes de casar a idade.
+        config = dict(FAIXAS_CONFIG, ranges=[{'min': 4, 'max': 10, 'value': '50'}, {'min': 0, 'max': 5, 'value': '0'}])
+        tabela = compile_faixas_idade(config)
+
+        self.assertEqual(tabela.faixas[tabela.faixa_da_idade(4)]['value'], Decimal('50.00'))
+        ordenada = tabela.ordenada()
+        self.assertEqual(ordenada.faixas[ordenada.faixa_da_idade(4)]['value'], Decimal('0.00'))
+
+
+class ListagemColunasPesadasTests(TestCase):
+    """Chama as views e contextos reais e confere o SQL que eles geram."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.evento = Evento.objects.create(name='Evento listagem', fields_data=[{'name': 'Campo', 'type': 'texto'}])
+        responsavel = _criar_responsavel()
+        cls.user = responsavel.user
+        cls.inscricao = EventoInscricao.objects.create(
+            evento=cls.evento,
+            responsavel=responsavel,
+            confirmada=True,
+            dados={'Campo': 'x' * 500},
+        )
+        for evento in (cls.evento, None):
+            LojaPedido.objects.create(
+                responsavel=responsavel,
+                evento=evento,
+                valor_total=Decimal('10.00'),
+                status=LojaPedido.STATUS_PAGO,
+                paid_at=timezone.now(),
+                mp_qr_code_base64='A' * 500,
+            )
+        PagamentoMensalidade.objects.create(
+            responsavel=responsavel,
+            valor_total=Decimal('10.00'),
+            status=PagamentoMensalidade.STATUS_PAGO,
+            mp_qr_code_base64='A' * 500,
+        )
+
+    def _request(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        return request
+
+    def _assert_sem_colunas_pesadas(self, queries, *model_names):
+        sql = ' '.join(query['sql'] for query in queries)
+        for model_name in model_names:
+            for field_name in LISTING_HEAVY_FIELDS[model_name]:
+                self.assertNotIn(field_name, sql, f'{model_name}.{field_name} na consulta da listagem')
+
+    def test_lista_de_eventos_nao_carrega_o_formulario(self):
+        with CaptureQueriesContext(connection) as ctx:
+            eventos = PresencaView()._ordered_events()
+
+        self.assertEqual(len(eventos), 1)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self._assert_sem_colunas_pesadas(ctx.captured_queries, 'Evento')
+
+    def test_relatorios_do_financeiro_nao_carregam_qr_nem_formulario(self):
+        with CaptureQueriesContext(connection) as ctx:
+            FinanceiroView()._relatorios_context()
+
+        self._assert_sem_colunas_pesadas(ctx.captured_queries, 'PagamentoMensalidade', 'LojaPedido', 'Evento')
+        # O extrato de inscricoes continua lendo `dados` (nome do responsavel).
+        self.assertTrue(any(
+            'accounts_eventoinscricao' in query['sql'] and 'dados' in query['sql']
+            for query in ctx.captured_queries
+        ))
+
+    def test_cards_de_eventos_nao_carregam_qr_dos_pedidos(self):
+        with mock.patch('accounts.views._sidebar_context', return_value={}):
+            with CaptureQueriesContext(connection) as ctx:
+                EventosView()._context(self._request())
+
+        self.assertTrue(any('accounts_lojapedido' in query['sql'] for query in ctx.captured_queries))
+        self._assert_sem_colunas_pesadas(ctx.captured_queries, 'LojaPedido')
+
+    def test_pedidos_da_loja_nao_carregam_qr(self):
+        with CaptureQueriesContext(connection) as ctx:
+            LojaView()._context()
+
+        self.assertTrue(any('accounts_lojapedido' in query['sql'] for query in ctx.captured_queries))
+        self._assert_sem_colunas_pesadas(ctx.captured_queries, 'LojaPedido')
+
+    def test_relatorios_em_pdf_nao_carregam_qr_dos_pedidos(self):
+        with mock.patch.object(LojaRelatorioPedidosPagosPdfView, '_guard', return_value=None):
+            with CaptureQueriesContext(connection) as ctx:
+                LojaRelatorioPedidosPagosPdfView().get(self._request())
+        self._assert_sem_colunas_pesadas(ctx.captured_queries, 'LojaPedido')
+
+        with mock.patch.object(EventoRelatorioPdfView, '_guard', return_value=None):
+            with CaptureQueriesContext(connection) as ctx:
+                EventoRelatorioPdfView().get(self._request(), self.evento.pk)
+        self._assert_sem_colunas_pesadas(ctx.captured_queries, 'LojaPedido')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(prefix='media_tests_'))
+class AventureiroMiniaturasTests(TestCase):
+    def _png(self):
+        output = BytesIO()
+        Image.new('RGB', (400, 300), (200, 30, 30)).save(output, format='PNG')
+        return output.getvalue()
+
+    def test_falha_ao_gerar_limpa_os_campos_e_apaga_as_antigas(self):
+        aventureiro = Aventureiro.objects.create(responsavel=_criar_responsavel(), nome='Aventureiro Teste')
+        aventureiro.foto.save('foto.png', ContentFile(self._png()), save=True)
+        aventureiro.refresh_from_db()
+        antigas = [aventureiro.foto_miniatura.name, aventureiro.foto_media.name]
+        storage = aventureiro.foto_miniatura.storage
+        self.assertTrue(all(name and storage.exists(name) for name in antigas))
+
+        aventureiro.foto.save('quebrada.png', ContentFile(b'nao e uma imagem'), save=True)
+        aventureiro.refresh_from_db()
+
+        self.assertFalse(aventureiro.foto_miniatura.name)
+        self.assertFalse(aventureiro.foto_media.name)
+        self.assertFalse(any(storage.exists(name) for name in antigas))
+
+    def test_troca_de_foto_grava_as_novas_antes_de_apagar_as_antigas(self):
+        aventureiro = Aventureiro.objects.create(responsavel=_criar_responsavel(), nome='Aventureiro Teste')
+        aventureiro.foto.save('foto.png', ContentFile(self._png()), save=True)
+        aventureiro.refresh_from_db()
+        antiga = aventureiro.foto_miniatura.name
+
+        aventureiro.foto.save('outra.png', ContentFile(self._png()), save=True)
+        aventureiro.refresh_from_db()
+
+        storage = aventureiro.foto_miniatura.storage
+        self.assertNotEqual(aventureiro.foto_miniatura.name, antiga)
+        self.assertTrue(storage.exists(aventureiro.foto_miniatura.name))
+        self.assertTrue(storage.exists(aventureiro.foto_media.name))
+        self.assertFalse(storage.exists(antiga))
+
+
+class MercadoPagoConsultaTravaTests(TestCase):
+    payment_id = 'teste-trava-123'
+
+    def setUp(self):
+        cache.delete(f'accounts:mp-status:{self.payment_id}')
+        self.addCleanup(cache.delete, f'accounts:mp-status:{self.payment_id}')
+
+    def test_um_unico_dono_por_pagamento(self):
+        self.assertTrue(claim_payment_refresh(self.payment_id))
+        self.assertFalse(claim_payment_refresh(self.payment_id))
+        self.assertEqual(MercadoPagoConsultaTrava.objects.filter(payment_id=self.payment_id).count(), 1)
+
+    def test_trava_vencida_e_assumida_por_um_so(self):
+        MercadoPagoConsultaTrava.objects.create(
+            payment_id=self.payment_id,
+            expires_at=timezone.now() - timedelta(seconds=1),
+        )
+
+        self.assertTrue(claim_payment_refresh(self.payment_id))
+        self.assertFalse(claim_payment_refresh(self.payment_id))
+
+    def test_marcar_atualizado_libera_a_trava_e_segura_pelo_ttl(self):
+        self.assertTrue(claim_payment_refresh(self.payment_id))
+
+        mark_payment_refreshed(self.payment_id, ttl=60)
+
+        self.assertFalse(MercadoPagoConsultaTrava.objects.filter(payment_id=self.payment_id).exists())
+        self.assertFalse(claim_payment_refresh(self.payment_id))
+        cache.delete(f'accounts:mp-status:{self.payment_id}')
+        self.assertTrue(claim_payment_refresh(self.payment_id))
+
+
+class PresencaStreamTests(TestCase):
+    def setUp(self):
+        self.evento = Evento.objects.create(name='Evento presenca', fields_data=[{'name': 'Campo', 'type': 'texto'}])
+        self.chave = PRESENCA_VERSION_KEY.format(evento_id=self.evento.id)
+        cache.delete(self.chave)
+        self.addCleanup(cache.delete, self.chave)
+
+    def test_stream_desligado_manda_o_cliente_para_o_polling(self):
+        with override_settings(PRESENCA_STREAM_ENABLED=False):
+            self.assertEqual(list(presence_event_stream(self.evento.id, 0)), ['event: fallback\ndata: {}\n\n'])
+
+    def test_marcacao_publica_a_versao_no_cache_ao_fazer_commit(self):
+        responsavel = _criar_responsavel()
+        aventureiro = Aventureiro.objects.create(responsavel=responsavel, nome='Aventureiro Teste')
+
+        # Um stream aberto antes da primeira marcacao ja guardou a versao 0.
+        self.assertEqual(published_version(self.evento.id), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            mark_presence(self.evento, aventureiro, True, responsavel.user)
+        self.assertEqual(published_version(self.evento.id), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            mark_presence(self.evento, aventureiro, False, responsavel.user)
+        self.assertEqual(published_version(self.evento.id), 2)
+
+    @override_settings(PRESENCA_STREAM_ENABLED=True, PRESENCA_STREAM_SECONDS=1.5, PRESENCA_STREAM_MAX_WAIT=5)
+    def test_stream_parado_nao_consulta_o_banco(self):
+        self.assertEqual(published_version(self.evento.id), 0)
+
+        with CaptureQueriesContext(connection) as queries:
+            mensagens = list(presence_event_stream(self.evento.id, 0))
+
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(mensagens, ['retry: 1000\n\n'])
+
+
+class EventoBuscaMigrationTests(TestCase):
+    def _editor_sem_trigram(self):
+        conexao = mock.MagicMock(vendor='sqlite', alias='default')
+        conexao.cursor.return_value.__enter__.return_value.execute.side_effect = OperationalError('no such tokenizer: trigram')
+        return mock.Mock(connection=conexao)
+
+    def test_sem_indice_a_migration_falha_e_diz_o_que_falta(self):
+        migracao = importlib.import_module('accounts.migrations.0108_eventoinscricaobusca')
+
+        with override_settings(EVENTO_BUSCA_PERMITIR_SEM_INDICE=False):
+            with self.assertRaisesMessage(ImproperlyConfigured, 'FTS5 com tokenizador trigram'):
+                migracao.create_busca_index(None, self._editor_sem_trigram())
+
+    def test_sem_indice_com_permissao_so_avisa(self):
+        migracao = importlib.import_module('accounts.migrations.0108_eventoinscricaobusca')
+
+        with override_settings(EVENTO_BUSCA_PERMITIR_SEM_INDICE=True):
+            with self.assertLogs(migracao.logger, 'WARNING') as logs:
+                migracao.create_busca_index(None, self._editor_sem_trigram())
+
+        self.assertIn('FTS5 com tokenizador trigram', logs.output[0])
+
+
+class CobrancaCampanhaEnvioTests(TestCase):
+    def setUp(self):
+        self.responsavel = _criar_responsavel()
+        aventureiro = Aventureiro.objects.create(responsavel=self.responsavel, nome='Aventureiro Teste')
+        self.mensalidades = [
+            MensalidadeAventureiro.objects.create(aventureiro=aventureiro, ano_referencia=2026, mes_referencia=mes)
+            for mes in (8, 9)
+        ]
+        campanha = create_campanha(
+            [{
+                'user': self.responsavel.user,
+                'phone_number': '5511999999999',
+                'message_text': 'Cobranca agendada com agosto e setembro',
+                'responsavel_nome': 'Responsavel Teste',
+                'mensalidade_ids': [item.pk for item in self.mensalidades],
+                'total_em_aberto': Decimal('60.00'),
+            }],
+            pause_seconds=60,
+        )
+        self.item = WhatsAppQueue.objects.get(cobranca_envio__campanha=campanha)
+
+    def _pagar(self, *mensalidades):
+        MensalidadeAventureiro.objects.filter(pk__in=[item.pk for item in mensalidades]).update(
+            status=MensalidadeAventureiro.STATUS_PAGA,
+        )
+
+    def test_tudo_quitado_antes_do_envio_cancela_a_mensagem(self):
+        self._pagar(*self.mensalidades)
+
+        with mock.patch.object(whatsapp, 'send_wapi_text') as send:
+            whatsapp.deliver_queue_item(self.item)
+
+        send.assert_not_called()
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.status, WhatsAppQueue.STATUS_CANCELLED)
+
+    def test_pagamento_parcial_refaz_a_mensagem_com_o_que_ficou_pendente(self):
+        self._pagar(self.mensalidades[0])
+
+        with mock.patch.object(whatsapp, 'send_wapi_text', return_value=(True, 'msg-1', '')) as send:
+            whatsapp.deliver_queue_item(self.item)
+
+        texto = send.call_args.args[1]
+        self.assertIn('/2026', texto)
+        self.assertEqual(texto.count('- Aventureiro Teste'), 1)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.status, WhatsAppQueue.STATUS_SENT)
+        self.assertEqual(self.item.message_text, texto)
+
+
+@mock.patch.object(mp_reconcile.threading, 'Thread')
+class SincronizacaoManualTravaTests(TestCase):
+    def test_mesmo_tipo_devolve_o_job_em_andamento(self, _thread):
+        job_id, kind, started = mp_reconcile.start_sync_job('loja', lambda progress: {})
+        outro_id, outro_kind, outro_started = mp_reconcile.start_sync_job('loja', lambda progress: {})
+
+        self.assertTrue(started)
+        self.assertEqual((outro_id, outro_kind, outro_started), (job_id, 'loja', False))
+        self.assertEqual(mp_reconcile.get_sync_job(job_id)['kind'], 'loja')
+
+    def test_tipos_diferentes_tem_travas_separadas(self, _thread):
+        loja_id, _kind, _started = mp_reconcile.start_sync_job('loja', lambda progress: {})
+        geral_id, kind, started = mp_reconcile.start_sync_job('geral', lambda progress: {})
+
+        self.assertTrue(started)
+        self.assertEqual(kind, 'geral')
+        self.assertNotEqual(geral_id, loja_id)
+        self.assertEqual(MercadoPagoSincronizacaoTrava.objects.count(), 2)
+
+    def test_trava_sem_sinal_de_vida_e_assumida(self, _thread):
+        MercadoPagoSincronizacaoTrava.objects.create(
+            kind='geral',
+            job_id='morto',
+            expires_at=timezone.now() - timedelta(seconds=1),
+        )
+
+        job_id, _kind, started = mp_reconcile.start_sync_job('geral', lambda progress: {})
+
+        self.assertTrue(started)
+        self.assertEqual(MercadoPagoSincronizacaoTrava.objects.get(kind='geral').job_id, job_id)
+
+
+class EventosCardsTests(TestCase):
+    def _criar_evento(self, responsavel, indice):
+        evento = Evento.objects.create(name=f'Evento {indice}', fields_data=[{'name': 'Campo', 'type': 'texto'}])
+        produto = LojaProduto.objects.create(evento=evento, titulo=f'Camiseta {indice}')
+        for nome in ('P', 'M'):
+            LojaProdutoVariacao.objects.create(produto=produto, nome=nome, valor=Decimal('30.00'))
+        for _ in range(3):
+            EventoInscricao.objects.create(evento=evento, responsavel=responsavel, confirmada=True, dados={'Campo': 'x'})
+            LojaPedido.objects.create(responsavel=responsavel, evento=evento, valor_total=Decimal('10.00'))
+        return evento
+
+    def _consultas_do_contexto(self):
+        refresh_evento_resumos(Evento.objects.values_list('id', flat=True))
+        request = RequestFactory().get('/eventos/')
+        request.user = self.responsavel.user
+        with mock.patch('accounts.views._sidebar_context', return_value={}):
+            with CaptureQueriesContext(connection) as ctx:
+                context = EventosView()._context(request)
+        return len(ctx.captured_queries), context
+
+    def setUp(self):
+        self.responsavel = _criar_responsavel()
+
+    def test_previas_nao_crescem_com_o_numero_de_eventos(self):
+        self._criar_evento(self.responsavel, 1)
+        com_um, _context = self._consultas_do_contexto()
+        for indice in range(2, 6):
+            self._criar_evento(self.responsavel, indice)
+
+        com_cinco, context = self._consultas_do_contexto()
+
+        self.assertEqual(com_cinco, com_um)
+        for row in context['eventos']:
+            self.assertEqual(len(row['inscricoes_preview']), 3)
+            self.assertEqual(len(row['pedidos_preview']), 3)
+            self.assertEqual([v.nome for v in row['produtos'][0]['variacoes']], ['P', 'M'])
+
+    def test_previa_mostra_so_as_mais_recentes_de_cada_evento(self):
+        evento = self._criar_evento(self.responsavel, 1)
+        for _ in range(EventosView.preview_limit):
+            EventoInscricao.objects.create(evento=evento, responsavel=self.responsavel, confirmada=True, dados={})
+        mais_recentes = list(
+            EventoInscricao.objects.filter(evento=evento).order_by('-created_at', '-id')
+            .values_list('id', flat=True)[:EventosView.preview_limit]
+        )
+
+        _consultas, context = self._consultas_do_contexto()
+
+        self.assertEqual([item.id for item in context['eventos'][0]['inscricoes_preview']], mais_recentes)
+
+    def test_aventureiro_novo_atualiza_participantes(self):
+        evento = Evento.objects.create(name='Evento participantes', fields_data=[{'name': 'Campo', 'type': 'texto'}])
+        EventoInscricao.objects.create(evento=evento, responsavel=self.responsavel, confirmada=True, dados={})
+        Aventureiro.objects.create(responsavel=self.responsavel, nome='Primeiro')
+        refresh_evento_resumos([evento.id])
+        self.assertEqual(EventoResumo.objects.get(evento=evento).participantes, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Aventureiro.objects.create(responsavel=self.responsavel, nome='Segundo')
+
+        self.assertEqual(EventoResumo.objects.get(evento=evento).participantes, 2)
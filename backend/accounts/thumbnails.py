@@ -0,0 +1,120 @@
+import logging
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+from .models import Aventureiro
+from .utils import decode_photo
+
+logger = logging.getLogger(__name__)
+
+# campo -> lado maximo em pixels
+AVENTUREIRO_THUMBNAILS = {
+    'foto_miniatura': 96,
+    'foto_media': 256,
+}
+
+
+def _thumbnail_format():
+    if features.check('webp'):
+        return 'WEBP', 'webp'
+    return 'JPEG', 'jpg'
+
+
+def render_thumbnail(source, size):
+    """Reduz a imagem para caber em `size` x `size` e devolve `(bytes, extensao)`."""
+    image_format, ext = _thumbnail_format()
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size), Image.LANCZOS)
+        if image.mode not in {'RGB', 'L'}:
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            if image.mode in {'RGBA', 'LA', 'P'}:
+                image = image.convert('RGBA')
+                background.paste(image, mask=image.split()[-1])
+            else:
+                background.paste(image.convert('RGB'))
+            image = background
+        output = BytesIO()
+        image.save(output, format=image_format, quality=80, optimize=True)
+    return output.getvalue(), ext
+
+
+def _delete_stored(field_file, names):
+    for name in names:
+        if not name:
+            continue
+        try:
+            field_file.storage.delete(name)
+        except OSError:
+            logger.warning('Nao foi possivel apagar a miniatura %s.', name, exc_info=True)
+
+
+def refresh_aventureiro_thumbnails(aventureiro, force=False):
+    """Gera as miniaturas a partir de `foto` quando ela mudou. Retorna True se gravou algo.
+
+    As miniaturas antigas so sao apagadas depois que as novas estao gravadas e a
+    linha atualizada. Se a geracao falhar, os campos ficam vazios (sem apontar para
+    arquivos de outra foto).
+    """
+    source_name = aventureiro.foto.name if aventureiro.foto else ''
+    if not force and source_name == aventureiro.foto_miniatura_origem:
+        return False
+
+    old_names = {field: getattr(aventureiro, field).name or '' for field in AVENTUREIRO_THUMBNAILS}
+    updates = {field: '' for field in AVENTUREIRO_THUMBNAILS}
+    failed = False
+    if source_name:
+        stem = PurePosixPath(source_name).stem
+        try:
+            for field, size in AVENTUREIRO_THUMBNAILS.items():
+                aventureiro.foto.open('rb')
+                try:
+                    content, ext = render_thumbnail(aventureiro.foto, size)
+                finally:
+                    aventureiro.foto.close()
+                getattr(aventureiro, field).save(f'{stem}_{size}.{ext}', ContentFile(content), save=False)
+                updates[field] = getattr(aventureiro, field).name
+        except (OSError, UnidentifiedImageError, ValueError):
+            logger.warning('Nao foi possivel gerar miniaturas da foto do aventureiro %s.', aventureiro.pk, exc_info=True)
+            field_file = getattr(aventureiro, next(iter(AVENTUREIRO_THUMBNAILS)))
+            _delete_stored(field_file, [name for name in updates.values() if name not in old_names.values()])
+            updates = {field: '' for field in AVENTUREIRO_THUMBNAILS}
+            failed = True
+
+    if not failed:
+        # So marca a origem quando gerou; uma falha volta a ser tentada no proximo save.
+        updates['foto_miniatura_origem'] = source_name
+        aventureiro.foto_miniatura_origem = source_name
+    for field, name in updates.items():
+        if field in AVENTUREIRO_THUMBNAILS:
+            setattr(aventureiro, field, name or None)
+    # update() evita disparar o post_save de novo.
+    Aventureiro.objects.filter(pk=aventureiro.pk).update(**updates)
+    field_file = getattr(aventureiro, next(iter(AVENTUREIRO_THUMBNAILS)))
+    _delete_stored(field_file, [name for field, name in old_names.items() if name and name != updates.get(field)])
+    return not failed
+
+
+def import_inline_photo(ficha):
+    """Move o `foto_3x4` em base64 da ficha para `Aventureiro.foto` e limpa o JSON.
+
+    Retorna True quando a ficha foi alterada.
+    """
+    inscricao_data = ficha.inscricao_data if isinstance(ficha.inscricao_data, dict) else {}
+    inline_photo = str(inscricao_data.get('foto_3x4') or '').strip()
+    if not inline_photo.startswith('data:image/'):
+        return False
+    aventureiro = ficha.aventureiro
+    if not aventureiro.foto:
+        photo = decode_photo(inline_photo)
+        if not photo:
+            return False
+        aventureiro.foto.save(photo.name, photo, save=True)
+    inscricao_data = dict(inscricao_data)
+    inscricao_data['foto_3x4'] = ''
+    ficha.inscricao_data = inscricao_data
+    ficha.save(update_fields=['inscricao_data', 'updated_at'])
+    return True
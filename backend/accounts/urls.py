@@ -46,7 +46,9 @@ from .views import (
     EventoInscricaoAplicarCashbackManualApiView,
     PresencaView,
     PresencaStatusApiView,
+    PresencaStreamApiView,
     PresencaToggleApiView,
+    PresencaLoteApiView,
     PresencaFaltaInscricaoApiView,
     AuditoriaView,
     UsuariosView,
@@ -58,8 +60,11 @@ from .views import (
     LojaRelatorioPedidosPagosPdfView,
     LojaPedidoCreatePixApiView,
     LojaPedidoStatusApiView,
+    PixQrCodeImageView,
     LojaPedidoWebhookView,
     PagamentoMensalidadeStatusApiView,
+    FinanceiroSyncJobStatusApiView,
+    FinanceiroCobrancaCampanhaApiView,
     PagamentoMensalidadeWebhookView,
     WhatsAppView,
     UsuarioDetalheView,
@@ -118,7 +123,9 @@ urlpatterns = [
     path('eventos/<int:event_id>/inscricoes/<int:inscricao_id>/aplicar-cashback-manual/', EventoInscricaoAplicarCashbackManualApiView.as_view(), name='evento_inscricao_aplicar_cashback_manual'),
     path('presenca/', PresencaView.as_view(), name='presenca'),
     path('presenca/status/', PresencaStatusApiView.as_view(), name='presenca_status_api'),
+    path('presenca/stream/', PresencaStreamApiView.as_view(), name='presenca_stream_api'),
     path('presenca/toggle/', PresencaToggleApiView.as_view(), name='presenca_toggle_api'),
+    path('presenca/lote/', PresencaLoteApiView.as_view(), name='presenca_lote_api'),
     path('presenca/falta-inscricao/', PresencaFaltaInscricaoApiView.as_view(), name='presenca_falta_inscricao_api'),
     path('auditoria/', AuditoriaView.as_view(), name='auditoria'),
     path('usuarios/', UsuariosView.as_view(), name='usuarios'),
@@ -129,8 +136,11 @@ urlpatterns = [
     path('loja/relatorio-pedidos-pagos.pdf', LojaRelatorioPedidosPagosPdfView.as_view(), name='loja_relatorio_pedidos_pagos_pdf'),
     path('loja/pedidos/criar-pix/', LojaPedidoCreatePixApiView.as_view(), name='loja_pedido_criar_pix'),
     path('loja/pedidos/<int:pk>/status/', LojaPedidoStatusApiView.as_view(), name='loja_pedido_status'),
+    path('pix/qr/<str:token>.png', PixQrCodeImageView.as_view(), name='pix_qr_image_api'),
     path('loja/mp-webhook/', LojaPedidoWebhookView.as_view(), name='loja_mp_webhook'),
     path('financeiro/pagamentos/<int:pk>/status/', PagamentoMensalidadeStatusApiView.as_view(), name='financeiro_pagamento_status'),
+    path('financeiro/sincronizacao/<str:job_id>/', FinanceiroSyncJobStatusApiView.as_view(), name='financeiro_sync_job_api'),
+    path('financeiro/cobrancas/<int:pk>/', FinanceiroCobrancaCampanhaApiView.as_view(), name='financeiro_cobranca_campanha_api'),
     path('financeiro/mp-webhook/', PagamentoMensalidadeWebhookView.as_view(), name='financeiro_mp_webhook'),
     path('permissoes/', PermissoesView.as_view(), name='permissoes'),
     path('whatsapp/', WhatsAppView.as_view(), name='whatsapp'),
@@ -1,5 +1,4 @@
 import copy
-import difflib
 import json
 import os
 import re
@@ -7,13 +6,11 @@ import unicodedata
 import hashlib
 import hmac
 import logging
-import time
 import base64
 import zipfile
 from pathlib import Path
 from random import randint
 from decimal import Decimal, InvalidOperation
-from urllib import request as urllib_request, error as urllib_error
 
 from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
@@ -23,6 +20,7 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.views import LoginView as DjangoLoginView
 from django.views import View
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.utils.crypto import constant_time_compare, get_random_string
 from django.utils.decorators import method_decorator
 from django.views.decorators.clickjacking import xframe_options_sameorigin
@@ -66,6 +64,7 @@ from .models import (
     EventoInscricao,
     EventoPresenca,
     EventoFaltaInscricao,
+    EventoResumo,
     AuditLog,
     MensalidadeAventureiro,
     PagamentoMensalidade,
@@ -75,6 +74,8 @@ from .models import (
     LojaProdutoFoto,
     LojaPedido,
     LojaPedidoItem,
+    MercadoPagoWebhookInbox,
+    CobrancaMensalidadeCampanha,
     ApostilaRequisito,
     ApostilaSubRequisito,
     ApostilaDica,
@@ -82,7 +83,44 @@ from .models import (
     AventureiroPontosPreset,
     AventureiroPontosLancamento,
 )
-from .audit import record_audit
+from .audit import audit_search_q, record_audit
+from .retention import search_audit_archive
+from .checkout_idempotency import run_idempotent_checkout
+from .event_schema_cache import get_cached_event_schema
+from .field_keys import classify_field_keys, field_key_roles, key_has_like, normalize_lookup_text
+from .inscricao_faixas import compile_faixas_idade, precificar_linhas, totais_por_faixa
+from .evento_busca import buscar_inscricao_ids, garantir_busca
+from .evento_resumo import evento_resumos_map
+from .cobranca_campanhas import (
+    active_campanha,
+    campanha_progress,
+    cancel_campanha,
+    create_campanha,
+    pause_campanha,
+    resume_campanha,
+)
+from .http_client import ProviderError, mercadopago_client, provider_metrics
+from .mp_reconcile import (
+    MODE_IDS,
+    MODE_SEARCH,
+    SYNC_JOB_LABELS,
+    get_sync_job,
+    pending_mensalidade_pagamentos,
+    reconcile_payments,
+    start_sync_job,
+)
+from .mp_status import claim_payment_refresh, mark_payment_refreshed
+from .mp_webhooks import enqueue_webhook, webhook_inbox_stats
+from .pix_qr import pix_qr_png, pix_qr_url, resolve_pix_qr_token
+from .presenca import (
+    PRESENCA_BATCH_MAX_OPS,
+    apply_presence_ops,
+    count_present,
+    mark_presence,
+    presence_changes,
+    presence_event_stream,
+)
+from .permission_cache import get_cached_permission_data, permission_cache_version
 from .utils import decode_signature, decode_photo
 from .whatsapp import (
     queue_stats,
@@ -91,10 +129,13 @@ from .whatsapp import (
     normalize_phone_number,
     render_message,
     get_template_message,
+    get_whatsapp_preference,
+    NotificationFanout,
 )
-from django.http import HttpResponse, JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.db import IntegrityError, transaction
-from django.db.models import Count, F, Q, Sum
+from django.db.models import Count, F, Prefetch, Q, Sum, Window
+from django.db.models.functions import RowNumber
 from django.views.decorators.csrf import csrf_exempt
 from PIL import Image, ImageDraw, ImageFont
 from io import BytesIO
@@ -340,8 +381,7 @@ def _group_codes_for_profile(profile):
 
 
 def _get_active_profile(request, access=None):
-    access = access or _ensure_user_access(request.user)
-    profiles = _available_profiles(access)
+    profiles = _compiled_menu_access(request.user)['profiles']
     if not profiles:
         request.session.pop('active_profile', None)
         return ''
@@ -353,14 +393,13 @@ def _get_active_profile(request, access=None):
     return selected
 
 
-def _effective_menu_permissions(user, active_profile=''):
-    access = _ensure_user_access(user)
+def _compute_menu_permissions(access, profiles, groups, has_evento_atendente, active_profile=''):
     user_override = _normalize_menu_keys(access.menu_allow)
     if user_override:
         return user_override
 
-    profiles = set(_available_profiles(access))
-    if not profiles and _user_has_active_evento_atendente(user):
+    profiles = set(profiles)
+    if not profiles and has_evento_atendente:
         return []
 
     allowed = {'inicio', 'meus_dados'}
@@ -371,7 +410,7 @@ def _effective_menu_permissions(user, active_profile=''):
     # controlados exclusivamente pelos grupos (além de início/meus dados).
     matched_group_count = 0
     allowed_group_codes = _group_codes_for_profile(active_profile) if active_profile else set()
-    for group in user.access_groups.all():
+    for group in groups:
         if active_profile and group.code not in allowed_group_codes:
             continue
         matched_group_count += 1
@@ -390,6 +429,52 @@ def _effective_menu_permissions(user, active_profile=''):
     return sorted(allowed)
 
 
+def _build_menu_access(user):
+    access = _ensure_user_access(user)
+    profiles = _available_profiles(access)
+    groups = list(user.access_groups.all())
+    has_evento_atendente = _user_has_active_evento_atendente(user)
+    menus = {
+        profile: _compute_menu_permissions(access, profiles, groups, has_evento_atendente, active_profile=profile)
+        for profile in [''] + profiles
+    }
+    return {
+        'profiles': profiles,
+        'is_diretor': access.has_profile(UserAccess.ROLE_DIRETOR),
+        'menus': menus,
+        'eventos_atendente': _eventos_atendente_menu_items(user),
+    }
+
+
+def _compiled_menu_access(user):
+    # Perfis e menus compilados por usuario ficam no cache compartilhado e sao
+    # invalidados pelos signals de UserAccess/AccessGroup/EventoAtendente/Evento.
+    if not getattr(user, 'pk', None):
+        return _build_menu_access(user)
+    version = permission_cache_version()
+    memo = getattr(user, '_menu_access_memo', None)
+    if memo and memo[0] == version:
+        return memo[1]
+    data = get_cached_permission_data('usuario', user.pk, builder=lambda: _build_menu_access(user))
+    user._menu_access_memo = (version, data)
+    return data
+
+
+def _effective_menu_permissions(user, active_profile=''):
+    compiled = _compiled_menu_access(user)
+    menus = compiled['menus'].get(active_profile or '')
+    if menus is not None:
+        return list(menus)
+    access = _ensure_user_access(user)
+    return _compute_menu_permissions(
+        access,
+        compiled['profiles'],
+        list(user.access_groups.all()),
+        _user_has_active_evento_atendente(user),
+        active_profile=active_profile,
+    )
+
+
 def _has_menu_permission(user_or_request, menu_key):
     if hasattr(user_or_request, 'user'):
         request = user_or_request
@@ -482,38 +567,51 @@ def _first_evento_atendente(user):
         return None
 
 
+def _eventos_atalho_responsavel():
+    eventos_qs = (
+        Evento.objects
+        .filter(mostrar_no_menu_responsavel=True, pagina_ativa=True)
+        .order_by('event_date', 'event_time', 'name')
+        .only('id', 'name')
+    )
+    return [
+        {
+            'id': int(evento.id),
+            'name': str(evento.name or f'Evento {evento.id}'),
+        }
+        for evento in eventos_qs
+    ]
+
+
+def _ensure_default_access_groups_cached():
+    get_cached_permission_data('grupos_padrao', builder=lambda: _ensure_default_access_groups() or True)
+
+
 def _sidebar_context(request):
-    _ensure_default_access_groups()
-    access = _ensure_user_access(request.user)
-    active_profile = _get_active_profile(request, access=access)
+    _ensure_default_access_groups_cached()
+    compiled = _compiled_menu_access(request.user)
+    active_profile = _get_active_profile(request)
     menu_permissions = _effective_menu_permissions(request.user, active_profile=active_profile)
     profile_options = [
         {'value': profile, 'label': _profile_display_name(profile)}
-        for profile in _available_profiles(access)
+        for profile in compiled['profiles']
     ]
     eventos_atalho_responsavel = []
-    eventos_atendente = _eventos_atendente_menu_items(request.user)
+    eventos_atendente = list(compiled['eventos_atendente'])
     try:
         if active_profile == UserAccess.ROLE_RESPONSAVEL:
-            eventos_qs = (
-                Evento.objects
-                .filter(mostrar_no_menu_responsavel=True, pagina_ativa=True)
-                .order_by('event_date', 'event_time', 'name')
+            eventos_atalho_responsavel = list(
+                get_cached_permission_data('eventos_atalho_responsavel', builder=_eventos_atalho_responsavel)
             )
-            for evento in eventos_qs:
-                eventos_atalho_responsavel.append({
-                    'id': int(evento.id),
-                    'name': str(evento.name or f'Evento {evento.id}'),
-                })
     except Exception:
         logger.exception('Falha ao montar atalhos de eventos para sidebar do responsavel.')
     active_profile_label = _profile_display_name(active_profile)
-    current_profiles = [_profile_display_name(item) for item in _available_profiles(access)]
+    current_profiles = [_profile_display_name(item) for item in compiled['profiles']]
     if not active_profile and eventos_atendente:
         active_profile_label = 'Atendente de evento'
         current_profiles = ['Atendente de evento']
     return {
-        'is_diretor': access.has_profile(UserAccess.ROLE_DIRETOR),
+        'is_diretor': compiled['is_diretor'],
         'active_profile': active_profile,
         'active_profile_label': active_profile_label,
         'profile_options': profile_options,
@@ -1264,42 +1362,22 @@ def _dispatch_cadastro_notifications(tipo_cadastro, user, nome):
     tipo_lower = str(tipo_cadastro or '').strip().lower()
     if tipo_lower == 'diretoria':
         template_text = get_template_message(WhatsAppTemplate.TYPE_DIRETORIA)
-        prefs = WhatsAppPreference.objects.filter(notify_diretoria=True)
+        notify_field = 'notify_diretoria'
         queue_type = WhatsAppQueue.TYPE_DIRETORIA
     else:
         template_text = get_template_message(WhatsAppTemplate.TYPE_CADASTRO)
-        prefs = WhatsAppPreference.objects.filter(notify_cadastro=True)
+        notify_field = 'notify_cadastro'
         queue_type = WhatsAppQueue.TYPE_CADASTRO
 
-    for pref in prefs.select_related('user'):
-        phone_number = normalize_phone_number(pref.phone_number or resolve_user_phone(pref.user))
-        if not phone_number:
-            continue
-        text = render_message(template_text, payload)
-        queue_item = WhatsAppQueue.objects.create(
-            user=pref.user,
-            phone_number=phone_number,
-            notification_type=queue_type,
-            message_text=text,
-            status=WhatsAppQueue.STATUS_PENDING,
-        )
-        success, provider_id, error_message = send_wapi_text(phone_number, text)
-        queue_item.attempts = 1
-        if success:
-            queue_item.status = WhatsAppQueue.STATUS_SENT
-            queue_item.provider_message_id = provider_id
-            queue_item.sent_at = timezone.now()
-            queue_item.last_error = ''
-        else:
-            queue_item.status = WhatsAppQueue.STATUS_FAILED
-            queue_item.last_error = error_message
-        queue_item.save(update_fields=['status', 'attempts', 'provider_message_id', 'sent_at', 'last_error'])
+    fanout = NotificationFanout()
+    fanout.add_preferences(notify_field, queue_type, render_message(template_text, payload))
+    fanout.enqueue()
 
 
 def _dispatch_signup_confirmation(user, tipo_cadastro, nome):
     if not user:
         return
-    pref, _ = WhatsAppPreference.objects.get_or_create(user=user)
+    pref = get_whatsapp_preference(user)
     phone_number = normalize_phone_number(pref.phone_number or resolve_user_phone(user))
     if not phone_number:
         return
@@ -2470,6 +2548,9 @@ class NovoCadastroResumoView(View):
                     if signature:
                         aventureiro.assinatura.save(signature.name, signature, save=True)
 
+                if aventureiro.foto and str(inscricao.get('foto_3x4') or '').startswith('data:image/'):
+                    # A foto ja virou arquivo (com miniaturas); nao duplica o base64 no JSON.
+                    inscricao = {**inscricao, 'foto_3x4': ''}
                 ficha = AventureiroFicha.objects.create(
                     aventureiro=aventureiro,
                     inscricao_data=inscricao,
@@ -3493,6 +3574,8 @@ class AventureiroGeralDetalheView(LoginRequiredMixin, View):
 
 class EventosView(LoginRequiredMixin, View):
     template_name = 'eventos.html'
+    # Inscricoes e pedidos mostrados no card de cada evento.
+    preview_limit = 20
 
     def _guard(self, request):
         if not _has_menu_permission(request, 'eventos'):
@@ -3779,147 +3862,93 @@ class EventosView(LoginRequiredMixin, View):
             return None, None, None
         return mode, valor, {}
 
+    def _ultimos_por_evento(self, queryset):
+        """Ate `preview_limit` linhas mais recentes de cada evento numa consulta so (ROW_NUMBER por evento)."""
+        rows = {}
+        queryset = (
+            queryset
+            .annotate(posicao_no_evento=Window(
+                RowNumber(),
+                partition_by=[F('evento_id')],
+                order_by=[F('created_at').desc(), F('id').desc()],
+            ))
+            .filter(posicao_no_evento__lte=self.preview_limit)
+            .order_by('evento_id', 'posicao_no_evento')
+        )
+        for obj in queryset:
+            rows.setdefault(obj.evento_id, []).append(obj)
+        return rows
+
     def _context(self, request):
         eventos = list(Evento.objects.select_related('created_by').all())
         evento_publico_helper = EventoPublicoView()
-        eventos_by_id = {evento.id: evento for evento in eventos}
-        inscricoes_excluir_teste_ids = _evento_inscricoes_excluir_teste_ids()
         try:
-            inscritos_totais_map = {}
-            inscricoes_confirmadas = (
-                EventoInscricao.objects
-                .filter(confirmada=True, cancelada=False)
-                .select_related('responsavel')
-                .prefetch_related('responsavel__aventures')
-            )
-            for inscricao in inscricoes_confirmadas:
-                if inscricao.id in inscricoes_excluir_teste_ids:
-                    continue
-                evento_obj = eventos_by_id.get(inscricao.evento_id)
-                inscritos_totais_map[inscricao.evento_id] = (
-                    int(inscritos_totais_map.get(inscricao.evento_id) or 0)
-                    + evento_publico_helper._inscricao_participantes_count(inscricao, evento=evento_obj)
-                )
-        except Exception:
-            logger.exception('Falha ao calcular total de inscrições por evento.')
-            inscritos_totais_map = {}
-        try:
-            pedidos_totais_map = {
-                item['evento_id']: item['total']
-                for item in (
-                    LojaPedido.objects
-                    .filter(evento__isnull=False, transacao_teste=False)
-                    .exclude(status=LojaPedido.STATUS_CANCELADO)
-                    .values('evento_id')
-                    .annotate(total=Count('id'))
-                )
-            }
+            resumos_map = evento_resumos_map(eventos)
         except Exception:
-            logger.exception('Falha ao calcular total de pedidos por evento.')
-            pedidos_totais_map = {}
+            logger.exception('Falha ao carregar resumos dos eventos.')
+            resumos_map = {}
+        # Previas de todos os eventos em poucas consultas (nao uma rodada por evento).
+        produtos_map = {}
+        inscricoes_map = {}
+        pedidos_map = {}
         try:
-            pedidos_pagos_totais_map = {}
-            pedidos_pagos_evento = list(
+            for produto in (
+                LojaProduto.objects
+                .filter(evento__in=eventos)
+                .prefetch_related(Prefetch('variacoes', queryset=LojaProdutoVariacao.objects.order_by('id')))
+                .order_by('-created_at')
+            ):
+                produtos_map.setdefault(produto.evento_id, []).append({
+                    'produto': produto,
+                    'variacoes': list(produto.variacoes.all()),
+                })
+            inscricoes_map = self._ultimos_por_evento(
+                EventoInscricao.objects
+                .filter(evento__in=eventos, confirmada=True, cancelada=False)
+                .select_related('user', 'responsavel', 'responsavel__user', 'indicador_aventureiro')
+            )
+            pedidos_map = self._ultimos_por_evento(
                 LojaPedido.objects
-                .filter(evento__isnull=False, status=LojaPedido.STATUS_PAGO, transacao_teste=False)
+                .filter(evento__in=eventos, transacao_teste=False)
                 .exclude(status=LojaPedido.STATUS_CANCELADO)
-                .select_related('evento')
-                .prefetch_related('itens')
+                .select_related('responsavel', 'responsavel__user')
+                .for_listing()
             )
-            for pedido in pedidos_pagos_evento:
-                if not getattr(pedido, 'evento_id', None):
-                    continue
-                pedidos_pagos_totais_map[pedido.evento_id] = (
-                    Decimal(pedidos_pagos_totais_map.get(pedido.evento_id) or Decimal('0.00'))
-                    + _pedido_evento_itens_total(pedido)
-                ).quantize(Decimal('0.01'))
-        except Exception:
-            logger.exception('Falha ao calcular total pago por evento.')
-            pedidos_pagos_totais_map = {}
-        try:
-            inscricoes_valor_totais_map = {
-                item['evento_id']: item['valor_total']
-                for item in (
-                    EventoInscricao.objects
-                    .filter(confirmada=True, cancelada=False)
-                    .exclude(id__in=list(inscricoes_excluir_teste_ids))
-                    .values('evento_id')
-                    .annotate(valor_total=Sum('valor_inscricao'))
-                )
-            }
-        except Exception:
-            logger.exception('Falha ao calcular total de valores das inscricoes por evento.')
-            inscricoes_valor_totais_map = {}
-        try:
-            custos_totais_map = {
-                item['evento_id']: item['valor_total']
-                for item in (
-                    EventoCusto.objects
-                    .values('evento_id')
-                    .annotate(valor_total=Sum('valor'))
-                )
-            }
         except Exception:
-            logger.exception('Falha ao calcular total de custos por evento.')
-            custos_totais_map = {}
+            logger.exception('Falha ao carregar previas dos eventos.')
         event_rows = []
         for evento in eventos:
             try:
                 fields_data = evento_publico_helper._event_schema(evento)
-                produtos_qs = (
-                    LojaProduto.objects
-                    .filter(evento=evento)
-                    .prefetch_related('variacoes')
-                    .order_by('-created_at')
-                )
-                produtos_rows = []
-                for produto in produtos_qs:
-                    produtos_rows.append({
-                        'produto': produto,
-                        'variacoes': list(produto.variacoes.order_by('id')),
-                    })
-                inscricoes = list(
-                    EventoInscricao.objects
-                    .filter(evento=evento, confirmada=True, cancelada=False)
-                    .select_related('user', 'responsavel', 'responsavel__user', 'indicador_aventureiro')
-                    .order_by('-created_at')[:20]
-                )
+                produtos_rows = produtos_map.get(evento.id, [])
+                inscricoes = inscricoes_map.get(evento.id, [])
                 for inscricao in inscricoes:
                     try:
                         inscricao.responsavel_label = evento_publico_helper._responsavel_label_from_inscricao(inscricao)
                     except Exception:
                         inscricao.responsavel_label = '-'
-                pedidos = list(
-                    LojaPedido.objects
-                    .filter(evento=evento, transacao_teste=False)
-                    .exclude(status=LojaPedido.STATUS_CANCELADO)
-                    .select_related('responsavel', 'responsavel__user')
-                    .prefetch_related('itens')
-                    .order_by('-created_at')[:20]
-                )
+                pedidos = pedidos_map.get(evento.id, [])
                 for pedido in pedidos:
                     try:
                         pedido.responsavel_label = evento_publico_helper._responsavel_label_from_pedido(pedido)
                     except Exception:
                         pedido.responsavel_label = '-'
-                pedidos_total_pago = Decimal(pedidos_pagos_totais_map.get(evento.id) or Decimal('0.00'))
-                inscricoes_valor_total = Decimal(inscricoes_valor_totais_map.get(evento.id) or Decimal('0.00'))
-                custos_total = Decimal(custos_totais_map.get(evento.id) or Decimal('0.00'))
-                receita_total = pedidos_total_pago + inscricoes_valor_total
-                lucro_liquido = receita_total - custos_total
+                resumo = resumos_map.get(evento.id) or EventoResumo(evento=evento)
                 event_rows.append({
                     'evento': evento,
                     'relative_label': self._relative_event_time_label(evento.event_date),
                     'can_delete': self._event_can_delete(evento),
                     'produtos': produtos_rows,
                     'produtos_count': len(produtos_rows),
-                    'inscricoes_count': int(inscritos_totais_map.get(evento.id) or 0),
-                    'pedidos_count': int(pedidos_totais_map.get(evento.id) or 0),
-                    'pedidos_total_pago_fmt': self._format_currency(pedidos_total_pago),
-                    'inscricoes_valor_total_fmt': self._format_currency(inscricoes_valor_total),
-                    'receita_total_fmt': self._format_currency(receita_total),
-                    'custos_total_fmt': self._format_currency(custos_total),
-                    'lucro_liquido_fmt': self._format_currency(lucro_liquido),
+                    'inscricoes_count': resumo.participantes,
+                    'pedidos_count': resumo.pedidos_count,
+                    'pedidos_total_pago_fmt': self._format_currency(resumo.pedidos_total_pago),
+                    'inscricoes_valor_total_fmt': self._format_currency(resumo.inscricoes_valor_total),
+                    'receita_total_fmt': self._format_currency(resumo.receita_total),
+                    'custos_total_fmt': self._format_currency(resumo.custos_total),
+                    'lucro_liquido_fmt': self._format_currency(resumo.lucro_liquido),
+                    'valor_pix_fmt': self._format_currency(resumo.valor_pix),
+                    'valor_cartao_fmt': self._format_currency(resumo.valor_cartao),
                     'inscricao_valor_config_text': self._inscricao_valor_config_text(evento),
                     'inscricao_valor_faixas_texto': self._inscricao_valor_faixas_texto(evento),
                     'has_public_page': bool(fields_data or produtos_rows),
@@ -3942,6 +3971,8 @@ class EventosView(LoginRequiredMixin, View):
                     'receita_total_fmt': self._format_currency(Decimal('0.00')),
                     'custos_total_fmt': self._format_currency(Decimal('0.00')),
                     'lucro_liquido_fmt': self._format_currency(Decimal('0.00')),
+                    'valor_pix_fmt': self._format_currency(Decimal('0.00')),
+                    'valor_cartao_fmt': self._format_currency(Decimal('0.00')),
                     'inscricao_valor_config_text': 'Sem cobranca',
                     'inscricao_valor_faixas_texto': '',
                     'has_public_page': False,
@@ -5330,8 +5361,8 @@ class EventoPublicoView(View):
                 'code_objs': [],
                 'error': '',
             }
-        config = getattr(evento, 'inscricao_valor_config', {}) or {}
-        if not isinstance(config, dict):
+        tabela = compile_faixas_idade(getattr(evento, 'inscricao_valor_config', {}) or {})
+        if tabela is None:
             return {
                 'mode': mode,
                 'units': 0,
@@ -5346,10 +5377,9 @@ class EventoPublicoView(View):
                 'code_objs': [],
                 'error': 'Configuracao de faixa de idade invalida no evento.',
             }
-        repeat_field = str(config.get('repeat_field') or '').strip()
-        age_field = str(config.get('age_field') or '').strip()
-        ranges = config.get('ranges') if isinstance(config.get('ranges'), list) else []
-        if not repeat_field or not age_field or not ranges:
+        repeat_field = tabela.repeat_field
+        age_field = tabela.age_field
+        if not tabela.configurada:
             return {
                 'mode': mode,
                 'units': 0,
@@ -5393,21 +5423,13 @@ class EventoPublicoView(View):
         discount_field_label = self._event_repeat_discount_field_label(evento)
         discount_field_key = self._event_repeat_discount_field_key(evento)
         diretoria_field_key = self._event_repeat_diretoria_field_key(evento)
-        age_field_key = self._normalize_lookup_text(age_field)
-        global_diretoria_value_raw = config.get('diretoria_value')
-        global_diretoria_value = None
-        if global_diretoria_value_raw not in {None, ''}:
-            try:
-                global_diretoria_value = Decimal(str(global_diretoria_value_raw or '0')).quantize(Decimal('0.01'))
-            except (TypeError, ValueError, InvalidOperation):
-                global_diretoria_value = None
+        age_field_key = tabela.age_field_key
 
         for idx, row in enumerate(repeat_rows, start=1):
             if not self._row_has_any_value(row) or not isinstance(row, dict):
                 continue
-            age_text = self._get_row_value_by_normalized_key(row, age_field)
-            age_match = re.search(r'\d{1,3}', age_text)
-            if not age_match:
+            age = tabela.idade_da_linha(row)
+            if age is None:
                 return {
                     'mode': mode,
                     'units': 0,
@@ -5422,21 +5444,8 @@ class EventoPublicoView(View):
                     'code_objs': [],
                     'error': f'Preencha o subcampo "{age_field}" com idade numerica em todos os itens de "{repeat_field}".',
                 }
-            age = int(age_match.group(0))
-            matched_value = None
-            for item in ranges:
-                if not isinstance(item, dict):
-                    continue
-                try:
-                    min_age = int(item.get('min'))
-                    max_age = int(item.get('max'))
-                    item_value = Decimal(str(item.get('value') or '0')).quantize(Decimal('0.01'))
-                except (TypeError, ValueError, InvalidOperation):
-                    continue
-                if min_age <= age <= max_age:
-                    matched_value = item_value
-                    break
-            if matched_value is None:
+            faixa_indice = tabela.faixa_da_idade(age)
+            if faixa_indice is None:
                 return {
                     'mode': mode,
                     'units': 0,
@@ -5473,8 +5482,7 @@ class EventoPublicoView(View):
                 nome = f'Participante {idx}'
 
             is_diretoria = self._row_is_diretoria_member(row, evento=evento)
-            valor_base = global_diretoria_value if is_diretoria and global_diretoria_value is not None else matched_value
-            valor_base = Decimal(valor_base or Decimal('0.00')).quantize(Decimal('0.01'))
+            valor_base = tabela.valor_da_faixa(faixa_indice, is_diretoria)
 
             codigo_raw = self._get_row_value_by_normalized_key(row, discount_field_label)
             codigo = ''
@@ -5765,95 +5773,42 @@ class EventoPublicoView(View):
         mode = self._normalize_inscricao_valor_modo(getattr(evento, 'inscricao_valor_modo', ''))
         if mode != Evento.INSCRICAO_VALOR_MODO_FAIXA_IDADE_REPETIDOR:
             return []
-        config = getattr(evento, 'inscricao_valor_config', {}) or {}
-        if not isinstance(config, dict):
-            return []
-        repeat_field = str(config.get('repeat_field') or '').strip()
-        age_field = str(config.get('age_field') or '').strip()
-        ranges = config.get('ranges') if isinstance(config.get('ranges'), list) else []
-        if not repeat_field or not age_field or not ranges:
-            return []
-
-        faixas = []
-        global_diretoria_value_raw = config.get('diretoria_value')
-        global_diretoria_value = None
-        if global_diretoria_value_raw not in {None, ''}:
-            try:
-                global_diretoria_value = Decimal(str(global_diretoria_value_raw or '0')).quantize(Decimal('0.01'))
-            except (TypeError, ValueError, InvalidOperation):
-                global_diretoria_value = None
-        for item in ranges:
-            if not isinstance(item, dict):
-                continue
-            try:
-                min_age = int(item.get('min'))
-                max_age = int(item.get('max'))
-                value = Decimal(str(item.get('value') or '0')).quantize(Decimal('0.01'))
-            except (TypeError, ValueError, InvalidOperation):
-                continue
-            if max_age < min_age:
-                continue
-            faixas.append({
-                'min': min_age,
-                'max': max_age,
-                'value': value,
-                'quantidade': 0,
-                'quantidade_diretoria': 0,
-                'valor_total': Decimal('0.00'),
-            })
-        if not faixas:
+        tabela = compile_faixas_idade(getattr(evento, 'inscricao_valor_config', {}) or {})
+        if tabela is None or not tabela.configurada or not tabela.faixas:
             return []
-        diretoria_resumo = {
-            'quantidade': 0,
-            'valor_total': Decimal('0.00'),
-        }
-
-        for inscricao in (inscricoes or []):
-            dados_obj = getattr(inscricao, 'dados', {}) if inscricao is not None else {}
-            if not isinstance(dados_obj, dict):
-                continue
-            repeat_rows = dados_obj.get(repeat_field)
-            if not isinstance(repeat_rows, list):
-                continue
-            for row in repeat_rows:
-                if not self._row_has_any_value(row) or not isinstance(row, dict):
-                    continue
-                age_text = str(row.get(age_field) or '').strip()
-                age_match = re.search(r'\d{1,3}', age_text)
-                if not age_match:
-                    continue
-                age = int(age_match.group(0))
-                is_diretoria = self._row_is_diretoria_member(row, evento=evento)
-                for faixa in faixas:
-                    if faixa['min'] <= age <= faixa['max']:
-                        valor_faixa = global_diretoria_value if is_diretoria and global_diretoria_value is not None else faixa['value']
-                        if is_diretoria:
-                            diretoria_resumo['quantidade'] += 1
-                            diretoria_resumo['valor_total'] = (diretoria_resumo['valor_total'] + valor_faixa).quantize(Decimal('0.01'))
-                        else:
-                            faixa['quantidade'] += 1
-                            faixa['valor_total'] = (faixa['valor_total'] + valor_faixa).quantize(Decimal('0.01'))
-                        break
 
+        linhas = precificar_linhas(
+            tabela,
+            inscricoes,
+            diretoria_key=self._event_repeat_diretoria_field_key(evento),
+        )
+        quantidades, quantidades_diretoria = totais_por_faixa(tabela, linhas)
         resumo = []
-        for faixa in faixas:
-            label = f"{faixa['min']}-{faixa['max']}"
+        diretoria_quantidade = 0
+        diretoria_valor_total = Decimal('0.00')
+        for faixa, quantidade, quantidade_diretoria in zip(tabela.faixas, quantidades, quantidades_diretoria):
+            valor_total = (faixa['value'] * quantidade).quantize(Decimal('0.01'))
             resumo.append({
-                'label': label,
-                'quantidade': int(faixa['quantidade']),
+                'label': f"{faixa['min']}-{faixa['max']}",
+                'quantidade': int(quantidade),
                 'quantidade_diretoria': 0,
                 'is_diretoria_summary': False,
-                'valor_total_raw': str(faixa['valor_total']),
-                'valor_total_fmt': self._format_currency(faixa['valor_total']),
+                'valor_total_raw': str(valor_total),
+                'valor_total_fmt': self._format_currency(valor_total),
             })
-        if diretoria_resumo['quantidade'] > 0:
+            if quantidade_diretoria:
+                valor_diretoria = tabela.diretoria_value if tabela.diretoria_value is not None else faixa['value']
+                diretoria_quantidade += quantidade_diretoria
+                diretoria_valor_total += valor_diretoria * quantidade_diretoria
+        if diretoria_quantidade > 0:
+            diretoria_valor_total = diretoria_valor_total.quantize(Decimal('0.01'))
             resumo.append({
                 'label': 'Diretoria',
-                'quantidade': int(diretoria_resumo['quantidade']),
-                'quantidade_diretoria': int(diretoria_resumo['quantidade']),
+                'quantidade': int(diretoria_quantidade),
+                'quantidade_diretoria': int(diretoria_quantidade),
                 'is_diretoria_summary': True,
-                'valor_total_raw': str(diretoria_resumo['valor_total']),
-                'valor_total_fmt': self._format_currency(diretoria_resumo['valor_total']),
+                'valor_total_raw': str(diretoria_valor_total),
+                'valor_total_fmt': self._format_currency(diretoria_valor_total),
             })
         return resumo
 
@@ -6003,6 +5958,9 @@ class EventoPublicoView(View):
         return [str(item.get('name') or '').strip() for item in self._repeat_fields_schema_from_field(field) if str(item.get('name') or '').strip()]
 
     def _event_schema(self, evento):
+        return get_cached_event_schema(evento, lambda: self._compile_event_schema(evento))
+
+    def _compile_event_schema(self, evento):
         schema = []
         allowed_types = {'texto', 'data', 'hora', 'numero', 'booleano', 'seletor', 'repetidor'}
         raw_fields = getattr(evento, 'fields_data', None)
@@ -6114,10 +6072,7 @@ class EventoPublicoView(View):
         return rows
 
     def _normalize_lookup_text(self, value):
-        text = str(value or '').strip().lower()
-        text = unicodedata.normalize('NFKD', text)
-        text = ''.join(ch for ch in text if not unicodedata.combining(ch))
-        return re.sub(r'\s+', ' ', text)
+        return normalize_lookup_text(str(value or ''))
 
     def _split_people_values(self, raw_text):
         text = str(raw_text or '').strip()
@@ -6132,51 +6087,31 @@ class EventoPublicoView(View):
         return cleaned
 
     def _key_has_like(self, norm_key, targets):
-        key = str(norm_key or '').strip()
-        if not key:
-            return False
-        collapsed = key.replace(' ', '')
-        tokens = [item for item in re.split(r'[^a-z0-9]+', key) if item]
-        candidates = tokens + [collapsed]
-        for target in targets:
-            target_norm = self._normalize_lookup_text(target).replace(' ', '')
-            if not target_norm:
-                continue
-            if target_norm in collapsed:
-                return True
-            for candidate in candidates:
-                if not candidate:
-                    continue
-                if target_norm in candidate:
-                    return True
-                similarity = difflib.SequenceMatcher(None, candidate, target_norm).ratio()
-                if similarity >= 0.78:
-                    return True
-        return False
+        return key_has_like(norm_key, tuple(targets))
 
     def _is_responsavel_key(self, norm_key):
-        return self._key_has_like(norm_key, ['responsavel'])
+        return 'responsavel' in field_key_roles(norm_key)
 
     def _is_nome_key(self, norm_key):
-        return self._key_has_like(norm_key, ['nome'])
+        return 'nome' in field_key_roles(norm_key)
 
     def _is_cpf_key(self, norm_key):
-        return self._key_has_like(norm_key, ['cpf'])
+        return 'cpf' in field_key_roles(norm_key)
 
     def _is_phone_key(self, norm_key):
-        return self._key_has_like(norm_key, ['telefone', 'celular', 'whatsapp'])
+        return 'phone' in field_key_roles(norm_key)
 
     def _is_email_key(self, norm_key):
-        return self._key_has_like(norm_key, ['email'])
+        return 'email' in field_key_roles(norm_key)
 
     def _is_parentesco_key(self, norm_key):
-        return self._key_has_like(norm_key, ['parentesco'])
+        return 'parentesco' in field_key_roles(norm_key)
 
     def _is_criancas_key(self, norm_key):
-        return self._key_has_like(norm_key, ['crianca', 'criancas', 'filho', 'filhos', 'filha', 'filhas'])
+        return 'criancas' in field_key_roles(norm_key)
 
     def _is_idade_key(self, norm_key):
-        return self._key_has_like(norm_key, ['idade', 'idades', 'ano', 'anos'])
+        return 'idade' in field_key_roles(norm_key)
 
     def _responsavel_label_from_inscricao(self, inscricao):
         responsavel = getattr(inscricao, 'responsavel', None)
@@ -6193,21 +6128,22 @@ class EventoPublicoView(View):
         if user:
             return user.get_full_name() or user.username or '-'
         dados = (inscricao.dados or {}) if isinstance(inscricao.dados, dict) else {}
+        key_roles = classify_field_keys(tuple(dados))
         for key, value in dados.items():
-            norm_key = self._normalize_lookup_text(key)
+            roles = key_roles[key][1]
             text = str(value or '').strip()
             if not text:
                 continue
-            if self._is_responsavel_key(norm_key) and self._is_nome_key(norm_key):
+            if 'responsavel' in roles and 'nome' in roles:
                 return text
         for key, value in dados.items():
-            norm_key = self._normalize_lookup_text(key)
+            roles = key_roles[key][1]
             text = str(value or '').strip()
             if not text:
                 continue
-            if not self._is_responsavel_key(norm_key):
+            if 'responsavel' not in roles:
                 continue
-            if self._is_cpf_key(norm_key) or self._is_phone_key(norm_key) or self._is_email_key(norm_key) or self._is_parentesco_key(norm_key):
+            if roles & {'cpf', 'phone', 'email', 'parentesco'}:
                 continue
             if re.fullmatch(r'\d{8,}', text):
                 continue
@@ -6228,9 +6164,10 @@ class EventoPublicoView(View):
 
         dados = (inscricao.dados or {}) if isinstance(inscricao.dados, dict) else {}
         candidates = []
+        key_roles = classify_field_keys(tuple(dados))
         for key, value in dados.items():
-            norm_key = self._normalize_lookup_text(key)
-            if not self._is_cpf_key(norm_key):
+            roles = key_roles[key][1]
+            if 'cpf' not in roles:
                 continue
             text = str(value or '').strip()
             if not text:
@@ -6238,7 +6175,7 @@ class EventoPublicoView(View):
             digits = re.sub(r'\D', '', text)
             if len(digits) < 11:
                 continue
-            priority = 1 if self._is_responsavel_key(norm_key) else 2
+            priority = 1 if 'responsavel' in roles else 2
             candidates.append((priority, digits))
         if not candidates:
             return '-'
@@ -6283,16 +6220,17 @@ class EventoPublicoView(View):
                     return text
 
         candidates = []
+        key_roles = classify_field_keys(tuple(dados))
         for key, value in dados.items():
-            norm_key = self._normalize_lookup_text(key)
-            if not self._is_phone_key(norm_key):
+            roles = key_roles[key][1]
+            if 'phone' not in roles:
                 continue
             if isinstance(value, (list, tuple, dict)):
                 continue
             text = str(value or '').strip()
             if not text:
                 continue
-            priority = 1 if self._is_responsavel_key(norm_key) else 2
+            priority = 1 if 'responsavel' in roles else 2
             candidates.append((priority, text))
         if not candidates:
             return '-'
@@ -6385,59 +6323,8 @@ class EventoPublicoView(View):
         message_text_responsavel = render_message(template_responsavel, payload)
         message_text_diretoria = render_message(template_diretoria, payload)
 
-        responsavel_recipients = []
-        diretoria_recipients = []
-        seen_phones = set()
-
-        def add_responsavel_user(user):
-            if not user:
-                return
-            pref, _ = WhatsAppPreference.objects.get_or_create(user=user)
-            phone_number = normalize_phone_number(pref.phone_number or resolve_user_phone(user))
-            if not phone_number or phone_number in seen_phones:
-                return
-            seen_phones.add(phone_number)
-            responsavel_recipients.append((user, phone_number))
-
-        def add_responsavel_phone(raw_phone):
-            phone_number = normalize_phone_number(raw_phone)
-            if not phone_number or phone_number in seen_phones:
-                return
-            seen_phones.add(phone_number)
-            responsavel_recipients.append((None, phone_number))
-
-        def add_diretoria_user(user):
-            if not user:
-                return
-            pref, _ = WhatsAppPreference.objects.get_or_create(user=user)
-            if not pref.notify_evento_inscricao:
-                return
-            phone_number = normalize_phone_number(pref.phone_number or resolve_user_phone(user))
-            if not phone_number or phone_number in seen_phones:
-                return
-            seen_phones.add(phone_number)
-            diretoria_recipients.append((user, phone_number))
-
-        def send_to_recipients(recipients, message_text, queue_type):
-            for user, phone_number in recipients:
-                queue_item = WhatsAppQueue.objects.create(
-                    user=user,
-                    phone_number=phone_number,
-                    notification_type=queue_type,
-                    message_text=message_text,
-                    status=WhatsAppQueue.STATUS_PENDING,
-                )
-                success, provider_id, error_message = send_wapi_text(phone_number, message_text)
-                queue_item.attempts = 1
-                if success:
-                    queue_item.status = WhatsAppQueue.STATUS_SENT
-                    queue_item.provider_message_id = provider_id
-                    queue_item.sent_at = timezone.now()
-                    queue_item.last_error = ''
-                else:
-                    queue_item.status = WhatsAppQueue.STATUS_FAILED
-                    queue_item.last_error = error_message
-                queue_item.save(update_fields=['status', 'attempts', 'provider_message_id', 'sent_at', 'last_error'])
+        fanout = NotificationFanout()
+        responsavel_type = WhatsAppQueue.TYPE_EVENTO_INSCRICAO_RESPONSAVEL
 
         # Responsável da própria inscrição sempre recebe confirmação/dados.
         responsavel_user = None
@@ -6445,36 +6332,33 @@ class EventoPublicoView(View):
             responsavel_user = inscricao.responsavel.user
         elif getattr(inscricao, 'user_id', None):
             responsavel_user = inscricao.user
+        added = False
         if responsavel_user:
-            before_count = len(responsavel_recipients)
-            add_responsavel_user(responsavel_user)
-            if len(responsavel_recipients) == before_count:
-                add_responsavel_phone(responsavel_whatsapp)
-        else:
-            add_responsavel_phone(responsavel_whatsapp)
+            pref = get_whatsapp_preference(responsavel_user)
+            phone_number = normalize_phone_number(pref.phone_number or resolve_user_phone(responsavel_user))
+            added = fanout.add(responsavel_user.pk, phone_number, responsavel_type, message_text_responsavel)
+        if not added:
+            fanout.add(None, normalize_phone_number(responsavel_whatsapp), responsavel_type, message_text_responsavel)
 
         # Administração do evento: diretoria/diretor marcados na coluna de evento.
         admin_accesses = (
             UserAccess.objects
-            .select_related('user')
             .filter(user__whatsapp_preference__notify_evento_inscricao=True)
+            .exclude(user__whatsapp_preference__resolved_phone='')
+            .annotate(whatsapp_phone=F('user__whatsapp_preference__resolved_phone'))
+            .only('user', 'role', 'profiles')
             .order_by('user__username')
         )
         for access in admin_accesses:
             if not (access.has_profile(UserAccess.ROLE_DIRETORIA) or access.has_profile(UserAccess.ROLE_DIRETOR)):
                 continue
-            add_diretoria_user(access.user)
-
-        send_to_recipients(
-            responsavel_recipients,
-            message_text_responsavel,
-            WhatsAppQueue.TYPE_EVENTO_INSCRICAO_RESPONSAVEL,
-        )
-        send_to_recipients(
-            diretoria_recipients,
-            message_text_diretoria,
-            WhatsAppQueue.TYPE_EVENTO_INSCRICAO_DIRETORIA,
-        )
+            fanout.add(
+                access.user_id,
+                access.whatsapp_phone,
+                WhatsAppQueue.TYPE_EVENTO_INSCRICAO_DIRETORIA,
+                message_text_diretoria,
+            )
+        fanout.enqueue()
 
     def _consulta_outros_dados_rows(self, dados):
         if not isinstance(dados, dict) or not dados:
@@ -6537,15 +6421,16 @@ class EventoPublicoView(View):
             found_name = ''
             found_age = ''
             fallback_text_values = []
+            sub_key_roles = classify_field_keys(tuple(row_obj))
             for sub_key, sub_value in row_obj.items():
-                norm_sub_key = self._normalize_lookup_text(sub_key)
+                sub_roles = sub_key_roles[sub_key][1]
                 sub_text = str(sub_value or '').strip()
                 if not sub_text:
                     continue
-                if not found_name and self._is_nome_key(norm_sub_key) and not self._is_responsavel_key(norm_sub_key):
+                if not found_name and 'nome' in sub_roles and 'responsavel' not in sub_roles:
                     found_name = sub_text
                     continue
-                if not found_age and self._is_idade_key(norm_sub_key):
+                if not found_age and 'idade' in sub_roles:
                     found_age = _age_digits(sub_text)
                     continue
                 fallback_text_values.append(sub_text)
@@ -6569,13 +6454,12 @@ class EventoPublicoView(View):
                 repeat_field_preferido = str(config.get('repeat_field') or '').strip()
         rows = []
         candidate_keys = []
+        key_roles = classify_field_keys(tuple(dados))
+        repeat_field_preferido_norm = self._normalize_lookup_text(repeat_field_preferido)
         for key, value in dados.items():
-            norm_key = self._normalize_lookup_text(key)
-            is_preferred = (
-                bool(repeat_field_preferido)
-                and self._normalize_lookup_text(key) == self._normalize_lookup_text(repeat_field_preferido)
-            )
-            if not is_preferred and not self._is_criancas_key(norm_key):
+            norm_key, roles = key_roles[key]
+            is_preferred = bool(repeat_field_preferido) and norm_key == repeat_field_preferido_norm
+            if not is_preferred and 'criancas' not in roles:
                 continue
             candidate_keys.append((0 if is_preferred else 1, key, value))
         candidate_keys.sort(key=lambda item: item[0])
@@ -6810,47 +6694,24 @@ class EventoPublicoView(View):
         if codigo:
             inscricoes = list(base_qs.filter(codigo_inscricao=codigo)[:20])
         elif len(digits) >= 11:
-            candidates = list(
-                base_qs.filter(
-                    Q(responsavel__responsavel_cpf__icontains=digits)
-                    | Q(responsavel__pai_cpf__icontains=digits)
-                    | Q(responsavel__mae_cpf__icontains=digits)
-                    | Q(dados__icontains=digits)
-                )[:200]
-            )
-            for item in candidates:
-                cpfs = self._cpf_candidates_from_inscricao(item)
-                if any(digits in cpf for cpf in cpfs):
-                    inscricoes.append(item)
+            garantir_busca(evento)
+            busca_ids = buscar_inscricao_ids(evento, digitos=digits, colunas_digitos=('cpfs',))
+            inscricoes = list(base_qs.filter(id__in=busca_ids))
         else:
             maybe_code = re.sub(r'\D', '', termo)[:3]
             if len(maybe_code) == 3:
                 inscricoes = list(base_qs.filter(codigo_inscricao=maybe_code)[:20])
             if not inscricoes:
-                normalized_term = self._normalize_lookup_text(termo)
-                candidates = list(
-                    base_qs.filter(
-                        Q(responsavel__responsavel_nome__icontains=termo)
-                        | Q(responsavel__mae_nome__icontains=termo)
-                        | Q(responsavel__pai_nome__icontains=termo)
-                        | Q(user__username__icontains=termo)
-                        | Q(user__first_name__icontains=termo)
-                        | Q(user__last_name__icontains=termo)
-                        | Q(dados__icontains=termo)
-                    )[:400]
+                garantir_busca(evento)
+                # Termo com cara de telefone tambem procura nos digitos dos telefones.
+                telefone = digits if len(digits) >= 8 and re.fullmatch(r'[\d\s().+-]+', termo) else ''
+                busca_ids = buscar_inscricao_ids(
+                    evento,
+                    texto=self._normalize_lookup_text(termo),
+                    digitos=telefone,
+                    colunas_digitos=('telefones',),
                 )
-                for item in candidates:
-                    resp_label = self._normalize_lookup_text(self._responsavel_label_from_inscricao(item))
-                    criancas_text = self._normalize_lookup_text(self._criancas_info_from_inscricao(item, evento=evento).get('resumo', ''))
-                    dados_text = self._normalize_lookup_text(self._dados_resumo(item.dados if isinstance(item.dados, dict) else {}))
-                    codigo_text = str(item.codigo_inscricao or '').strip()
-                    if (
-                        normalized_term in resp_label
-                        or normalized_term in criancas_text
-                        or normalized_term in dados_text
-                        or (codigo_text and normalized_term in self._normalize_lookup_text(codigo_text))
-                    ):
-                        inscricoes.append(item)
+                inscricoes = list(base_qs.filter(id__in=busca_ids))
 
         loja_view = LojaView()
         results = []
@@ -9321,6 +9182,13 @@ class EventoPedidoCreatePixApiView(View):
         return self._guest_can_access_consulta_inscricao(request, evento.id, inscricao.id)
 
     def post(self, request, event_id):
+        return run_idempotent_checkout(
+            request,
+            f'evento:{event_id}',
+            lambda: self._create_pedido(request, event_id),
+        )
+
+    def _create_pedido(self, request, event_id):
         evento = get_object_or_404(Evento, pk=event_id)
         if not EventoPublicoView()._can_access_page(request, evento):
             return JsonResponse({'ok': False, 'error': 'forbidden_profile'}, status=403)
@@ -9586,10 +9454,7 @@ class EventoPedidoCreatePixApiView(View):
                     else:
                         mp_payload = loja_view._create_mp_pix_payment_loja(request, pedido)
                         pedido.mp_qr_code = mp_payload['pix_code']
-                        pedido.mp_qr_code_base64 = mp_payload['qr_base64']
-                        pedido.save(update_fields=[
-                            'mp_qr_code', 'mp_qr_code_base64', 'updated_at',
-                        ])
+                        pedido.save(update_fields=['mp_qr_code', 'updated_at'])
                         loja_view._sync_pedido_loja_from_mp(pedido, {
                             'id': mp_payload['payment_id'],
                             'external_reference': mp_payload['external_reference'],
@@ -9717,7 +9582,7 @@ class EventoPedidoStatusApiView(View):
         if not EventoPublicoView()._can_access_page(request, evento):
             return JsonResponse({'ok': False, 'error': 'forbidden_profile'}, status=403)
         pedido = get_object_or_404(
-            LojaPedido.objects.select_related('responsavel', 'responsavel__user'),
+            LojaPedido.objects.for_listing().select_related('responsavel', 'responsavel__user'),
             pk=pk,
             evento=evento,
         )
@@ -9735,13 +9600,19 @@ class EventoPedidoStatusApiView(View):
                 return JsonResponse({'ok': False, 'error': 'forbidden'}, status=403)
 
         loja_view = LojaView()
-        if pedido.mp_payment_id and pedido.status != LojaPedido.STATUS_PAGO:
+        if (
+            pedido.mp_payment_id
+            and pedido.status != LojaPedido.STATUS_PAGO
+            and claim_payment_refresh(pedido.mp_payment_id)
+        ):
             try:
                 payment_data = loja_view._get_mp_payment(pedido.mp_payment_id)
                 loja_view._sync_pedido_loja_from_mp(pedido, payment_data)
                 pedido.refresh_from_db()
             except Exception:
                 pass
+            finally:
+                mark_payment_refreshed(pedido.mp_payment_id, pedido.created_at)
 
         resumo_linhas = []
         for item in pedido.itens.all():
@@ -9749,7 +9620,7 @@ class EventoPedidoStatusApiView(View):
                 f'{item.produto_titulo} - {item.variacao_nome} x{item.quantidade} ({loja_view._format_currency(item.valor_total)})'
             )
 
-        return JsonResponse({
+        payload = {
             'ok': True,
             'pedido_id': pedido.pk,
             'status': pedido.status,
@@ -9761,10 +9632,13 @@ class EventoPedidoStatusApiView(View):
             'cashback_desconto': loja_view._format_currency(
                 Decimal(getattr(pedido, 'cashback_desconto_valor', Decimal('0.00')) or Decimal('0.00'))
             ),
-            'qr_base64': pedido.mp_qr_code_base64,
-            'pix_code': pedido.mp_qr_code,
             'resumo_linhas': resumo_linhas,
-        })
+        }
+        # O polling so precisa do status; o codigo Pix vem apenas ao reabrir o pagamento.
+        if request.GET.get('pix') == '1':
+            payload['qr_image_url'] = pix_qr_url('loja', pedido)
+            payload['pix_code'] = pedido.mp_qr_code
+        return JsonResponse(payload)
 
 
 class EventoIndicacaoLookupApiView(View):
@@ -9880,7 +9754,7 @@ class PresencaView(LoginRequiredMixin, View):
     def _ordered_events(self):
         today = timezone.localdate()
         tomorrow = today + timedelta(days=1)
-        events = list(Evento.objects.select_related('created_by').all())
+        events = list(Evento.objects.select_related('created_by').for_listing())
 
         def _event_sort_key(evento):
             if evento.event_date == today:
@@ -9903,26 +9777,11 @@ class PresencaView(LoginRequiredMixin, View):
         events.sort(key=_event_sort_key)
         return events
 
-    def _presence_map(self, evento_id):
-        rows = EventoPresenca.objects.filter(evento_id=evento_id).select_related('updated_by')
-        data = {}
-        for row in rows:
-            data[str(row.aventureiro_id)] = {
-                'presente': bool(row.presente),
-                'updated_at': timezone.localtime(row.updated_at).isoformat(),
-                'updated_by': row.updated_by.username if row.updated_by else '',
-            }
-        return data
-
-    def _aventureiro_photo_url(self, av):
-        foto_url = av.foto.url if av.foto else ''
-        if foto_url:
-            return foto_url
-        ficha = getattr(av, 'ficha_completa', None)
-        inscricao_data = (ficha.inscricao_data if ficha else {}) or {}
-        inline_photo = str(inscricao_data.get('foto_3x4') or '').strip()
-        if inline_photo.startswith('data:image/'):
-            return inline_photo
+    def _aventureiro_photo_url(self, av, thumbnail='foto_miniatura'):
+        for field in (thumbnail, 'foto'):
+            image = getattr(av, field, None)
+            if image:
+                return image.url
         return ''
 
     def _falta_inscricao_payload(self, row):
@@ -9952,7 +9811,7 @@ class PresencaView(LoginRequiredMixin, View):
             aventureiros = list(
                 Aventureiro.objects
                 .filter(responsavel=responsavel)
-                .select_related('responsavel', 'responsavel__user', 'ficha_completa')
+                .only('id', 'nome', 'foto', 'foto_media')
                 .order_by('nome')
             )
 
@@ -9967,7 +9826,7 @@ class PresencaView(LoginRequiredMixin, View):
 
         aventureiro_cards = []
         for av in aventureiros:
-            foto_url = self._aventureiro_photo_url(av)
+            foto_url = self._aventureiro_photo_url(av, 'foto_media')
             eventos_status = []
             total_presentes = 0
             for row in event_rows:
@@ -10019,12 +9878,17 @@ class PresencaView(LoginRequiredMixin, View):
 
         aventureiros = list(
             Aventureiro.objects
-            .select_related('responsavel', 'responsavel__user', 'ficha_completa')
+            .select_related('responsavel', 'responsavel__user')
+            .only(
+                'id', 'nome', 'foto', 'foto_miniatura', 'foto_media',
+                'responsavel__responsavel_nome', 'responsavel__user__username',
+            )
             .order_by('nome')
         )
         for av in aventureiros:
             av.presenca_foto_url = self._aventureiro_photo_url(av)
-        presencas_map = self._presence_map(selected_event.id) if selected_event else {}
+            av.presenca_foto_ampliada_url = self._aventureiro_photo_url(av, 'foto_media')
+        presencas_map, presencas_version = presence_changes(selected_event.id) if selected_event else ({}, 0)
         present_count = sum(1 for value in presencas_map.values() if value.get('presente'))
         faltas_inscricao = []
         faltas_inscricao_json = []
@@ -10055,6 +9919,7 @@ class PresencaView(LoginRequiredMixin, View):
             'selected_event_row': selected_event_row,
             'aventureiros': aventureiros,
             'presencas_json': presencas_map,
+            'presencas_version': presencas_version,
             'present_count': present_count,
             'total_count': len(aventureiros),
             'faltas_inscricao': faltas_inscricao,
@@ -10071,28 +9936,45 @@ class PresencaStatusApiView(LoginRequiredMixin, View):
         event_id_raw = (request.GET.get('evento_id') or '').strip()
         if not event_id_raw.isdigit():
             return JsonResponse({'ok': False, 'error': 'Evento inválido.'}, status=400)
-        evento = Evento.objects.filter(pk=int(event_id_raw)).first()
+        evento = Evento.objects.filter(pk=int(event_id_raw)).only('id').first()
         if not evento:
             return JsonResponse({'ok': False, 'error': 'Evento não encontrado.'}, status=404)
 
-        rows = EventoPresenca.objects.filter(evento=evento).select_related('updated_by')
-        data = {}
-        for row in rows:
-            data[str(row.aventureiro_id)] = {
-                'presente': bool(row.presente),
-                'updated_at': timezone.localtime(row.updated_at).isoformat(),
-                'updated_by': row.updated_by.username if row.updated_by else '',
-            }
+        # Com `since` responde so as linhas alteradas depois dessa versao.
+        since_raw = (request.GET.get('since') or '').strip()
+        since = int(since_raw) if since_raw.isdigit() else None
+        data, version = presence_changes(evento.id, since)
 
         return JsonResponse({
             'ok': True,
             'evento_id': evento.id,
             'presencas': data,
-            'present_count': sum(1 for value in data.values() if value.get('presente')),
+            'version': version,
+            'delta': since is not None,
+            'present_count': count_present(evento.id),
             'server_time': timezone.localtime(timezone.now()).isoformat(),
         })
 
 
+class PresencaStreamApiView(LoginRequiredMixin, View):
+    def get(self, request):
+        if not _has_menu_permission(request, 'presenca'):
+            return JsonResponse({'ok': False, 'error': 'Sem permissão para acessar presença.'}, status=403)
+        event_id_raw = (request.GET.get('evento_id') or '').strip()
+        if not event_id_raw.isdigit() or not Evento.objects.filter(pk=int(event_id_raw)).exists():
+            return JsonResponse({'ok': False, 'error': 'Evento inválido.'}, status=400)
+
+        since_raw = (request.headers.get('Last-Event-ID') or request.GET.get('since') or '').strip()
+        since = int(since_raw) if since_raw.isdigit() else 0
+        response = StreamingHttpResponse(
+            presence_event_stream(int(event_id_raw), since),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
 class PresencaToggleApiView(LoginRequiredMixin, View):
     def post(self, request):
         if not _has_menu_permission(request, 'presenca'):
@@ -10114,15 +9996,7 @@ class PresencaToggleApiView(LoginRequiredMixin, View):
         if not evento or not aventureiro:
             return JsonResponse({'ok': False, 'error': 'Evento ou aventureiro não encontrado.'}, status=404)
 
-        presenca, _created = EventoPresenca.objects.update_or_create(
-            evento=evento,
-            aventureiro=aventureiro,
-            defaults={
-                'presente': presente_value,
-                'updated_by': request.user,
-            },
-        )
-        present_count = EventoPresenca.objects.filter(evento=evento, presente=True).count()
+        presenca = mark_presence(evento, aventureiro, presente_value, request.user)
         record_audit(
             action='Marcação de presença',
             user=request.user,
@@ -10141,27 +10015,82 @@ class PresencaToggleApiView(LoginRequiredMixin, View):
             'presente': bool(presenca.presente),
             'updated_at': timezone.localtime(presenca.updated_at).isoformat(),
             'updated_by': request.user.username,
-            'present_count': present_count,
+            'version': presenca.version,
+            'present_count': count_present(evento.id),
         })
 
 
-class PresencaFaltaInscricaoApiView(LoginRequiredMixin, View):
-    def _guard(self, request):
+class PresencaLoteApiView(LoginRequiredMixin, View):
+    """Recebe o diario de marcacoes feitas no aparelho (inclusive offline) e aplica de uma vez."""
+
+    def post(self, request):
         if not _has_menu_permission(request, 'presenca'):
-            return JsonResponse({'ok': False, 'error': 'Sem permissão para acessar presença.'}, status=403)
+            return JsonResponse({'ok': False, 'error': 'Sem permissão para marcar presença.'}, status=403)
         if _get_active_profile(request) == UserAccess.ROLE_RESPONSAVEL:
-            return JsonResponse({'ok': False, 'error': 'Perfil responsável não pode cadastrar falta de inscrição.'}, status=403)
-        return None
+            return JsonResponse({'ok': False, 'error': 'Perfil responsável possui acesso somente para consulta de presença.'}, status=403)
 
-    def _get_evento(self, event_id_raw):
-        if not str(event_id_raw or '').strip().isdigit():
-            return None
-        return Evento.objects.filter(pk=int(event_id_raw)).first()
+        try:
+            body = json.loads(request.body or '{}')
+        except Exception:
+            return JsonResponse({'ok': False, 'error': 'JSON inválido.'}, status=400)
+        if not isinstance(body, dict):
+            return JsonResponse({'ok': False, 'error': 'JSON inválido.'}, status=400)
+        event_id_raw = str(body.get('evento_id') or '').strip()
+        ops = body.get('ops')
+        if not event_id_raw.isdigit() or not isinstance(ops, list):
+            return JsonResponse({'ok': False, 'error': 'Parâmetros inválidos.'}, status=400)
+        if len(ops) > PRESENCA_BATCH_MAX_OPS:
+            return JsonResponse({'ok': False, 'error': f'Envie no máximo {PRESENCA_BATCH_MAX_OPS} marcações por vez.'}, status=400)
+        evento = Evento.objects.filter(pk=int(event_id_raw)).only('id', 'name').first()
+        if not evento:
+            return JsonResponse({'ok': False, 'error': 'Evento não encontrado.'}, status=404)
 
-    def _serialize_item(self, row):
-        created_at_local = timezone.localtime(row.created_at)
-        return {
-            'id': row.id,
+        results, touched, version, changed = apply_presence_ops(
+            evento,
+            [op for op in ops if isinstance(op, dict)],
+            request.user,
+        )
+        if changed:
+            presentes = sum(1 for item in touched.values() if item.get('presente'))
+            record_audit(
+                action='Marcação de presença em lote',
+                user=request.user,
+                request=request,
+                location='Presença',
+                details=(
+                    f'Evento="{evento.name}" | Operacoes={len(ops)} | Alteradas={changed} | '
+                    f'Presentes no lote={presentes}'
+                ),
+            )
+
+        return JsonResponse({
+            'ok': True,
+            'evento_id': evento.id,
+            'results': results,
+            'presencas': touched,
+            'delta': True,
+            'version': version,
+            'present_count': count_present(evento.id),
+        })
+
+
+class PresencaFaltaInscricaoApiView(LoginRequiredMixin, View):
+    def _guard(self, request):
+        if not _has_menu_permission(request, 'presenca'):
+            return JsonResponse({'ok': False, 'error': 'Sem permissão para acessar presença.'}, status=403)
+        if _get_active_profile(request) == UserAccess.ROLE_RESPONSAVEL:
+            return JsonResponse({'ok': False, 'error': 'Perfil responsável não pode cadastrar falta de inscrição.'}, status=403)
+        return None
+
+    def _get_evento(self, event_id_raw):
+        if not str(event_id_raw or '').strip().isdigit():
+            return None
+        return Evento.objects.filter(pk=int(event_id_raw)).first()
+
+    def _serialize_item(self, row):
+        created_at_local = timezone.localtime(row.created_at)
+        return {
+            'id': row.id,
             'nome': row.nome,
             'foto_url': row.foto.url if row.foto else '',
             'created_at': created_at_local.isoformat(),
@@ -10230,6 +10159,26 @@ class PresencaFaltaInscricaoApiView(LoginRequiredMixin, View):
 
 class AuditoriaView(LoginRequiredMixin, View):
     template_name = 'auditoria.html'
+    page_size = 200
+
+    @staticmethod
+    def _day_start(value, offset_days=0):
+        try:
+            day = date.fromisoformat(str(value or '').strip())
+        except ValueError:
+            return None
+        day += timedelta(days=offset_days)
+        return timezone.make_aware(datetime.combine(day, datetime_time.min))
+
+    @staticmethod
+    def _parse_cursor(value):
+        created_raw, _, id_raw = str(value or '').strip().partition('|')
+        created_at = parse_datetime(created_raw) if created_raw else None
+        if created_at is None or not id_raw.isdigit():
+            return None
+        if timezone.is_naive(created_at):
+            created_at = timezone.make_aware(created_at)
+        return created_at, int(id_raw)
 
     def get(self, request):
         if not _has_menu_permission(request, 'auditoria'):
@@ -10244,37 +10193,38 @@ class AuditoriaView(LoginRequiredMixin, View):
         method_filter = (request.GET.get('metodo') or '').strip().upper()
         date_from = (request.GET.get('data_inicio') or '').strip()
         date_to = (request.GET.get('data_fim') or '').strip()
-
-        logs = AuditLog.objects.select_related('user').all()
-
-        if query:
-            logs = logs.filter(
-                Q(username__icontains=query)
-                | Q(action__icontains=query)
-                | Q(location__icontains=query)
-                | Q(details__icontains=query)
-                | Q(path__icontains=query)
+        search_archive = request.GET.get('arquivo') == '1'
+        start_at = self._day_start(date_from)
+        end_at = self._day_start(date_to, offset_days=1)
+        cursor = self._parse_cursor(request.GET.get('antes'))
+
+        if search_archive:
+            page = search_audit_archive(
+                query=query,
+                usuario=user_query,
+                acao=action_filter,
+                onde=location_filter,
+                assunto=subject_filter,
+                metodo=method_filter,
+                start_at=start_at,
+                end_at=end_at,
+                before=cursor,
+                limit=self.page_size + 1,
             )
-        if user_query:
-            logs = logs.filter(username__icontains=user_query)
-        if action_filter:
-            logs = logs.filter(action=action_filter)
-        if location_filter:
-            logs = logs.filter(Q(location__icontains=location_filter) | Q(path__icontains=location_filter))
-        if subject_filter:
-            logs = logs.filter(
-                Q(details__icontains=subject_filter)
-                | Q(action__icontains=subject_filter)
-                | Q(location__icontains=subject_filter)
+        else:
+            page = self._database_page(
+                query, user_query, action_filter, location_filter, subject_filter, method_filter,
+                start_at, end_at, cursor,
             )
-        if method_filter:
-            logs = logs.filter(method=method_filter)
-        if date_from:
-            logs = logs.filter(created_at__date__gte=date_from)
-        if date_to:
-            logs = logs.filter(created_at__date__lte=date_to)
-
-        logs = logs.order_by('-created_at')[:500]
+        has_more = len(page) > self.page_size
+        logs = page[:self.page_size]
+        next_query = ''
+        if has_more and logs:
+            last = logs[-1]
+            last_at, last_id = (last['created_at'], last['id']) if search_archive else (last.created_at, last.id)
+            params = request.GET.copy()
+            params['antes'] = f'{last_at.isoformat()}|{last_id}'
+            next_query = params.urlencode()
         action_options = list(
             AuditLog.objects.exclude(action='').values_list('action', flat=True).distinct().order_by('action')[:200]
         )
@@ -10289,13 +10239,43 @@ class AuditoriaView(LoginRequiredMixin, View):
                 'metodo': method_filter,
                 'data_inicio': date_from,
                 'data_fim': date_to,
+                'arquivo': '1' if search_archive else '',
             },
+            'search_archive': search_archive,
             'action_options': action_options,
             'method_options': ['GET', 'POST', 'PUT', 'PATCH', 'DELETE'],
+            'is_paginated': cursor is not None,
+            'next_query': next_query,
         }
         context.update(_sidebar_context(request))
         return render(request, self.template_name, context)
 
+    def _database_page(self, query, user_query, action_filter, location_filter, subject_filter, method_filter,
+                       start_at, end_at, cursor):
+        logs = AuditLog.objects.all()
+
+        if query:
+            logs = logs.filter(audit_search_q(query, ('username', 'action', 'location', 'details', 'path')))
+        if user_query:
+            logs = logs.filter(audit_search_q(user_query, ('username',)))
+        if action_filter:
+            logs = logs.filter(action=action_filter)
+        if location_filter:
+            logs = logs.filter(audit_search_q(location_filter, ('location', 'path')))
+        if subject_filter:
+            logs = logs.filter(audit_search_q(subject_filter, ('details', 'action', 'location')))
+        if method_filter:
+            logs = logs.filter(method=method_filter)
+        # Intervalo em created_at (e nao created_at__date) para usar os indices.
+        if start_at is not None:
+            logs = logs.filter(created_at__gte=start_at)
+        if end_at is not None:
+            logs = logs.filter(created_at__lt=end_at)
+        if cursor is not None:
+            cursor_at, cursor_id = cursor
+            logs = logs.filter(Q(created_at__lt=cursor_at) | Q(created_at=cursor_at, id__lt=cursor_id))
+        return list(logs.order_by('-created_at', '-id')[:self.page_size + 1])
+
 
 class UsuariosView(LoginRequiredMixin, View):
     template_name = 'usuarios.html'
@@ -11160,7 +11140,7 @@ class WhatsAppView(LoginRequiredMixin, View):
                     failed_items.append(f'{aventureiro.nome}: codigo de indicacao ausente')
                     continue
 
-                pref, _ = WhatsAppPreference.objects.get_or_create(user=responsavel_user)
+                pref = get_whatsapp_preference(responsavel_user)
                 phone_number = normalize_phone_number(pref.phone_number or resolve_user_phone(responsavel_user))
                 if not phone_number:
                     failed_count += 1
@@ -11552,196 +11532,68 @@ class FinanceiroView(LoginRequiredMixin, View):
             ],
         }
 
-    def _send_whatsapp_cobranca_group(self, responsavel_id, aventureiro_id=None):
-        group = next(
-            (
-                item for item in self._cobranca_mensalidades_groups(aventureiro_id=aventureiro_id)
-                if str(item.get('responsavel_id')) == str(responsavel_id)
-            ),
-            None,
-        )
-        if not group:
-            return {
-                'ok': False,
-                'status': 'skipped',
-                'message': 'Nao ha mensalidades pendentes elegiveis para este responsavel.',
-                'sent_mensalidades': 0,
-                'failed_mensalidades': 0,
-            }
-
-        responsavel = group['responsavel']
-        responsavel_user = group['responsavel_user']
-        responsavel_nome = group['responsavel_nome']
-        if not responsavel_user:
-            return {
-                'ok': False,
-                'status': 'sem_usuario',
-                'message': 'Responsavel sem usuario vinculado.',
-                'responsavel_id': group['responsavel_id'],
-                'responsavel_nome': responsavel_nome,
-                'sent_mensalidades': 0,
-                'failed_mensalidades': 0,
-            }
-
-        WhatsAppPreference.objects.get_or_create(user=responsavel_user)
-        phone_number = group.get('phone_number') or ''
-        if not phone_number:
-            return {
-                'ok': False,
-                'status': 'sem_telefone',
-                'message': 'Responsavel sem telefone WhatsApp valido.',
-                'responsavel_id': group['responsavel_id'],
-                'responsavel_nome': responsavel_nome,
-                'sent_mensalidades': 0,
-                'failed_mensalidades': 0,
-            }
-
-        locked_items = []
-        claimed_at = None
-        with transaction.atomic():
-            locked_items = list(
-                MensalidadeAventureiro.objects
-                .select_for_update()
-                .filter(
-                    pk__in=(group.get('item_ids') or []),
-                    status=MensalidadeAventureiro.STATUS_PENDENTE,
-                    aventureiro__ativo=True,
-                    aventureiro__responsavel__ativo=True,
-                )
-                .select_related('aventureiro')
-                .order_by('aventureiro__nome', 'ano_referencia', 'mes_referencia')
-            )
-            if not locked_items:
-                return {
-                    'ok': False,
-                    'status': 'skipped',
-                    'message': 'As mensalidades deste responsavel nao estao mais pendentes.',
-                    'responsavel_id': group['responsavel_id'],
-                    'responsavel_nome': responsavel_nome,
-                    'sent_mensalidades': 0,
-                    'failed_mensalidades': 0,
-                }
-            claimed_at = timezone.now()
-            MensalidadeAventureiro.objects.filter(pk__in=[item.pk for item in locked_items]).update(
-                cobranca_whatsapp_enviada_at=claimed_at
-            )
-
-        hoje = timezone.localdate()
-        template = get_template_message(WhatsAppTemplate.TYPE_COBRANCA_MENSALIDADE)
-        total_em_aberto = sum((item.valor for item in locked_items), Decimal('0.00')).quantize(Decimal('0.01'))
+    def _cobranca_message_text(self, template, responsavel_nome, items, hoje):
+        total_em_aberto = sum((item.valor for item in items), Decimal('0.00')).quantize(Decimal('0.01'))
         itens_text = '\n'.join(
             f"- {item.aventureiro.nome} - {item.get_tipo_display()} - {self._month_label(item.mes_referencia)}/{item.ano_referencia} ({self._format_currency(item.valor)})"
-            for item in locked_items
+            for item in items
         )
-        message_text = render_message(template, {
-            'responsavel_nome': responsavel_nome or responsavel_user.username,
+        return render_message(template, {
+            'responsavel_nome': responsavel_nome,
             'mensalidades_em_aberto': itens_text,
             'valor_total_em_aberto': self._format_currency(total_em_aberto),
-            'quantidade_cobrancas': str(len(locked_items)),
+            'quantidade_cobrancas': str(len(items)),
             'mes_referencia': f'{self._month_label(hoje.month)}/{hoje.year}',
             'data_hora': timezone.localtime(timezone.now()).strftime('%d/%m/%Y %H:%M:%S'),
         })
 
-        queue_item = WhatsAppQueue.objects.create(
-            user=responsavel_user,
-            phone_number=phone_number,
-            notification_type=WhatsAppQueue.TYPE_COBRANCA_MENSALIDADE,
-            message_text=message_text,
-            status=WhatsAppQueue.STATUS_PENDING,
-        )
-        success, provider_id, error_message = send_wapi_text(phone_number, message_text)
-        queue_item.attempts = 1
-        if success:
-            queue_item.status = WhatsAppQueue.STATUS_SENT
-            queue_item.provider_message_id = provider_id
-            queue_item.sent_at = timezone.now()
-            queue_item.last_error = ''
-            queue_item.save(update_fields=['status', 'attempts', 'provider_message_id', 'sent_at', 'last_error'])
-            return {
-                'ok': True,
-                'status': 'sent',
-                'message': 'Enviado',
-                'responsavel_id': group['responsavel_id'],
-                'responsavel_nome': responsavel_nome,
-                'phone_number': phone_number,
-                'sent_mensalidades': len(locked_items),
-                'failed_mensalidades': 0,
-            }
-
-        queue_item.status = WhatsAppQueue.STATUS_FAILED
-        queue_item.last_error = error_message
-        queue_item.save(update_fields=['status', 'attempts', 'provider_message_id', 'sent_at', 'last_error'])
-        if claimed_at:
-            MensalidadeAventureiro.objects.filter(
-                pk__in=[item.pk for item in locked_items],
-                cobranca_whatsapp_enviada_at=claimed_at,
-            ).update(cobranca_whatsapp_enviada_at=None)
-        return {
-            'ok': False,
-            'status': 'failed',
-            'message': error_message or 'Falha no envio.',
-            'responsavel_id': group['responsavel_id'],
-            'responsavel_nome': responsavel_nome,
-            'phone_number': phone_number,
-            'sent_mensalidades': 0,
-            'failed_mensalidades': len(locked_items),
-        }
-
-    def _send_whatsapp_cobranca_mensalidades(self, pause_seconds=4, aventureiro_id=None):
+    def _start_cobranca_campanha(self, pause_seconds=4, aventureiro_id=None, user=None):
+        """Calcula os grupos uma vez e enfileira uma mensagem por responsavel na fila WhatsApp."""
         groups = self._cobranca_mensalidades_groups(aventureiro_id=aventureiro_id)
-        if not groups:
-            return {
-                'total_responsaveis': 0,
-                'total_mensalidades': 0,
-                'sent_responsaveis': 0,
-                'sent_mensalidades': 0,
-                'failed_responsaveis': 0,
-                'failed_mensalidades': 0,
-                'skipped_sem_usuario_responsaveis': 0,
-                'skipped_sem_telefone_responsaveis': 0,
-                'pause_seconds': int(pause_seconds),
-            }
-
-        total_mensalidades = sum(len(group.get('item_ids') or []) for group in groups)
-        sent_responsaveis = 0
-        sent_mensalidades = 0
-        failed_responsaveis = 0
-        failed_mensalidades = 0
-        skipped_sem_usuario_responsaveis = 0
-        skipped_sem_telefone_responsaveis = 0
-        skipped_sem_telefone_labels = []
-
-        pause_seconds = int(max(0, min(int(pause_seconds), 60)))
+        responsavel_users = [group['responsavel_user'] for group in groups if group['responsavel_user']]
+        existing_pref_ids = set(
+            WhatsAppPreference.objects
+            .filter(user__in=responsavel_users)
+            .values_list('user_id', flat=True)
+        )
+        WhatsAppPreference.objects.bulk_create(
+            [WhatsAppPreference(user=pref_user) for pref_user in {u.pk: u for u in responsavel_users}.values() if pref_user.pk not in existing_pref_ids],
+            ignore_conflicts=True,
+        )
 
+        hoje = timezone.localdate()
+        template = get_template_message(WhatsAppTemplate.TYPE_COBRANCA_MENSALIDADE)
+        entries = []
+        skipped_sem_usuario = 0
+        skipped_sem_telefone = []
         for group in groups:
-            result = self._send_whatsapp_cobranca_group(group.get('responsavel_id'), aventureiro_id=aventureiro_id)
-            if result.get('status') == 'sem_usuario':
-                skipped_sem_usuario_responsaveis += 1
-            elif result.get('status') == 'sem_telefone':
-                skipped_sem_telefone_responsaveis += 1
-                skipped_sem_telefone_labels.append(result.get('responsavel_nome') or '-')
-            elif result.get('ok'):
-                sent_responsaveis += 1
-                sent_mensalidades += int(result.get('sent_mensalidades') or 0)
-            elif result.get('status') == 'failed':
-                failed_responsaveis += 1
-                failed_mensalidades += int(result.get('failed_mensalidades') or 0)
-
-            if pause_seconds > 0:
-                time.sleep(pause_seconds)
+            responsavel_user = group['responsavel_user']
+            if not responsavel_user:
+                skipped_sem_usuario += 1
+                continue
+            if not group['phone_number']:
+                skipped_sem_telefone.append(group['responsavel_nome'] or '-')
+                continue
+            responsavel_nome = group['responsavel_nome'] or responsavel_user.username
+            entries.append({
+                'user': responsavel_user,
+                'phone_number': group['phone_number'],
+                'message_text': self._cobranca_message_text(template, responsavel_nome, group['items'], hoje),
+                'responsavel_nome': responsavel_nome,
+                'mensalidade_ids': group['item_ids'],
+                'total_em_aberto': group['total_em_aberto'],
+            })
 
-        return {
-            'total_responsaveis': len(groups),
-            'total_mensalidades': total_mensalidades,
-            'sent_responsaveis': sent_responsaveis,
-            'sent_mensalidades': sent_mensalidades,
-            'failed_responsaveis': failed_responsaveis,
-            'failed_mensalidades': failed_mensalidades,
-            'skipped_sem_usuario_responsaveis': skipped_sem_usuario_responsaveis,
-            'skipped_sem_telefone_responsaveis': skipped_sem_telefone_responsaveis,
-            'skipped_sem_telefone_labels': skipped_sem_telefone_labels[:10],
-            'pause_seconds': pause_seconds,
-        }
+        aventureiro_id_text = str(aventureiro_id or '').strip()
+        aventureiro = Aventureiro.objects.filter(pk=int(aventureiro_id_text)).first() if aventureiro_id_text.isdigit() else None
+        return create_campanha(
+            entries,
+            pause_seconds=int(max(0, min(int(pause_seconds), 60))),
+            aventureiro=aventureiro,
+            created_by=user,
+            skipped_sem_usuario=skipped_sem_usuario,
+            skipped_sem_telefone=skipped_sem_telefone,
+        )
 
     def _aventureiros(self):
         return list(
@@ -11763,12 +11615,12 @@ class FinanceiroView(LoginRequiredMixin, View):
             or os.getenv('MP_ACCESS_TOKEN', '').strip()
         )
 
-    def _mp_api_request(self, method, path, payload=None):
+    def _mp_api_request(self, method, path, payload=None, idempotency_key=''):
         token = self._mp_access_token()
         if not token:
             raise ValueError('MP_ACCESS_TOKEN_PROD não configurado no servidor.')
 
-        url = f'https://api.mercadopago.com{path}'
+        url = f"{getattr(settings, 'MP_API_BASE_URL', 'https://api.mercadopago.com').rstrip('/')}{path}"
         headers = {
             'Authorization': f'Bearer {token}',
             'Accept': 'application/json',
@@ -11776,52 +11628,44 @@ class FinanceiroView(LoginRequiredMixin, View):
         data = None
         if payload is not None:
             headers['Content-Type'] = 'application/json'
-            headers['X-Idempotency-Key'] = hashlib.sha256(os.urandom(16)).hexdigest()
+            headers['X-Idempotency-Key'] = idempotency_key or hashlib.sha256(os.urandom(16)).hexdigest()
             data = json.dumps(payload).encode('utf-8')
 
-        req = urllib_request.Request(url=url, data=data, headers=headers, method=method)
-        max_attempts = 2
-        for attempt in range(1, max_attempts + 1):
+        try:
+            response = mercadopago_client.request(
+                method,
+                url,
+                body=data,
+                headers=headers,
+                operation='mp_consulta' if method == 'GET' else 'mp_criacao',
+            )
+        except ProviderError as exc:
+            raise ValueError(f'Erro Mercado Pago: {exc}') from exc
+        if response.ok:
             try:
-                with urllib_request.urlopen(req, timeout=30) as response:
-                    body = response.read().decode('utf-8')
-                    return json.loads(body) if body else {}
-            except urllib_error.HTTPError as exc:
-                try:
-                    body = exc.read().decode('utf-8')
-                    details = json.loads(body) if body else {}
-                    message = (
-                        details.get('message')
-                        or details.get('error_description')
-                        or details.get('error')
-                        or body
-                        or str(exc)
-                    )
-                    causes = details.get('cause') or []
-                    if isinstance(causes, list) and causes:
-                        first_cause = causes[0] if isinstance(causes[0], dict) else {}
-                        cause_msg = first_cause.get('description') or first_cause.get('code') or ''
-                        if cause_msg and cause_msg not in message:
-                            message = f'{message} ({cause_msg})'
-                except Exception:
-                    message = str(exc)
-                raise ValueError(f'Erro Mercado Pago: {message}') from exc
-            except urllib_error.URLError as exc:
-                if attempt < max_attempts:
-                    time.sleep(0.4)
-                    continue
-                reason = getattr(exc, 'reason', '') or str(exc)
-                raise ValueError(f'Erro Mercado Pago: falha de conexão ({reason}).') from exc
-            except TimeoutError as exc:
-                if attempt < max_attempts:
-                    time.sleep(0.4)
-                    continue
-                raise ValueError('Erro Mercado Pago: tempo de resposta excedido.') from exc
-            except Exception as exc:
-                if attempt < max_attempts:
-                    time.sleep(0.4)
-                    continue
-                raise ValueError(f'Erro Mercado Pago: {exc}') from exc
+                return response.json()
+            except ValueError as exc:
+                raise ValueError('Erro Mercado Pago: resposta invalida.') from exc
+
+        body = response.text()
+        try:
+            details = json.loads(body) if body else {}
+            message = (
+                details.get('message')
+                or details.get('error_description')
+                or details.get('error')
+                or body
+                or f'HTTP {response.status}'
+            )
+            causes = details.get('cause') or []
+            if isinstance(causes, list) and causes:
+                first_cause = causes[0] if isinstance(causes[0], dict) else {}
+                cause_msg = first_cause.get('description') or first_cause.get('code') or ''
+                if cause_msg and cause_msg not in message:
+                    message = f'{message} ({cause_msg})'
+        except Exception:
+            message = body or f'HTTP {response.status}'
+        raise ValueError(f'Erro Mercado Pago: {message}')
 
     def _mp_notification_url(self, request):
         explicit = os.getenv('MP_NOTIFICATION_URL', '').strip()
@@ -11910,7 +11754,6 @@ class FinanceiroView(LoginRequiredMixin, View):
         status_detail = payment.get('status_detail') or ''
         tx_data = payment.get('point_of_interaction', {}).get('transaction_data', {})
         pix_code = tx_data.get('qr_code', '') or ''
-        qr_base64 = tx_data.get('qr_code_base64', '') or ''
 
         # Alguns retornos do MP chegam sem transaction_data completo na criação.
         # Tenta reconsultar o pagamento para recuperar o código Pix.
@@ -11921,7 +11764,6 @@ class FinanceiroView(LoginRequiredMixin, View):
                 status_detail = refreshed.get('status_detail') or status_detail
                 tx_data_refreshed = refreshed.get('point_of_interaction', {}).get('transaction_data', {})
                 pix_code = tx_data_refreshed.get('qr_code', '') or pix_code
-                qr_base64 = tx_data_refreshed.get('qr_code_base64', '') or qr_base64
             except Exception:
                 pass
 
@@ -11934,7 +11776,6 @@ class FinanceiroView(LoginRequiredMixin, View):
             'status': status,
             'status_detail': status_detail,
             'pix_code': pix_code,
-            'qr_base64': qr_base64,
         }
 
     def _mp_checkout_back_urls_mensalidade(self, request, pagamento):
@@ -12118,7 +11959,7 @@ class FinanceiroView(LoginRequiredMixin, View):
             'status': pagamento.status,
             'status_label': self._mp_status_label(pagamento),
             'valor_total': self._format_currency(valor_cobrado),
-            'qr_base64': pagamento.mp_qr_code_base64,
+            'qr_image_url': pix_qr_url('mensalidade', pagamento),
             'pix_code': pagamento.mp_qr_code,
         }
 
@@ -12167,55 +12008,27 @@ class FinanceiroView(LoginRequiredMixin, View):
         }
         message_text = render_message(get_template_message(WhatsAppTemplate.TYPE_FINANCEIRO), payload)
 
-        recipients = []
-        seen_phones = set()
-
-        def add_recipient(user, force_send=False):
-            pref, _ = WhatsAppPreference.objects.get_or_create(user=user)
-            phone_number = normalize_phone_number(pref.phone_number or resolve_user_phone(user))
-            if not phone_number or phone_number in seen_phones:
-                return
-            seen_phones.add(phone_number)
-            recipients.append((user, phone_number, force_send))
-
-        add_recipient(responsavel_user, force_send=True)
+        # Vai para a fila: varios pagamentos do mesmo responsavel aprovados na mesma
+        # sincronizacao saem numa mensagem so (agrupamento do worker).
+        fanout = NotificationFanout()
+        pref = get_whatsapp_preference(responsavel_user)
+        fanout.add(
+            responsavel_user.pk,
+            normalize_phone_number(pref.phone_number or resolve_user_phone(responsavel_user)),
+            WhatsAppQueue.TYPE_FINANCEIRO,
+            message_text,
+        )
         extras = (
             UserAccess.objects
-            .select_related('user')
             .filter(user__whatsapp_preference__notify_financeiro=True)
+            .exclude(user__whatsapp_preference__resolved_phone='')
+            .annotate(whatsapp_phone=F('user__whatsapp_preference__resolved_phone'))
+            .only('user')
             .order_by('user__username')
         )
         for access in extras:
-            add_recipient(access.user, force_send=False)
-
-        if not recipients:
-            return
-
-        sent_any = False
-        for user, phone_number, _force_send in recipients:
-            queue_item = WhatsAppQueue.objects.create(
-                user=user,
-                phone_number=phone_number,
-                notification_type=WhatsAppQueue.TYPE_FINANCEIRO,
-                message_text=message_text,
-                status=WhatsAppQueue.STATUS_PENDING,
-            )
-            success, provider_id, error_message = send_wapi_text(phone_number, message_text)
-            queue_item.attempts = 1
-            if success:
-                queue_item.status = WhatsAppQueue.STATUS_SENT
-                queue_item.provider_message_id = provider_id
-                queue_item.sent_at = timezone.now()
-                queue_item.last_error = ''
-                sent_any = True
-            else:
-                queue_item.status = WhatsAppQueue.STATUS_FAILED
-                queue_item.last_error = error_message
-            queue_item.save(
-                update_fields=['status', 'attempts', 'provider_message_id', 'sent_at', 'last_error']
-            )
-
-        if not sent_any and claimed_at:
+            fanout.add(access.user_id, access.whatsapp_phone, WhatsAppQueue.TYPE_FINANCEIRO, message_text)
+        if not fanout.enqueue() and claimed_at:
             PagamentoMensalidade.objects.filter(
                 pk=pagamento.pk,
                 whatsapp_notified_at=claimed_at,
@@ -12391,6 +12204,7 @@ class FinanceiroView(LoginRequiredMixin, View):
             'mensalidades': mensalidades,
             'valor_mensalidade': str(valor_mensalidade or '30'),
             'cobranca_pause_seconds': str(cobranca_pause_seconds or '4'),
+            'cobranca_campanha_ativa': active_campanha(),
             'resumo_ano': ano_resumo,
             'resumo_meses': [self._month_label(m)[:3] for m in range(1, 13)],
             'resumo_rows': list(resumo_rows_map.values()),
@@ -12478,13 +12292,15 @@ class FinanceiroView(LoginRequiredMixin, View):
             .filter(status=PagamentoMensalidade.STATUS_PAGO)
             .select_related('responsavel', 'responsavel__user')
             .prefetch_related('mensalidades', 'mensalidades__aventureiro')
+            .for_listing()
             .order_by('-paid_at', '-created_at')
         )
         pedidos_loja_pagos = list(
             LojaPedido.objects
             .filter(status=LojaPedido.STATUS_PAGO, transacao_teste=False)
-            .select_related('responsavel', 'responsavel__user', 'evento', 'evento_inscricao')
+            .select_related('responsavel', 'responsavel__user', 'evento')
             .prefetch_related('itens')
+            .for_listing('evento')
             .order_by('-paid_at', '-created_at')
         )
         pedido_evento_itens_total_map = {}
@@ -12527,6 +12343,7 @@ class FinanceiroView(LoginRequiredMixin, View):
                 | Q(cancelada=True, valor_estornado__gt=0)
             )
             .select_related('evento', 'user', 'responsavel', 'responsavel__user', 'cancelada_by')
+            .for_listing('evento', include_self=False)
             .order_by('-created_at')
         )
         comprovantes_qs = FinanceiroComprovante.objects.select_related('created_by').order_by('-created_at')
@@ -13049,6 +12866,10 @@ class FinanceiroView(LoginRequiredMixin, View):
                 'saldo_liquido_apos': self._format_currency(item.get('saldo_liquido_apos') or Decimal('0.00')),
             })
 
+        webhook_inbox = webhook_inbox_stats()
+        lag_seconds = webhook_inbox['lag_seconds']
+        webhook_inbox['lag_label'] = f'{lag_seconds // 60} min' if lag_seconds >= 60 else f'{lag_seconds}s'
+
         return {
             'relatorios_mensalidades_rows': mensalidades_rows,
             'relatorios_loja_rows': pedidos_loja_rows,
@@ -13088,9 +12909,11 @@ class FinanceiroView(LoginRequiredMixin, View):
             'relatorios_card_mensalidades_rows': relatorios_card_mensalidades_rows,
             'relatorios_card_loja_rows': relatorios_card_loja_rows,
             'relatorios_card_eventos_rows': relatorios_card_eventos_rows,
+            'relatorios_webhook_inbox': webhook_inbox,
+            'relatorios_provider_metrics': provider_metrics(),
         }
 
-    def _sync_loja_pagamentos_manual(self, days=None, max_items=None):
+    def _sync_loja_pagamentos_manual(self, days=None, max_items=None, mode=MODE_IDS, on_progress=None):
         from accounts.management.commands.sync_loja_pagamentos import Command as SyncLojaPagamentosCommand
 
         days_value = int(days or self.relatorios_sync_days_default)
@@ -13099,63 +12922,44 @@ class FinanceiroView(LoginRequiredMixin, View):
         max_items_value = max(1, min(max_items_value, 500))
 
         command = SyncLojaPagamentosCommand()
-        return command._run_once(days=days_value, max_items=max_items_value)
+        return command._run_once(days=days_value, max_items=max_items_value, mode=mode, on_progress=on_progress)
 
-    def _sync_mensalidades_pagamentos_manual(self, days=None, max_items=None):
+    def _sync_mensalidades_pagamentos_manual(self, days=None, max_items=None, mode=MODE_IDS, on_progress=None):
         days_value = int(days or self.relatorios_sync_days_default)
         max_items_value = int(max_items or self.relatorios_sync_max_items_default)
         days_value = max(1, min(days_value, 180))
         max_items_value = max(1, min(max_items_value, 1000))
         cutoff = timezone.now() - timedelta(days=days_value)
 
-        pagamentos_qs = (
-            PagamentoMensalidade.objects
-            .filter(
-                status__in=[PagamentoMensalidade.STATUS_PENDENTE, PagamentoMensalidade.STATUS_PROCESSANDO],
-                created_at__gte=cutoff,
-                mp_payment_id__isnull=False,
-            )
-            .exclude(mp_payment_id='')
-            .order_by('created_at', 'id')
+        pagamentos = pending_mensalidade_pagamentos(cutoff, max_items_value)
+        result = reconcile_payments(
+            pagamentos,
+            self._sync_pagamento_from_mp,
+            mode=mode,
+            since=cutoff,
+            on_progress=on_progress,
         )
-        pagamentos = list(pagamentos_qs[:max_items_value])
-        if not pagamentos:
-            return {
-                'checked': 0,
-                'changed': 0,
-                'approved_now': 0,
-                'failed': 0,
-            }
-
-        checked = 0
-        changed = 0
-        approved_now = 0
-        failed = 0
-
-        for pagamento in pagamentos:
-            checked += 1
-            previous_status = pagamento.status
-            try:
-                payment_data = self._get_mp_payment(str(pagamento.mp_payment_id or '').strip())
-                self._sync_pagamento_from_mp(pagamento, payment_data)
-                pagamento.refresh_from_db(fields=['status', 'paid_at'])
-                if pagamento.status != previous_status:
-                    changed += 1
-                if previous_status != PagamentoMensalidade.STATUS_PAGO and pagamento.status == PagamentoMensalidade.STATUS_PAGO:
-                    approved_now += 1
-            except Exception:
-                failed += 1
-
         return {
-            'checked': checked,
-            'changed': changed,
-            'approved_now': approved_now,
-            'failed': failed,
+            'checked': result['checked'],
+            'changed': result['changed'],
+            'approved_now': result['approved_now'],
+            'failed': result['failed'],
         }
 
-    def _sync_pagamentos_geral_manual(self, days=30, max_items=500):
-        loja_result = self._sync_loja_pagamentos_manual(days=days, max_items=max_items)
-        mensalidade_result = self._sync_mensalidades_pagamentos_manual(days=days, max_items=max_items)
+    def _sync_pagamentos_geral_manual(self, days=30, max_items=500, on_progress=None):
+        # Janela longa: uma busca paginada por data no MP no lugar de centenas de GETs por id.
+        loja_result = self._sync_loja_pagamentos_manual(
+            days=days,
+            max_items=max_items,
+            mode=MODE_SEARCH,
+            on_progress=(lambda data: on_progress('loja', data)) if on_progress else None,
+        )
+        mensalidade_result = self._sync_mensalidades_pagamentos_manual(
+            days=days,
+            max_items=max_items,
+            mode=MODE_SEARCH,
+            on_progress=(lambda data: on_progress('mensalidades', data)) if on_progress else None,
+        )
         return {
             'days': int(days),
             'max_items': int(max_items),
@@ -13297,7 +13101,8 @@ class FinanceiroView(LoginRequiredMixin, View):
                                     pagamento.mp_status = mp_payload['status']
                                     pagamento.mp_status_detail = mp_payload['status_detail']
                                     pagamento.mp_qr_code = mp_payload['pix_code']
-                                    pagamento.mp_qr_code_base64 = mp_payload['qr_base64']
+                                    # A imagem do QR e gerada sob demanda a partir do codigo (accounts/pix_qr.py).
+                                    pagamento.mp_qr_code_base64 = ''
                                     if mp_payload['status'] == 'approved':
                                         pagamento.status = PagamentoMensalidade.STATUS_PAGO
                                         pagamento.paid_at = timezone.now()
@@ -13352,6 +13157,7 @@ class FinanceiroView(LoginRequiredMixin, View):
             action = str(request.POST.get('action') or '').strip()
             comprovante_query = str(request.POST.get('comprovante_q') or '').strip()
             open_comprovante_modal = False
+            sync_job_id = ''
             destinos_validos = {choice[0] for choice in FinanceiroComprovante.DESTINO_CHOICES}
             if action == 'add_financeiro_comprovante':
                 nome = str(request.POST.get('comprovante_nome') or '').strip()
@@ -13386,50 +13192,27 @@ class FinanceiroView(LoginRequiredMixin, View):
                         messages.success(request, 'Destino do comprovante atualizado com sucesso.')
                     else:
                         messages.error(request, 'Comprovante nao encontrado.')
-            elif action == 'sync_loja_pagamentos_manual':
-                try:
-                    result = self._sync_loja_pagamentos_manual()
-                except Exception as exc:
-                    logger.exception('Falha na sincronizacao manual de pedidos da loja (financeiro).')
-                    messages.error(request, f'Falha ao sincronizar pagamentos da loja agora. {exc}')
-                else:
-                    messages.success(
-                        request,
-                        (
-                            'Sincronizacao concluida: '
-                            f"checados={result.get('checked', 0)} | "
-                            f"alterados={result.get('changed', 0)} | "
-                            f"pagos_agora={result.get('approved_now', 0)} | "
-                            f"cashback_reconciliados={result.get('cashback_reconciled', 0)} | "
-                            f"falhas={result.get('failed', 0)}"
+            elif action in {'sync_loja_pagamentos_manual', 'sync_pagamentos_geral_manual'}:
+                if action == 'sync_loja_pagamentos_manual':
+                    sync_job_id, sync_kind, started = start_sync_job(
+                        'loja',
+                        lambda progress: self._sync_loja_pagamentos_manual(
+                            on_progress=lambda data: progress('loja', data),
                         ),
                     )
-            elif action == 'sync_pagamentos_geral_manual':
-                try:
-                    result = self._sync_pagamentos_geral_manual(days=30, max_items=500)
-                except Exception as exc:
-                    logger.exception('Falha na sincronizacao manual geral de pagamentos (financeiro).')
-                    messages.error(request, f'Falha ao verificar pagamentos agora. {exc}')
                 else:
-                    loja = result.get('loja', {})
-                    mensalidades = result.get('mensalidades', {})
-                    messages.success(
-                        request,
-                        (
-                            'Verificacao geral concluida: '
-                            f"checados_total={result.get('checked_total', 0)} | "
-                            f"corrigidos_total={result.get('changed_total', 0)} | "
-                            f"pagos_agora_total={result.get('approved_now_total', 0)} | "
-                            f"falhas_total={result.get('failed_total', 0)} | "
-                            f"janela={result.get('days', 0)}d. "
-                            f"[Loja: checados={loja.get('checked', 0)}, alterados={loja.get('changed', 0)}, "
-                            f"pagos_agora={loja.get('approved_now', 0)}, falhas={loja.get('failed', 0)}] "
-                            f"[Mensalidades: checados={mensalidades.get('checked', 0)}, alterados={mensalidades.get('changed', 0)}, "
-                            f"pagos_agora={mensalidades.get('approved_now', 0)}, falhas={mensalidades.get('failed', 0)}]"
-                        ),
+                    sync_job_id, sync_kind, started = start_sync_job(
+                        'geral',
+                        lambda progress: self._sync_pagamentos_geral_manual(days=30, max_items=500, on_progress=progress),
                     )
+                sync_label = SYNC_JOB_LABELS.get(sync_kind, 'Verificacao de pagamentos')
+                if started:
+                    messages.info(request, f'{sync_label} iniciada. O progresso aparece abaixo.')
+                else:
+                    messages.info(request, f'{sync_label} ja estava em andamento. O progresso aparece abaixo.')
             context = self._relatorios_context(comprovante_query, open_comprovante_modal=open_comprovante_modal)
             context.update({
+                'relatorios_sync_job_id': sync_job_id,
                 'active_financeiro_tab': 'relatorios',
                 'show_financeiro_relatorios_tab': self._is_diretor_mode(request),
             })
@@ -13443,48 +13226,57 @@ class FinanceiroView(LoginRequiredMixin, View):
         if action == 'preview_cobranca_mensalidades':
             return JsonResponse(self._cobranca_mensalidades_preview_payload(aventureiro_id=cobranca_aventureiro_id))
 
-        if action == 'enviar_cobranca_mensalidade_responsavel':
-            responsavel_id = str(request.POST.get('responsavel_id') or '').strip()
-            if not responsavel_id:
-                return JsonResponse({'ok': False, 'status': 'invalid', 'message': 'Responsavel invalido.'}, status=400)
-            return JsonResponse(self._send_whatsapp_cobranca_group(responsavel_id, aventureiro_id=cobranca_aventureiro_id))
-
         if action == 'enviar_cobranca_mensalidades':
-            pause_seconds = self._parse_pause_seconds(pause_input, default_seconds=4)
-            try:
-                result = self._send_whatsapp_cobranca_mensalidades(
-                    pause_seconds=pause_seconds,
-                    aventureiro_id=cobranca_aventureiro_id,
-                )
-            except Exception:
-                logger.exception('Falha ao enviar cobranca automatica de mensalidades.')
-                messages.error(request, 'Nao foi possivel concluir o envio das cobrancas agora.')
+            is_ajax = request.headers.get('x-requested-with') == 'XMLHttpRequest'
+            campanha_atual = active_campanha()
+            if campanha_atual:
+                message = 'Ja existe uma cobranca em andamento. Pause, retome ou cancele a campanha atual.'
+                if is_ajax:
+                    return JsonResponse({
+                        'ok': False,
+                        'error': 'campanha_ativa',
+                        'message': message,
+                        'campanha_id': campanha_atual.pk,
+                    }, status=409)
+                messages.error(request, message)
             else:
-                if result.get('total_mensalidades', 0) <= 0:
-                    messages.info(
-                        request,
-                        'Nenhuma mensalidade pendente (mes atual e anteriores) foi encontrada.',
+                pause_seconds = self._parse_pause_seconds(pause_input, default_seconds=4)
+                try:
+                    campanha = self._start_cobranca_campanha(
+                        pause_seconds=pause_seconds,
+                        aventureiro_id=cobranca_aventureiro_id,
+                        user=request.user,
                     )
+                except Exception:
+                    logger.exception('Falha ao iniciar campanha de cobranca de mensalidades.')
+                    if is_ajax:
+                        return JsonResponse({
+                            'ok': False,
+                            'error': 'campanha_falhou',
+                            'message': 'Nao foi possivel iniciar o envio das cobrancas agora.',
+                        }, status=500)
+                    messages.error(request, 'Nao foi possivel iniciar o envio das cobrancas agora.')
                 else:
-                    sent = result.get('sent_responsaveis', 0)
-                    failed = result.get('failed_responsaveis', 0)
-                    resumo = (
-                        f"enviados={sent} | "
-                        f"mensalidades={result.get('sent_mensalidades', 0)} | "
-                        f"sem_telefone={result.get('skipped_sem_telefone_responsaveis', 0)} | "
-                        f"sem_usuario={result.get('skipped_sem_usuario_responsaveis', 0)} | "
-                        f"falhas={failed} | "
-                        f"pausa={result.get('pause_seconds', 0)}s"
-                    )
-                    if sent > 0:
-                        messages.success(request, f'Cobranca finalizada: {resumo}')
+                    if is_ajax:
+                        return JsonResponse(campanha_progress(campanha))
+                    if campanha.total_mensalidades <= 0:
+                        messages.info(
+                            request,
+                            'Nenhuma mensalidade pendente (mes atual e anteriores) com telefone valido foi encontrada.',
+                        )
                     else:
-                        messages.error(request, f'Nenhuma mensagem foi enviada (verifique configuracao do WhatsApp): {resumo}')
-                    sem_telefone_labels = result.get('skipped_sem_telefone_labels') or []
-                    if sem_telefone_labels:
+                        messages.success(
+                            request,
+                            f'Cobranca enfileirada: responsaveis={campanha.total_responsaveis} | '
+                            f'mensalidades={campanha.total_mensalidades} | '
+                            f'sem_telefone={campanha.skipped_sem_telefone} | '
+                            f'sem_usuario={campanha.skipped_sem_usuario} | '
+                            f'intervalo={campanha.pause_seconds}s',
+                        )
+                    if campanha.skipped_sem_telefone_nomes:
                         messages.warning(
                             request,
-                            'Responsaveis sem telefone WhatsApp valido: ' + ', '.join(sem_telefone_labels),
+                            'Responsaveis sem telefone WhatsApp valido: ' + ', '.join(campanha.skipped_sem_telefone_nomes[:10]),
                         )
         elif action == 'gerar_mensalidades':
             aventureiro = Aventureiro.objects.filter(pk=aventureiro_id).select_related('responsavel', 'responsavel__user').first()
@@ -13626,10 +13418,87 @@ class FinanceiroView(LoginRequiredMixin, View):
         return render(request, self.template_name, context)
 
 
+class FinanceiroSyncJobStatusApiView(LoginRequiredMixin, View):
+    def _summary(self, job):
+        result = job.get('result') or {}
+        if job.get('status') == 'failed':
+            return f"Falha ao verificar pagamentos agora. {job.get('message') or ''}".strip()
+        if job.get('kind') == 'loja':
+            return (
+                'Sincronizacao concluida: '
+                f"checados={result.get('checked', 0)} | "
+                f"alterados={result.get('changed', 0)} | "
+                f"pagos_agora={result.get('approved_now', 0)} | "
+                f"cashback_reconciliados={result.get('cashback_reconciled', 0)} | "
+                f"falhas={result.get('failed', 0)}"
+            )
+        loja = result.get('loja', {})
+        mensalidades = result.get('mensalidades', {})
+        return (
+            'Verificacao geral concluida: '
+            f"checados_total={result.get('checked_total', 0)} | "
+            f"corrigidos_total={result.get('changed_total', 0)} | "
+            f"pagos_agora_total={result.get('approved_now_total', 0)} | "
+            f"falhas_total={result.get('failed_total', 0)} | "
+            f"janela={result.get('days', 0)}d. "
+            f"[Loja: checados={loja.get('checked', 0)}, alterados={loja.get('changed', 0)}, "
+            f"pagos_agora={loja.get('approved_now', 0)}, falhas={loja.get('failed', 0)}] "
+            f"[Mensalidades: checados={mensalidades.get('checked', 0)}, alterados={mensalidades.get('changed', 0)}, "
+            f"pagos_agora={mensalidades.get('approved_now', 0)}, falhas={mensalidades.get('failed', 0)}]"
+        )
+
+    def get(self, request, job_id):
+        if not _has_menu_permission(request, 'financeiro') or not FinanceiroView()._is_diretor_mode(request):
+            return JsonResponse({'ok': False, 'error': 'forbidden'}, status=403)
+        job = get_sync_job(job_id)
+        if not job:
+            return JsonResponse({'ok': False, 'error': 'not_found'}, status=404)
+        return JsonResponse({
+            'ok': True,
+            'status': job.get('status'),
+            'progress': job.get('progress') or {},
+            'message': self._summary(job) if job.get('status') != 'running' else '',
+        })
+
+
+class FinanceiroCobrancaCampanhaApiView(LoginRequiredMixin, View):
+    actions = {
+        'pausar': pause_campanha,
+        'retomar': resume_campanha,
+        'cancelar': cancel_campanha,
+    }
+
+    def _allowed(self, request):
+        return _has_menu_permission(request, 'financeiro') and not FinanceiroView()._is_responsavel_mode(request)
+
+    def get(self, request, pk):
+        if not self._allowed(request):
+            return JsonResponse({'ok': False, 'error': 'forbidden'}, status=403)
+        campanha = get_object_or_404(CobrancaMensalidadeCampanha, pk=pk)
+        return JsonResponse(campanha_progress(campanha))
+
+    def post(self, request, pk):
+        if not self._allowed(request):
+            return JsonResponse({'ok': False, 'error': 'forbidden'}, status=403)
+        campanha = get_object_or_404(CobrancaMensalidadeCampanha, pk=pk)
+        action = self.actions.get(str(request.POST.get('acao') or '').strip())
+        if action is None:
+            return JsonResponse({'ok': False, 'error': 'invalid_action'}, status=400)
+        if not action(campanha):
+            payload = campanha_progress(campanha)
+            payload.update({
+                'ok': False,
+                'error': 'invalid_state',
+                'message': f'A campanha esta {campanha.get_status_display().lower()}.',
+            })
+            return JsonResponse(payload, status=409)
+        return JsonResponse(campanha_progress(campanha))
+
+
 class PagamentoMensalidadeStatusApiView(LoginRequiredMixin, View):
     def get(self, request, pk):
         pagamento = get_object_or_404(
-            PagamentoMensalidade.objects.select_related('responsavel', 'responsavel__user'),
+            PagamentoMensalidade.objects.for_listing().select_related('responsavel', 'responsavel__user'),
             pk=pk,
         )
         if not _has_menu_permission(request, 'financeiro'):
@@ -13644,7 +13513,11 @@ class PagamentoMensalidadeStatusApiView(LoginRequiredMixin, View):
         view = FinanceiroView()
         checked_mp = False
         check_error = ''
-        if pagamento.mp_payment_id and pagamento.status != PagamentoMensalidade.STATUS_PAGO:
+        if (
+            pagamento.mp_payment_id
+            and pagamento.status != PagamentoMensalidade.STATUS_PAGO
+            and claim_payment_refresh(pagamento.mp_payment_id)
+        ):
             try:
                 payment_data = view._get_mp_payment(pagamento.mp_payment_id)
                 view._sync_pagamento_from_mp(pagamento, payment_data)
@@ -13652,6 +13525,8 @@ class PagamentoMensalidadeStatusApiView(LoginRequiredMixin, View):
                 checked_mp = True
             except Exception as exc:
                 check_error = str(exc)
+            finally:
+                mark_payment_refreshed(pagamento.mp_payment_id, pagamento.created_at)
 
         return JsonResponse({
             'ok': not bool(check_error),
@@ -13668,6 +13543,8 @@ class PagamentoMensalidadeStatusApiView(LoginRequiredMixin, View):
 
 @method_decorator(csrf_exempt, name='dispatch')
 class PagamentoMensalidadeWebhookView(View):
+    inbox_source = MercadoPagoWebhookInbox.SOURCE_MENSALIDADE
+
     def _extract_payment_id(self, request):
         payment_id = request.GET.get('data.id') or request.GET.get('id')
         if payment_id:
@@ -13735,15 +13612,9 @@ class PagamentoMensalidadeWebhookView(View):
         if not self._is_valid_signature(request, payment_id):
             return JsonResponse({'ok': False, 'error': 'invalid_signature'}, status=403)
 
-        try:
-            synced, reason = self._sync_by_payment_id(payment_id)
-        except Exception:
-            return JsonResponse({'ok': False, 'error': 'payment_sync_failed'}, status=400)
-
-        if not synced:
-            return JsonResponse({'ok': True, 'ignored': reason})
-
-        return JsonResponse({'ok': True, 'payment_id': payment_id})
+        # So registra: a consulta ao MP e a baixa rodam no comando process_mp_webhooks.
+        _item, created = enqueue_webhook(self.inbox_source, payment_id, request.headers.get('x-request-id', ''))
+        return JsonResponse({'ok': True, 'payment_id': payment_id, 'queued': created})
 
 
 class PontosView(LoginRequiredMixin, View):
@@ -14609,10 +14480,13 @@ class LojaView(LoginRequiredMixin, View):
         return aventureiro, desconto, ''
 
     def _mp_client(self):
-        return FinanceiroView()
+        client = getattr(self, '_mp_finance_view', None)
+        if client is None:
+            client = self._mp_finance_view = FinanceiroView()
+        return client
 
-    def _mp_api_request(self, method, path, payload=None):
-        return self._mp_client()._mp_api_request(method, path, payload)
+    def _mp_api_request(self, method, path, payload=None, idempotency_key=''):
+        return self._mp_client()._mp_api_request(method, path, payload, idempotency_key=idempotency_key)
 
     def _get_mp_payment(self, payment_id):
         return self._mp_client()._get_mp_payment(payment_id)
@@ -14703,11 +14577,16 @@ class LojaView(LoginRequiredMixin, View):
         notification_url = self._mp_notification_url_loja(request)
         if notification_url:
             payload['notification_url'] = notification_url
-        payment = self._mp_api_request('POST', '/v1/payments', payload)
+        # Um pagamento Pix por pedido: nova tentativa do mesmo pedido devolve o pagamento ja criado.
+        payment = self._mp_api_request(
+            'POST',
+            '/v1/payments',
+            payload,
+            idempotency_key=f'{external_reference}-{int(pedido.created_at.timestamp())}',
+        )
         tx_data = payment.get('point_of_interaction', {}).get('transaction_data', {})
         pix_code = tx_data.get('qr_code', '') or ''
-        qr_base64 = tx_data.get('qr_code_base64', '') or ''
-        if not pix_code or not qr_base64:
+        if not pix_code:
             raise ValueError('Mercado Pago não retornou QR Code Pix para este pedido.')
         return {
             'payment_id': str(payment.get('id') or ''),
@@ -14715,7 +14594,6 @@ class LojaView(LoginRequiredMixin, View):
             'status': (payment.get('status') or '').lower(),
             'status_detail': payment.get('status_detail') or '',
             'pix_code': pix_code,
-            'qr_base64': qr_base64,
         }
 
     def _create_mp_checkout_preference_loja(self, request, pedido, *, installments=1):
@@ -15171,7 +15049,7 @@ class LojaView(LoginRequiredMixin, View):
         seen_phones = set()
 
         def add_recipient(user, target):
-            pref, _ = WhatsAppPreference.objects.get_or_create(user=user)
+            pref = get_whatsapp_preference(user)
             phone_number = normalize_phone_number(pref.phone_number or resolve_user_phone(user))
             if not phone_number or phone_number in seen_phones:
                 return
@@ -15239,7 +15117,7 @@ class LojaView(LoginRequiredMixin, View):
             'status_label': self._pedido_loja_status_label(pedido),
             'valor_total': self._format_currency(pedido.valor_total),
             'cashback_desconto': self._format_currency(cashback_desconto),
-            'qr_base64': pedido.mp_qr_code_base64,
+            'qr_image_url': pix_qr_url('loja', pedido),
             'pix_code': pedido.mp_qr_code,
         }
 
@@ -15333,6 +15211,7 @@ class LojaView(LoginRequiredMixin, View):
             .filter(evento__isnull=True, evento_inscricao__isnull=True)
             .select_related('responsavel', 'responsavel__user')
             .prefetch_related('itens')
+            .for_listing()
             .order_by('-created_at')
         )
         for pedido in pedidos_qs:
@@ -15391,6 +15270,7 @@ class LojaView(LoginRequiredMixin, View):
                     evento_inscricao__isnull=True,
                 )
                 .prefetch_related('itens')
+                .for_listing()
                 .order_by('-created_at')
             )
             for pedido in pedidos_qs:
@@ -16230,6 +16110,7 @@ class LojaRelatorioPedidosPagosPdfView(LoginRequiredMixin, View):
             )
             .select_related('responsavel', 'responsavel__user')
             .prefetch_related('responsavel__aventures', 'itens__variacao', 'itens__aventureiro')
+            .for_listing()
         )
         if selected_product_ids:
             pedidos_qs = pedidos_qs.filter(itens__produto_id__in=selected_product_ids).distinct()
@@ -16487,6 +16368,7 @@ class EventoRelatorioPdfView(LojaRelatorioPedidosPagosPdfView):
             .exclude(status=LojaPedido.STATUS_CANCELADO)
             .select_related('responsavel', 'responsavel__user')
             .prefetch_related('itens')
+            .for_listing()
             .order_by('paid_at', 'created_at', 'id')
         )
         custos_total = (
@@ -16534,41 +16416,22 @@ class EventoRelatorioPdfView(LojaRelatorioPedidosPagosPdfView):
                     'valor': valor_item,
                 })
 
-        config = getattr(evento, 'inscricao_valor_config', {}) or {}
-        if not isinstance(config, dict):
-            config = {}
-        repeat_field = str(config.get('repeat_field') or '').strip()
-        age_field = str(config.get('age_field') or '').strip()
-        ranges_raw = config.get('ranges') if isinstance(config.get('ranges'), list) else []
-        diretoria_value_raw = config.get('diretoria_value')
-        diretoria_value = None
-        if diretoria_value_raw not in {None, ''}:
-            try:
-                diretoria_value = Decimal(str(diretoria_value_raw or '0')).quantize(Decimal('0.01'))
-            except (TypeError, ValueError, InvalidOperation):
-                diretoria_value = None
-        faixa_rows = []
-        for item in ranges_raw:
-            if not isinstance(item, dict):
-                continue
-            try:
-                min_age = int(item.get('min'))
-                max_age = int(item.get('max'))
-                valor = Decimal(str(item.get('value') or '0')).quantize(Decimal('0.01'))
-            except (TypeError, ValueError, InvalidOperation):
-                continue
-            if max_age < min_age:
-                continue
-            faixa_rows.append({
-                'min': min_age,
-                'max': max_age,
-                'valor': valor,
-                'label': f'{min_age}-{max_age}',
+        tabela = compile_faixas_idade(getattr(evento, 'inscricao_valor_config', {}) or {})
+        # O relatorio casa a idade com as faixas em ordem crescente.
+        tabela = tabela.ordenada() if tabela is not None else None
+        diretoria_value = tabela.diretoria_value if tabela is not None else None
+        faixa_rows = [
+            {
+                'min': faixa['min'],
+                'max': faixa['max'],
+                'valor': faixa['value'],
+                'label': f"{faixa['min']}-{faixa['max']}",
                 'kids': [],
                 'quantidade': 0,
                 'valor_total': Decimal('0.00'),
-            })
-        faixa_rows = sorted(faixa_rows, key=lambda row: (row['min'], row['max']))
+            }
+            for faixa in (tabela.faixas if tabela is not None else ())
+        ]
         diretoria_row = {
             'min': None,
             'max': None,
@@ -16580,51 +16443,42 @@ class EventoRelatorioPdfView(LojaRelatorioPedidosPagosPdfView):
             'is_diretoria_summary': True,
         }
 
-        if repeat_field and age_field and faixa_rows:
-            for inscricao in inscricoes:
-                dados_obj = inscricao.dados if isinstance(inscricao.dados, dict) else {}
-                repeat_list = dados_obj.get(repeat_field)
-                if not isinstance(repeat_list, list):
+        if tabela is not None and tabela.configurada and faixa_rows:
+            nome_ignorar_keys = {
+                tabela.age_field_key,
+                helper._event_repeat_discount_field_key(evento),
+                helper._event_repeat_diretoria_field_key(evento),
+            }
+            linhas = precificar_linhas(
+                tabela,
+                inscricoes,
+                diretoria_key=helper._event_repeat_diretoria_field_key(evento),
+            )
+            for linha in linhas:
+                if linha['faixa'] is None:
                     continue
-                for idx, row in enumerate(repeat_list):
-                    if not isinstance(row, dict) or not helper._row_has_any_value(row):
+                nome = ''
+                for key, (normalized_key, roles) in classify_field_keys(tuple(linha['row'])).items():
+                    if normalized_key in nome_ignorar_keys:
                         continue
-                    age_text = helper._get_row_value_by_normalized_key(row, age_field)
-                    age_match = re.search(r'\d{1,3}', age_text)
-                    if not age_match:
+                    value_text = str(linha['row'].get(key) or '').strip()
+                    if not value_text:
                         continue
-                    age = int(age_match.group(0))
-                    is_diretoria = helper._row_is_diretoria_member(row, evento=evento)
-                    nome = ''
-                    for key, value in row.items():
-                        normalized_key = helper._normalize_lookup_text(key)
-                        if normalized_key in {
-                            helper._normalize_lookup_text(age_field),
-                            helper._event_repeat_discount_field_key(evento),
-                            helper._event_repeat_diretoria_field_key(evento),
-                        }:
-                            continue
-                        value_text = str(value or '').strip()
-                        if not value_text:
-                            continue
-                        if helper._is_nome_key(normalized_key) and not helper._is_responsavel_key(normalized_key):
-                            nome = value_text
-                            break
-                    if not nome:
-                        nome = f'Crianca {idx + 1}'
-                    for faixa in faixa_rows:
-                        if faixa['min'] <= age <= faixa['max']:
-                            target_row = diretoria_row if is_diretoria and diretoria_value is not None else faixa
-                            target_row['quantidade'] += 1
-                            target_row['valor_total'] = (
-                                target_row['valor_total'] + target_row['valor']
-                            ).quantize(Decimal('0.01'))
-                            target_row['kids'].append({
-                                'nome': nome,
-                                'idade': age,
-                                'valor': target_row['valor'],
-                            })
-                            break
+                    if 'nome' in roles and 'responsavel' not in roles:
+                        nome = value_text
+                        break
+                if not nome:
+                    nome = f"Crianca {linha['posicao'] + 1}"
+                faixa = faixa_rows[linha['faixa']]
+                target_row = diretoria_row if linha['is_diretoria'] and diretoria_value is not None else faixa
+                target_row['quantidade'] += 1
+                target_row['kids'].append({
+                    'nome': nome,
+                    'idade': linha['idade'],
+                    'valor': target_row['valor'],
+                })
+            for target_row in faixa_rows + [diretoria_row]:
+                target_row['valor_total'] = (target_row['valor'] * target_row['quantidade']).quantize(Decimal('0.01'))
             if diretoria_row['quantidade'] > 0:
                 faixa_rows.append(diretoria_row)
 
@@ -16865,6 +16719,9 @@ class EventoRelatorioPdfView(LojaRelatorioPedidosPagosPdfView):
 
 class LojaPedidoCreatePixApiView(LoginRequiredMixin, View):
     def post(self, request):
+        return run_idempotent_checkout(request, 'loja', lambda: self._create_pedido(request))
+
+    def _create_pedido(self, request):
         if not _has_menu_permission(request, 'loja'):
             return JsonResponse({'ok': False, 'error': 'forbidden'}, status=403)
         if _get_active_profile(request) not in {UserAccess.ROLE_RESPONSAVEL, UserAccess.ROLE_PROFESSOR}:
@@ -17083,10 +16940,7 @@ class LojaPedidoCreatePixApiView(LoginRequiredMixin, View):
                     else:
                         mp_payload = loja_view._create_mp_pix_payment_loja(request, pedido)
                         pedido.mp_qr_code = mp_payload['pix_code']
-                        pedido.mp_qr_code_base64 = mp_payload['qr_base64']
-                        pedido.save(update_fields=[
-                            'mp_qr_code', 'mp_qr_code_base64', 'updated_at',
-                        ])
+                        pedido.save(update_fields=['mp_qr_code', 'updated_at'])
                         loja_view._sync_pedido_loja_from_mp(pedido, {
                             'id': mp_payload['payment_id'],
                             'external_reference': mp_payload['external_reference'],
@@ -17134,7 +16988,7 @@ class LojaPedidoStatusApiView(LoginRequiredMixin, View):
         if not _has_menu_permission(request, 'loja'):
             return JsonResponse({'ok': False, 'error': 'forbidden'}, status=403)
         pedido = get_object_or_404(
-            LojaPedido.objects.select_related('responsavel', 'responsavel__user'),
+            LojaPedido.objects.for_listing().select_related('responsavel', 'responsavel__user'),
             pk=pk,
         )
         if _get_active_profile(request) in {UserAccess.ROLE_RESPONSAVEL, UserAccess.ROLE_PROFESSOR}:
@@ -17142,13 +16996,19 @@ class LojaPedidoStatusApiView(LoginRequiredMixin, View):
                 return JsonResponse({'ok': False, 'error': 'forbidden'}, status=403)
 
         loja_view = LojaView()
-        if pedido.mp_payment_id and pedido.status != LojaPedido.STATUS_PAGO:
+        if (
+            pedido.mp_payment_id
+            and pedido.status != LojaPedido.STATUS_PAGO
+            and claim_payment_refresh(pedido.mp_payment_id)
+        ):
             try:
                 payment_data = loja_view._get_mp_payment(pedido.mp_payment_id)
                 loja_view._sync_pedido_loja_from_mp(pedido, payment_data)
                 pedido.refresh_from_db()
             except Exception:
                 pass
+            finally:
+                mark_payment_refreshed(pedido.mp_payment_id, pedido.created_at)
 
         return JsonResponse({
             'ok': True,
@@ -17164,8 +17024,30 @@ class LojaPedidoStatusApiView(LoginRequiredMixin, View):
         })
 
 
+class PixQrCodeImageView(View):
+    """Imagem do QR Pix gerada sob demanda; o token assinado da URL substitui o login."""
+
+    def get(self, request, token):
+        obj = resolve_pix_qr_token(token)
+        if obj is None:
+            raise Http404
+        etag = f'"{token.rsplit(":", 1)[-1]}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponse(status=304)
+        else:
+            png = pix_qr_png(obj)
+            if not png:
+                raise Http404
+            response = HttpResponse(png, content_type='image/png')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, max-age=86400'
+        return response
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class LojaPedidoWebhookView(PagamentoMensalidadeWebhookView):
+    inbox_source = MercadoPagoWebhookInbox.SOURCE_LOJA
+
     def _sync_by_payment_id(self, payment_id):
         finance_view = FinanceiroView()
         payment_data = finance_view._get_mp_payment(payment_id)
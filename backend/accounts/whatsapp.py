@@ -1,16 +1,43 @@
+import hashlib
 import json
 import logging
 import os
+import random
 import re
-from datetime import datetime
-from urllib import error, request
-
-from django.db import transaction
+import string
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import close_old_connections, connection, connections, transaction
+from django.db.models import Count
 from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
-from .models import WhatsAppGatewayConfig, WhatsAppPreference, WhatsAppQueue, WhatsAppTemplate
+from .cobranca_campanhas import cobranca_pendente_para_envio, mark_cobranca_enviada
+from .http_client import ProviderError, TokenBucket, wapi_client
+from .models import (
+    WhatsAppGatewayConfig,
+    WhatsAppPreference,
+    WhatsAppQueue,
+    WhatsAppQueueContador,
+    WhatsAppTemplate,
+)
+from .whatsapp_cache import get_cached_whatsapp_data, invalidate_whatsapp_cache
+
+# Item em "enviando" ha mais que isso e de um worker que morreu: volta para a fila.
+WHATSAPP_STALE_CLAIM = timedelta(minutes=5)
+WHATSAPP_RETRY_MAX_DELAY = 60 * 60
+# Agrupamento antes da reserva: quantos itens vencidos olhar por rodada e no maximo
+# quantas mensagens juntar numa so. Mensagem de teste sempre sai sozinha.
+WHATSAPP_COALESCE_SCAN_LIMIT = 500
+WHATSAPP_COALESCE_MAX_ITEMS = 10
+WHATSAPP_COALESCE_SKIP_TYPES = {WhatsAppQueue.TYPE_TESTE}
+WHATSAPP_DIGEST_SEPARATOR = '\n\n---\n\n'
 
 DEFAULT_CADASTRO_MESSAGE = (
     '✨ Novo cadastro no Pinhal Junior!\n'
@@ -188,6 +215,11 @@ def normalize_phone_number(raw_phone):
 def resolve_user_phone(user):
     if hasattr(user, 'whatsapp_preference') and user.whatsapp_preference.phone_number:
         return user.whatsapp_preference.phone_number
+    return resolve_contact_phone(user)
+
+
+def resolve_contact_phone(user):
+    """Telefone do cadastro (diretoria ou responsavel), sem olhar a preferencia WhatsApp."""
     if hasattr(user, 'diretoria') and user.diretoria.whatsapp:
         return user.diretoria.whatsapp
     if hasattr(user, 'responsavel'):
@@ -204,8 +236,81 @@ def resolve_user_phone(user):
     return ''
 
 
+def get_whatsapp_preference(user):
+    """Preferencia WhatsApp do usuario, criada com os padroes se ainda nao existir.
+
+    Vem do cache em memoria (invalidado ao salvar): use apenas para leitura; para
+    alterar, busque a preferencia no banco.
+    """
+    preference = get_cached_whatsapp_data(
+        'preferencia',
+        user.pk,
+        lambda: WhatsAppPreference.objects.filter(user=user).first(),
+    )
+    if preference is None:
+        preference, _ = WhatsAppPreference.objects.get_or_create(user=user)
+    return preference
+
+
+def refresh_resolved_phone(user, preference=None):
+    """Recalcula `WhatsAppPreference.resolved_phone`, o numero ja normalizado usado no envio em lote."""
+    if preference is None:
+        preference = WhatsAppPreference.objects.filter(user=user).first()
+        if preference is None:
+            return
+    resolved_phone = normalize_phone_number(preference.phone_number or resolve_contact_phone(user))
+    if resolved_phone != preference.resolved_phone:
+        WhatsAppPreference.objects.filter(pk=preference.pk).update(resolved_phone=resolved_phone)
+        preference.resolved_phone = resolved_phone
+        invalidate_whatsapp_cache()
+
+
+class NotificationFanout:
+    """Junta as mensagens de um aviso e grava todas na fila num unico `bulk_create`.
+
+    Os itens sao montados em memoria e so entram na `WhatsAppQueue` depois do commit
+    da transacao atual; quem envia e o worker `process_whatsapp_queue`. Numeros
+    repetidos recebem apenas a primeira mensagem.
+    """
+
+    def __init__(self):
+        self.items = []
+        self.seen_phones = set()
+
+    def add(self, user_id, phone_number, notification_type, message_text):
+        if not phone_number or phone_number in self.seen_phones:
+            return False
+        self.seen_phones.add(phone_number)
+        self.items.append(WhatsAppQueue(
+            user_id=user_id,
+            phone_number=phone_number,
+            notification_type=notification_type,
+            message_text=message_text.strip(),
+            status=WhatsAppQueue.STATUS_PENDING,
+        ))
+        return True
+
+    def add_preferences(self, notify_field, notification_type, message_text):
+        """Adiciona, numa unica consulta, todos que ligaram o aviso `notify_field`."""
+        recipients = (
+            WhatsAppPreference.objects
+            .filter(**{notify_field: True})
+            .exclude(resolved_phone='')
+            .order_by('user__username')
+            .values_list('user_id', 'resolved_phone')
+        )
+        for user_id, phone_number in recipients:
+            self.add(user_id, phone_number, notification_type, message_text)
+
+    def enqueue(self):
+        items, self.items = self.items, []
+        if items:
+            transaction.on_commit(lambda: WhatsAppQueue.objects.bulk_create(items))
+        return len(items)
+
+
 def enqueue_notification(user, notification_type, message_text):
-    preference, _ = WhatsAppPreference.objects.get_or_create(user=user)
+    preference = get_whatsapp_preference(user)
     if not preference.enabled_for(notification_type):
         return None
 
@@ -224,13 +329,18 @@ def enqueue_notification(user, notification_type, message_text):
 
 def _gateway_config():
     try:
-        return WhatsAppGatewayConfig.objects.order_by('-updated_at').first()
+        return get_cached_whatsapp_data(
+            'gateway',
+            '',
+            lambda: WhatsAppGatewayConfig.objects.order_by('-updated_at').first(),
+        )
     except Exception:  # noqa: BLE001
         return None
 
 
-def _wapi_url():
-    gateway_config = _gateway_config()
+def _wapi_url(gateway_config=None):
+    if gateway_config is None:
+        gateway_config = _gateway_config()
     instance = str(
         (gateway_config.wapi_instance if gateway_config else '')
         or os.environ.get('WAPI_INSTANCE', '')
@@ -245,8 +355,8 @@ def _wapi_url():
 
 
 def send_wapi_text(phone_number, message_text):
-    url = _wapi_url()
     gateway_config = _gateway_config()
+    url = _wapi_url(gateway_config)
     token = str(
         (gateway_config.wapi_token if gateway_config else '')
         or os.environ.get('WAPI_TOKEN', '')
@@ -264,94 +374,406 @@ def send_wapi_text(phone_number, message_text):
         'phone': phone_number,
         'message': message_text,
     }).encode('utf-8')
-    req = request.Request(url=url, data=payload, method='POST')
-    req.add_header('Content-Type', 'application/json')
-    req.add_header('Authorization', f'Bearer {token}')
+    headers = {
+        'Content-Type': 'application/json',
+        'Authorization': f'Bearer {token}',
+    }
     try:
-        with request.urlopen(req, timeout=30) as response:
-            body = response.read().decode('utf-8', errors='ignore')
-            provider_id = ''
-            parsed = {}
-            try:
-                parsed = json.loads(body) if body else {}
-                provider_id = str(
-                    parsed.get('messageId')
-                    or parsed.get('id')
-                    or parsed.get('message', {}).get('id')
-                    or ''
-                )
-            except json.JSONDecodeError:
-                pass
-            # Verifica se a API retornou 200 mas com indicação de falha no body
-            api_success = parsed.get('success')
-            api_error = parsed.get('error') or parsed.get('message') if api_success is False else None
-            if api_success is False:
-                err_msg = str(api_error or 'API retornou success=false').strip()[:250]
-                logger.warning('W-API send_wapi_text success=false phone=%s body=%s', phone_number, body[:300])
-                return False, '', err_msg
-            if not provider_id and parsed.get('error'):
-                err_msg = str(parsed['error'])[:250]
-                logger.warning('W-API send_wapi_text error field phone=%s body=%s', phone_number, body[:300])
-                return False, '', err_msg
-            logger.debug('W-API send_wapi_text ok phone=%s messageId=%s', phone_number, provider_id)
-            return True, provider_id, ''
-    except error.HTTPError as exc:
-        body = exc.read().decode('utf-8', errors='ignore')
-        logger.warning('W-API HTTPError %s phone=%s body=%s', exc.code, phone_number, body[:250])
-        return False, '', f'HTTP {exc.code}: {body[:250]}'
-    except Exception as exc:  # noqa: BLE001
+        response = wapi_client.request('POST', url, body=payload, headers=headers, operation='wapi_envio')
+    except ProviderError as exc:
         logger.warning('W-API exception phone=%s exc=%s', phone_number, exc)
         return False, '', str(exc)
+    body = response.text()
+    if not response.ok:
+        logger.warning('W-API HTTPError %s phone=%s body=%s', response.status, phone_number, body[:250])
+        return False, '', f'HTTP {response.status}: {body[:250]}'
+    provider_id = ''
+    parsed = {}
+    try:
+        parsed = json.loads(body) if body else {}
+        if not isinstance(parsed, dict):
+            parsed = {}
+        provider_id = str(
+            parsed.get('messageId')
+            or parsed.get('id')
+            or parsed.get('message', {}).get('id')
+            or ''
+        )
+    except (json.JSONDecodeError, AttributeError):
+        pass
+    # Verifica se a API retornou 200 mas com indicação de falha no body
+    api_success = parsed.get('success')
+    api_error = parsed.get('error') or parsed.get('message') if api_success is False else None
+    if api_success is False:
+        err_msg = str(api_error or 'API retornou success=false').strip()[:250]
+        logger.warning('W-API send_wapi_text success=false phone=%s body=%s', phone_number, body[:300])
+        return False, '', err_msg
+    if not provider_id and parsed.get('error'):
+        err_msg = str(parsed['error'])[:250]
+        logger.warning('W-API send_wapi_text error field phone=%s body=%s', phone_number, body[:300])
+        return False, '', err_msg
+    logger.debug('W-API send_wapi_text ok phone=%s messageId=%s', phone_number, provider_id)
+    return True, provider_id, ''
+
+
+def _retry_delay(attempts):
+    base = float(getattr(settings, 'WHATSAPP_RETRY_BASE_SECONDS', 30))
+    return min(WHATSAPP_RETRY_MAX_DELAY, base * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+
+
+def _content_hash(text):
+    return hashlib.sha256(' '.join(str(text or '').split()).encode('utf-8')).hexdigest()
+
+
+def _drop_queue_item(item, target_id, reason):
+    return WhatsAppQueue.objects.filter(pk=item.pk, status=WhatsAppQueue.STATUS_PENDING).update(
+        status=WhatsAppQueue.STATUS_CANCELLED,
+        merged_into_id=target_id,
+        last_error=reason,
+    )
 
 
-@transaction.atomic
-def process_next_queue_item():
-    item = (
+def _merge_queue_bundle(bundle):
+    """Junta as mensagens no primeiro item do grupo; os demais ficam cancelados apontando para ele."""
+    if len(bundle) < 2:
+        return 0
+    primary = bundle[0]
+    digest = WHATSAPP_DIGEST_SEPARATOR.join(item.message_text.strip() for item in bundle)
+    with transaction.atomic():
+        updated = WhatsAppQueue.objects.filter(pk=primary.pk, status=WhatsAppQueue.STATUS_PENDING).update(
+            message_text=digest,
+        )
+        if not updated:
+            return 0
+        return sum(
+            _drop_queue_item(item, primary.pk, f'Agrupada na mensagem #{primary.pk}.')
+            for item in bundle[1:]
+        )
+
+
+def coalesce_pending_queue(now=None):
+    """Etapa de agrupamento da fila, rodada antes de cada reserva do worker.
+
+    Mensagens pendentes e vencidas do mesmo tipo para o mesmo numero, criadas dentro de
+    `WHATSAPP_COALESCE_WINDOW_SECONDS`, viram uma so (textos separados por `---`).
+    Conteudo identico a outra pendente ou a uma enviada dentro da janela e descartado.
+    Os itens absorvidos ficam `cancelled` com `merged_into` apontando para a mensagem
+    que saiu. Retorna quantos itens deixaram de ser enviados.
+    """
+    window_seconds = int(getattr(settings, 'WHATSAPP_COALESCE_WINDOW_SECONDS', 300))
+    if window_seconds <= 0:
+        return 0
+    now = now or timezone.now()
+    window = timedelta(seconds=window_seconds)
+    due = list(
         WhatsAppQueue.objects
-        .select_for_update(skip_locked=True)
-        .filter(status=WhatsAppQueue.STATUS_PENDING)
-        .order_by('created_at')
-        .first()
+        .filter(status=WhatsAppQueue.STATUS_PENDING, next_attempt_at__lte=now)
+        .exclude(notification_type__in=WHATSAPP_COALESCE_SKIP_TYPES)
+        .order_by('next_attempt_at', 'id')[:WHATSAPP_COALESCE_SCAN_LIMIT]
     )
-    if not item:
-        return None
+    if not due:
+        return 0
+    groups = {}
+    for item in due:
+        groups.setdefault((item.phone_number, item.notification_type), []).append(item)
+
+    sent_hashes = {}
+    recent_sent = (
+        WhatsAppQueue.objects
+        .filter(
+            status=WhatsAppQueue.STATUS_SENT,
+            phone_number__in={phone for phone, _type in groups},
+            sent_at__gte=now - window,
+        )
+        .values_list('id', 'phone_number', 'notification_type', 'message_text')
+    )
+    for sent_id, phone_number, notification_type, message_text in recent_sent:
+        sent_hashes.setdefault((phone_number, notification_type), {}).setdefault(_content_hash(message_text), sent_id)
+
+    dropped = 0
+    remarked = set()
+    for key, items in groups.items():
+        items.sort(key=lambda item: (item.created_at, item.pk))
+        sent = sent_hashes.get(key, {})
+        seen = {}
+        bundle = []
+        for item in items:
+            content_hash = _content_hash(item.message_text)
+            if content_hash in sent:
+                if _drop_queue_item(item, sent[content_hash], 'Mensagem identica ja enviada.'):
+                    dropped += 1
+                    remarked.add(sent[content_hash])
+                continue
+            if content_hash in seen:
+                dropped += _drop_queue_item(item, seen[content_hash], 'Mensagem duplicada.')
+                continue
+            if bundle and (
+                item.created_at - bundle[0].created_at > window
+                or len(bundle) >= WHATSAPP_COALESCE_MAX_ITEMS
+            ):
+                dropped += _merge_queue_bundle(bundle)
+                bundle = []
+            seen[content_hash] = bundle[0].pk if bundle else item.pk
+            bundle.append(item)
+        dropped += _merge_queue_bundle(bundle)
+
+    # Cobranca descartada por ja ter saido igual: as mensalidades dela contam como cobradas.
+    for sent_item in WhatsAppQueue.objects.filter(
+        pk__in=remarked,
+        notification_type=WhatsAppQueue.TYPE_COBRANCA_MENSALIDADE,
+    ):
+        mark_cobranca_enviada(sent_item)
+    if dropped:
+        logger.info('Fila WhatsApp: %s mensagens agrupadas ou descartadas como repetidas.', dropped)
+    return dropped
+
+
+def claim_queue_items(limit):
+    """Marca ate `limit` itens vencidos como "enviando" em transacoes curtas e os devolve.
+
+    O envio acontece fora de qualquer transacao; item preso em "enviando" (worker que
+    morreu no meio do envio) volta para a fila depois de `WHATSAPP_STALE_CLAIM`.
+    """
+    now = timezone.now()
+    WhatsAppQueue.objects.filter(
+        status=WhatsAppQueue.STATUS_PROCESSING,
+        claimed_at__lt=now - WHATSAPP_STALE_CLAIM,
+    ).update(status=WhatsAppQueue.STATUS_PENDING, claimed_at=None)
+    coalesce_pending_queue(now)
+    ids = list(
+        WhatsAppQueue.objects
+        .filter(status=WhatsAppQueue.STATUS_PENDING, next_attempt_at__lte=now)
+        .order_by('next_attempt_at', 'id')
+        .values_list('id', flat=True)[:limit]
+    )
+    if not ids:
+        return []
+    with transaction.atomic():
+        WhatsAppQueue.objects.filter(
+            id__in=ids,
+            status=WhatsAppQueue.STATUS_PENDING,
+        ).update(status=WhatsAppQueue.STATUS_PROCESSING, claimed_at=now)
+    return list(
+        WhatsAppQueue.objects
+        .filter(id__in=ids, status=WhatsAppQueue.STATUS_PROCESSING, claimed_at=now)
+        .order_by('next_attempt_at', 'id')
+    )
+
 
+def release_queue_item(item, delay_seconds=0):
+    """Devolve para a fila um item reservado e ainda nao enviado (sem contar tentativa)."""
+    item.status = WhatsAppQueue.STATUS_PENDING
+    item.claimed_at = None
+    item.next_attempt_at = timezone.now() + timedelta(seconds=max(0, delay_seconds))
+    item.save(update_fields=['status', 'claimed_at', 'next_attempt_at'])
+
+
+def deliver_queue_item(item):
+    max_attempts = max(1, int(getattr(settings, 'WHATSAPP_MAX_ATTEMPTS', 5)))
+    if item.notification_type == WhatsAppQueue.TYPE_COBRANCA_MENSALIDADE:
+        # A cobranca pode ter sido agendada minutos antes: confere o que ainda esta pendente.
+        message_text = cobranca_pendente_para_envio(item)
+        if message_text is None:
+            item.status = WhatsAppQueue.STATUS_CANCELLED
+            item.claimed_at = None
+            item.last_error = 'Mensalidades quitadas antes do envio.'
+            item.save(update_fields=['status', 'claimed_at', 'last_error'])
+            return item
+        if message_text != item.message_text:
+            item.message_text = message_text
+            item.save(update_fields=['message_text'])
     success, provider_id, error_message = send_wapi_text(item.phone_number, item.message_text)
     item.attempts += 1
+    item.claimed_at = None
     if success:
         item.status = WhatsAppQueue.STATUS_SENT
         item.provider_message_id = provider_id
         item.sent_at = timezone.now()
         item.last_error = ''
     else:
-        item.status = WhatsAppQueue.STATUS_FAILED
         item.last_error = error_message
-    item.save(update_fields=['status', 'attempts', 'provider_message_id', 'sent_at', 'last_error'])
+        if item.attempts >= max_attempts:
+            item.status = WhatsAppQueue.STATUS_FAILED
+        else:
+            item.status = WhatsAppQueue.STATUS_PENDING
+            item.next_attempt_at = timezone.now() + timedelta(seconds=_retry_delay(item.attempts))
+    item.save(update_fields=[
+        'status', 'attempts', 'provider_message_id', 'sent_at', 'last_error', 'next_attempt_at', 'claimed_at',
+    ])
+    if success and item.notification_type == WhatsAppQueue.TYPE_COBRANCA_MENSALIDADE:
+        mark_cobranca_enviada(item)
     return item
 
 
+def process_next_queue_item():
+    items = claim_queue_items(1)
+    if not items:
+        return None
+    return deliver_queue_item(items[0])
+
+
+class PhoneRateLimiter:
+    """Intervalo minimo entre mensagens para o mesmo numero (por processo)."""
+
+    def __init__(self, interval):
+        self.interval = max(0.0, float(interval))
+        self.next_allowed = {}
+        self.lock = threading.Lock()
+
+    def reserve(self, phone_number):
+        """Reserva o proximo envio do numero; retorna 0 ou quantos segundos faltam."""
+        with self.lock:
+            now = time.monotonic()
+            ready_at = self.next_allowed.get(phone_number, 0.0)
+            if ready_at > now:
+                return ready_at - now
+            self.next_allowed[phone_number] = now + self.interval
+            if len(self.next_allowed) > 5000:
+                self.next_allowed = {key: value for key, value in self.next_allowed.items() if value > now}
+            return 0.0
+
+
+def _deliver_in_thread(item):
+    close_old_connections()
+    try:
+        return deliver_queue_item(item)
+    finally:
+        connections.close_all()
+
+
+class WhatsAppQueueWorker:
+    """Envia a fila com `concurrency` envios simultaneos, limite global por segundo e
+    intervalo minimo por numero. `stop()` encerra sem cortar envios em andamento."""
+
+    def __init__(self, concurrency=None, rate=None, per_phone_interval=None, on_result=None):
+        self.concurrency = max(1, int(concurrency or getattr(settings, 'WHATSAPP_WORKER_CONCURRENCY', 4)))
+        self.bucket = TokenBucket(rate or getattr(settings, 'WHATSAPP_SEND_RATE', 1.0))
+        if per_phone_interval is None:
+            per_phone_interval = getattr(settings, 'WHATSAPP_PER_PHONE_INTERVAL', 10)
+        self.phones = PhoneRateLimiter(per_phone_interval)
+        self.on_result = on_result
+        self.stop_event = threading.Event()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _collect(self, futures, timeout):
+        done, pending = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                item = future.result()
+            except Exception:  # noqa: BLE001
+                logger.exception('Falha inesperada ao enviar item da fila WhatsApp.')
+                continue
+            if self.on_result:
+                self.on_result(item)
+        return pending, len(done)
+
+    def run(self, watch=False, idle_sleep=2.0, max_items=0):
+        dispatched = 0
+        finished = 0
+        inflight = set()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='whatsapp-send') as executor:
+            while not self.stop_event.is_set():
+                free = self.concurrency - len(inflight)
+                if max_items:
+                    free = min(free, max_items - dispatched)
+                claimed = claim_queue_items(free) if free > 0 else []
+                for index, item in enumerate(claimed):
+                    if self.stop_event.is_set():
+                        for rest in claimed[index:]:
+                            release_queue_item(rest)
+                        break
+                    delay = self.phones.reserve(item.phone_number)
+                    if delay > 0:
+                        release_queue_item(item, delay)
+                        continue
+                    self.bucket.acquire()
+                    inflight.add(executor.submit(_deliver_in_thread, item))
+                    dispatched += 1
+                if inflight:
+                    inflight, done_count = self._collect(inflight, timeout=0.5 if claimed else 1.0)
+                    finished += done_count
+                    continue
+                if max_items and dispatched >= max_items:
+                    break
+                if not claimed:
+                    if not watch:
+                        break
+                    self.stop_event.wait(idle_sleep)
+            while inflight:
+                inflight, done_count = self._collect(inflight, timeout=None)
+                finished += done_count
+        return finished
+
+
+def queue_status_counts():
+    """Total de itens da fila por status.
+
+    No SQLite le a tabela de contadores mantida por triggers (tempo constante); nos
+    outros bancos faz um unico COUNT agrupado por status.
+    """
+    if connection.vendor == 'sqlite':
+        return dict(WhatsAppQueueContador.objects.values_list('status', 'total'))
+    return dict(
+        WhatsAppQueue.objects
+        .order_by()
+        .values('status')
+        .annotate(total=Count('id'))
+        .values_list('status', 'total')
+    )
+
+
 def queue_stats():
+    counts = queue_status_counts()
     return {
-        'pending': WhatsAppQueue.objects.filter(status=WhatsAppQueue.STATUS_PENDING).count(),
-        'sent': WhatsAppQueue.objects.filter(status=WhatsAppQueue.STATUS_SENT).count(),
-        'failed': WhatsAppQueue.objects.filter(status=WhatsAppQueue.STATUS_FAILED).count(),
+        'pending': counts.get(WhatsAppQueue.STATUS_PENDING, 0) + counts.get(WhatsAppQueue.STATUS_PROCESSING, 0),
+        'sent': counts.get(WhatsAppQueue.STATUS_SENT, 0),
+        'failed': counts.get(WhatsAppQueue.STATUS_FAILED, 0),
         # Exibe o horario no fuso do Django (America/Sao_Paulo) para bater com o painel.
         'updated_at': timezone.localtime(timezone.now()).strftime('%d/%m/%Y %H:%M:%S'),
     }
 
 
-def render_message(template, payload):
-    class SafePayload(dict):
-        def __missing__(self, key):
-            return ''
+class _SafePayload(dict):
+    def __missing__(self, key):
+        return ''
+
+
+@lru_cache(maxsize=128)
+def compile_template(base):
+    """Pre-processa os placeholders do template uma unica vez.
+
+    Retorna a lista de pares `(texto literal, nome do campo)` quando o template so
+    usa campos simples (`{nome}`); `None` quando usa indice, atributo, conversao ou
+    formato, que seguem pelo `format_map`. Levanta `ValueError` para chaves
+    desbalanceadas, como o proprio `format_map`.
+    """
+    parts = []
+    for literal, field_name, format_spec, conversion in string.Formatter().parse(base):
+        if field_name is None:
+            parts.append((literal, None))
+            continue
+        if format_spec or conversion or not field_name.isidentifier():
+            return None
+        parts.append((literal, field_name))
+    return tuple(parts)
+
 
+def render_message(template, payload):
     base = (template or '').strip() or DEFAULT_CADASTRO_MESSAGE
-    safe_payload = SafePayload({
+    safe_payload = _SafePayload({
         key: '' if value is None else value
         for key, value in (payload or {}).items()
     })
     try:
-        return base.format_map(safe_payload)
+        parts = compile_template(base)
+        if parts is None:
+            return base.format_map(safe_payload)
+        return ''.join(
+            literal if field_name is None else literal + format(safe_payload[field_name], '')
+            for literal, field_name in parts
+        )
     except Exception:  # noqa: BLE001
         return base
 
@@ -372,11 +794,15 @@ def get_template_message(notification_type):
         WhatsAppTemplate.TYPE_INDICACAO_CODIGO: DEFAULT_INDICACAO_CODIGO_MESSAGE,
     }
     default_message = defaults.get(notification_type, DEFAULT_TESTE_MESSAGE)
-    template, _ = WhatsAppTemplate.objects.get_or_create(
-        notification_type=notification_type,
-        defaults={'message_text': default_message},
-    )
-    if not (template.message_text or '').strip():
-        template.message_text = default_message
-        template.save(update_fields=['message_text', 'updated_at'])
-    return template.message_text
+
+    def _load():
+        template, _ = WhatsAppTemplate.objects.get_or_create(
+            notification_type=notification_type,
+            defaults={'message_text': default_message},
+        )
+        if not (template.message_text or '').strip():
+            template.message_text = default_message
+            template.save(update_fields=['message_text', 'updated_at'])
+        return template.message_text
+
+    return get_cached_whatsapp_data('template', notification_type, _load)
@@ -0,0 +1,71 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+WHATSAPP_VERSION_KEY = 'accounts:whatsapp:versao'
+# Cada processo confere a versao compartilhada no maximo uma vez nesse intervalo;
+# uma alteracao salva no proprio processo vale na hora.
+WHATSAPP_VERSION_CHECK_SECONDS = 5
+WHATSAPP_CACHE_MAX_ENTRIES = 5000
+
+_MISSING = object()
+_lock = threading.Lock()
+_state = {'version': None, 'checked_at': 0.0, 'data': {}}
+
+
+def whatsapp_cache_version():
+    # Mesmo esquema do cache de permissoes: a versao fica no cache compartilhado
+    # (arquivo), entao todos os workers do gunicorn e o worker da fila enxergam a
+    # mesma invalidacao.
+    version = cache.get(WHATSAPP_VERSION_KEY)
+    if version is None:
+        cache.add(WHATSAPP_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(WHATSAPP_VERSION_KEY) or 0
+    return version
+
+
+def _local_data():
+    now = time.monotonic()
+    with _lock:
+        if _state['version'] is not None and now - _state['checked_at'] < WHATSAPP_VERSION_CHECK_SECONDS:
+            return _state['data']
+    version = whatsapp_cache_version()
+    with _lock:
+        if version != _state['version']:
+            # Troca o dicionario em vez de limpar: quem estava montando um valor
+            # com dados antigos grava no dicionario descartado.
+            _state['version'] = version
+            _state['data'] = {}
+        _state['checked_at'] = now
+        return _state['data']
+
+
+def _bump_whatsapp_cache_version():
+    cache.set(WHATSAPP_VERSION_KEY, time.time_ns(), None)
+    with _lock:
+        _state['version'] = None
+        _state['data'] = {}
+
+
+def invalidate_whatsapp_cache():
+    # So invalida depois do commit para nenhum processo recarregar dados antigos.
+    transaction.on_commit(_bump_whatsapp_cache_version)
+
+
+def get_cached_whatsapp_data(name, key, builder):
+    """Valor em memoria do processo, descartado quando a versao compartilhada muda.
+
+    O valor devolvido e compartilhado entre threads: trate como somente leitura.
+    """
+    data = _local_data()
+    cache_key = (name, key)
+    value = data.get(cache_key, _MISSING)
+    if value is _MISSING:
+        value = builder()
+        with _lock:
+            if len(data) >= WHATSAPP_CACHE_MAX_ENTRIES:
+                data.clear()
+            data[cache_key] = value
+    return value
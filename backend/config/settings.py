@@ -98,6 +98,74 @@ if _database_url:
 elif _sqlite_path:
     DATABASES['default']['NAME'] = _sqlite_path
 
+# Cache em arquivo: compartilhado entre os workers do gunicorn no mesmo servidor.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('DJANGO_CACHE_DIR', '').strip() or str(BASE_DIR / 'cache'),
+    }
+}
+
+# Auditoria gravada em lote fora da requisicao (ver accounts/audit.py).
+AUDIT_LOG_ASYNC = _env_bool('DJANGO_AUDIT_LOG_ASYNC', True)
+AUDIT_LOG_BATCH_SIZE = int(os.environ.get('DJANGO_AUDIT_LOG_BATCH_SIZE', '50'))
+AUDIT_LOG_FLUSH_INTERVAL = float(os.environ.get('DJANGO_AUDIT_LOG_FLUSH_INTERVAL', '2'))
+AUDIT_LOG_MAX_QUEUE = int(os.environ.get('DJANGO_AUDIT_LOG_MAX_QUEUE', '5000'))
+AUDIT_LOG_SPILL_DIR = Path(os.environ.get('DJANGO_AUDIT_LOG_SPILL_DIR')) if os.environ.get('DJANGO_AUDIT_LOG_SPILL_DIR') else BASE_DIR / 'audit_spill'
+
+# Retencao: linhas mais antigas vao para arquivos mensais JSONL.gz (comando arquivar_dados_antigos).
+RETENTION_ARCHIVE_DIR = Path(os.environ.get('DJANGO_RETENTION_ARCHIVE_DIR')) if os.environ.get('DJANGO_RETENTION_ARCHIVE_DIR') else BASE_DIR / 'archive'
+AUDIT_LOG_RETENTION_DAYS = int(os.environ.get('DJANGO_AUDIT_LOG_RETENTION_DAYS', '365'))
+WHATSAPP_QUEUE_RETENTION_DAYS = int(os.environ.get('DJANGO_WHATSAPP_QUEUE_RETENTION_DAYS', '180'))
+
+# Busca de inscricoes (migration 0108): sem FTS5 trigram (SQLite) ou pg_trgm (Postgres)
+# a migration falha, a menos que se aceite a busca por LIKE (mais lenta) com esta opcao.
+EVENTO_BUSCA_PERMITIR_SEM_INDICE = _env_bool('DJANGO_EVENTO_BUSCA_PERMITIR_SEM_INDICE', False)
+
+# Presenca em tempo real (SSE): cada stream ocupa uma thread do worker por ate N segundos.
+# Desligado por padrao: com workers sync cada stream prende um worker inteiro; ligar so
+# com gunicorn em gthread. Parado, o stream confere a versao no cache com espera crescente
+# ate PRESENCA_STREAM_MAX_WAIT segundos.
+PRESENCA_STREAM_ENABLED = _env_bool('DJANGO_PRESENCA_STREAM_ENABLED', False)
+PRESENCA_STREAM_SECONDS = float(os.environ.get('DJANGO_PRESENCA_STREAM_SECONDS', '25'))
+PRESENCA_STREAM_MAX_WAIT = float(os.environ.get('DJANGO_PRESENCA_STREAM_MAX_WAIT', '5'))
+PRESENCA_STREAM_MAX_PER_WORKER = int(os.environ.get('DJANGO_PRESENCA_STREAM_MAX_PER_WORKER', '4'))
+
+# Clientes HTTP do Mercado Pago e da W-API (ver accounts/http_client.py).
+# MP_API_BASE_URL pode apontar para um servidor local de testes.
+MP_API_BASE_URL = os.environ.get('DJANGO_MP_API_BASE_URL', '').strip() or 'https://api.mercadopago.com'
+PROVIDER_HTTP_TIMEOUTS = {
+    'mp_consulta': float(os.environ.get('DJANGO_MP_TIMEOUT_CONSULTA', '10')),
+    'mp_criacao': float(os.environ.get('DJANGO_MP_TIMEOUT_CRIACAO', '20')),
+    'wapi_envio': float(os.environ.get('DJANGO_WAPI_TIMEOUT_ENVIO', '15')),
+}
+PROVIDER_CIRCUIT_FAILURES = int(os.environ.get('DJANGO_PROVIDER_CIRCUIT_FAILURES', '5'))
+PROVIDER_CIRCUIT_RESET_SECONDS = float(os.environ.get('DJANGO_PROVIDER_CIRCUIT_RESET_SECONDS', '30'))
+
+# Polling de status do Mercado Pago: uma consulta por pagamento por vez (ver accounts/mp_status.py).
+# Deve cobrir o pior caso de uma consulta ao MP (timeout + novas tentativas).
+MP_STATUS_LOCK_SECONDS = int(os.environ.get('DJANGO_MP_STATUS_LOCK_SECONDS', '70'))
+# Webhooks do MP vao para uma caixa de entrada processada por process_mp_webhooks.
+MP_WEBHOOK_MAX_ATTEMPTS = int(os.environ.get('DJANGO_MP_WEBHOOK_MAX_ATTEMPTS', '8'))
+# Reconciliacao com o MP (sync_loja_pagamentos e verificacao manual do financeiro).
+MP_RECONCILE_CONCURRENCY = int(os.environ.get('DJANGO_MP_RECONCILE_CONCURRENCY', '6'))
+MP_RECONCILE_RATE = float(os.environ.get('DJANGO_MP_RECONCILE_RATE', '10'))
+
+# Worker da fila WhatsApp (process_whatsapp_queue --watch): envios simultaneos, limite global
+# por segundo, intervalo minimo por numero e novas tentativas com espera crescente.
+WHATSAPP_WORKER_CONCURRENCY = int(os.environ.get('DJANGO_WHATSAPP_WORKER_CONCURRENCY', '4'))
+WHATSAPP_SEND_RATE = float(os.environ.get('DJANGO_WHATSAPP_SEND_RATE', '1'))
+WHATSAPP_PER_PHONE_INTERVAL = float(os.environ.get('DJANGO_WHATSAPP_PER_PHONE_INTERVAL', '10'))
+WHATSAPP_MAX_ATTEMPTS = int(os.environ.get('DJANGO_WHATSAPP_MAX_ATTEMPTS', '5'))
+WHATSAPP_RETRY_BASE_SECONDS = float(os.environ.get('DJANGO_WHATSAPP_RETRY_BASE_SECONDS', '30'))
+# Mensagens pendentes do mesmo tipo para o mesmo numero criadas dentro dessa janela saem
+# numa so; repetidas (mesmo conteudo) sao descartadas. 0 desliga o agrupamento.
+WHATSAPP_COALESCE_WINDOW_SECONDS = int(os.environ.get('DJANGO_WHATSAPP_COALESCE_WINDOW_SECONDS', '300'))
+
+# QR do Pix gerado sob demanda a partir do codigo copia e cola (ver accounts/pix_qr.py).
+PIX_QR_CACHE_DIR = Path(os.environ.get('DJANGO_PIX_QR_CACHE_DIR')) if os.environ.get('DJANGO_PIX_QR_CACHE_DIR') else BASE_DIR / 'pix_qr_cache'
+PIX_QR_MEMORY_ITEMS = int(os.environ.get('DJANGO_PIX_QR_MEMORY_ITEMS', '128'))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -6,6 +6,7 @@ umask 027
 # - puxa a ultima versao do git
 # - instala dependencias
 # - roda check/migrate/collectstatic
+# - instala/atualiza as units dos workers (webhooks MP e fila WhatsApp)
 # - reinicia servicos
 # - valida healthcheck
 # - rollback automatico em caso de falha
@@ -14,6 +15,10 @@ APP_DIR="${APP_DIR:-/srv/sitepinhal/current}"
 VENV_DIR="${VENV_DIR:-/srv/sitepinhal/venv}"
 ENV_FILE="${ENV_FILE:-/etc/sitepinhal.env}"
 SERVICE_NAME="${SERVICE_NAME:-sitepinhal}"
+# Workers em segundo plano: a confirmacao dos webhooks do MP e todos os envios de
+# WhatsApp dependem deles, entao sobem e voltam junto com a aplicacao.
+WORKER_SERVICES="${WORKER_SERVICES:-sitepinhal-webhooks sitepinhal-whatsapp}"
+SYSTEMD_DIR="${SYSTEMD_DIR:-/etc/systemd/system}"
 NGINX_SERVICE="${NGINX_SERVICE:-nginx}"
 REMOTE_NAME="${REMOTE_NAME:-origin}"
 BRANCH_NAME="${BRANCH_NAME:-main}"
@@ -44,6 +49,35 @@ require_cmd() {
   command -v "$1" >/dev/null 2>&1 || die "Comando obrigatorio nao encontrado: $1"
 }
 
+# Copia as units de deploy/ do codigo atual para o systemd e as habilita.
+# Unit que nao existe nessa versao do codigo e parada e removida.
+install_worker_units() {
+  local unit
+  for unit in $WORKER_SERVICES; do
+    if [[ -f "$APP_DIR/deploy/$unit.service" ]]; then
+      install -m 0644 "$APP_DIR/deploy/$unit.service" "$SYSTEMD_DIR/$unit.service"
+    elif [[ -f "$SYSTEMD_DIR/$unit.service" ]]; then
+      systemctl disable --now "$unit" || true
+      rm -f "$SYSTEMD_DIR/$unit.service"
+    fi
+  done
+  systemctl daemon-reload
+  for unit in $WORKER_SERVICES; do
+    if [[ -f "$SYSTEMD_DIR/$unit.service" ]]; then
+      systemctl enable "$unit"
+    fi
+  done
+}
+
+restart_worker_units() {
+  local unit
+  for unit in $WORKER_SERVICES; do
+    if [[ -f "$SYSTEMD_DIR/$unit.service" ]]; then
+      systemctl restart "$unit"
+    fi
+  done
+}
+
 rollback() {
   local exit_code=$?
   if [[ "$ROLLBACK_READY" -ne 1 ]]; then
@@ -63,8 +97,10 @@ rollback() {
     cp -f "$DB_BACKUP" "$DB_PATH"
   fi
 
-  log "Reiniciando servico da aplicacao apos rollback..."
+  log "Reiniciando servico da aplicacao e workers apos rollback..."
+  install_worker_units >/dev/null 2>&1
   systemctl restart "$SERVICE_NAME" >/dev/null 2>&1
+  restart_worker_units >/dev/null 2>&1
   systemctl reload "$NGINX_SERVICE" >/dev/null 2>&1
 
   if curl -fsS --max-time 10 "$HEALTHCHECK_URL" >/dev/null 2>&1; then
@@ -87,6 +123,7 @@ require_cmd git
 require_cmd curl
 require_cmd systemctl
 require_cmd flock
+require_cmd install
 
 [[ -d "$APP_DIR/.git" ]] || die "Repositorio git nao encontrado em $APP_DIR"
 [[ -x "$PIP_BIN" ]] || die "pip nao encontrado em $PIP_BIN"
@@ -155,8 +192,12 @@ with connection.cursor() as cursor:
 log "Coletando arquivos estaticos..."
 "$PYTHON_BIN" "$MANAGE_PY" collectstatic --noinput
 
+log "Instalando units dos workers ($WORKER_SERVICES)..."
+install_worker_units
+
 log "Reiniciando servicos..."
 systemctl restart "$SERVICE_NAME"
+restart_worker_units
 systemctl reload "$NGINX_SERVICE"
 
 log "Aguardando aplicacao subir..."
@@ -174,6 +215,13 @@ for attempt in 1 2 3 4 5; do
   sleep 2
 done
 
+for unit in $WORKER_SERVICES; do
+  if [[ -f "$SYSTEMD_DIR/$unit.service" ]]; then
+    systemctl is-active --quiet "$unit" || die "Worker $unit nao ficou ativo apos o restart."
+  fi
+done
+log "Workers ativos: $WORKER_SERVICES"
+
 if [[ "$KEEP_BACKUPS" =~ ^[0-9]+$ ]]; then
   log "Limpando backups antigos (mantendo os $KEEP_BACKUPS mais recentes)..."
   mapfile -t old_backups < <(ls -1t "$BACKUP_DIR"/db_before_deploy_*.sqlite3 2>/dev/null | tail -n +"$((KEEP_BACKUPS + 1))")